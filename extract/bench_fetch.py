@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+import time
+import fetch
+from stand_in import StandInServer
+
+# Benchmark of the serial fetch path against the asynchronous engine, using one local stand-in server per host.
+# Run it from the extract folder: python3 bench_fetch.py
+
+
+def serial(urls):
+    for url in urls:
+        fetch.get(url)
+
+def concurrent(urls, max_connections, max_per_host):
+    fetcher = fetch.Fetcher(max_connections, max_per_host, delay=0)
+    try:
+        asyncio.run(fetcher.get_many(urls))
+    finally:
+        fetcher.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Pages per second of the serial path and of the fetch engine.')
+    parser.add_argument('--hosts', type=int, default=6)
+    parser.add_argument('--pages', type=int, default=40, help='pages per host')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the stand-in takes per page')
+    parser.add_argument('--max-connections', type=int, default=16)
+    parser.add_argument('--max-per-host', type=int, default=4)
+    args = parser.parse_args()
+
+    pages = {f'/article-{i}': b'<html><body>' + b'<p>news</p>' * 500 + b'</body></html>' for i in range(args.pages)}
+    servers = [StandInServer(pages, latency=args.latency) for _ in range(args.hosts)]
+    for server in servers:
+        server.__enter__()
+    try:
+        urls = [f'{server.url}/article-{i}' for i in range(args.pages) for server in servers]
+        for name, run in [('serial', lambda: serial(urls)),
+                          ('async', lambda: concurrent(urls, args.max_connections, args.max_per_host))]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f'{name:>8}: {len(urls)} pages in {elapsed:.2f}s, {len(urls) / elapsed:.1f} pages/sec')
+    finally:
+        for server in servers:
+            server.__exit__()
+
+if __name__ == '__main__':
+    main()
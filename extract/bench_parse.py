@@ -0,0 +1,43 @@
+import argparse
+import time
+import lxml.html as html
+from common import config
+from extract import parse_article, replacer
+from test_sites import FIXTURES
+
+# Benchmark of the article parsing over the fixtures: the query strings evaluated per article, as the first version did, against the compiled site extractors.
+# Run it from the extract folder: python3 bench_parse.py
+
+FIELDS = ['title', 'subtitle', 'content', 'category_long', 'tags', 'author', 'categories', 'images', 'publication_date']
+
+
+def parse_with_strings(host, article_url, content, iterator):
+    queries = config()['news_sites'][iterator]['queries']
+    parsed = html.fromstring(content.decode('utf-8'))
+    fields = {field: replacer(parsed.xpath(queries[field])) for field in FIELDS}
+    fields['images'] = parsed.xpath(queries['images'])
+    fields['news_url'] = article_url
+    fields['host'] = host
+    return fields, "".join(fields['categories']).capitalize()
+
+def main():
+    parser = argparse.ArgumentParser(description='Articles parsed per second.')
+    parser.add_argument('--rounds', type=int, default=500)
+    args = parser.parse_args()
+
+    pages = []
+    for iterator, name in enumerate(FIXTURES):
+        with open(f'fixtures/{name}_article.html', 'rb') as f:
+            pages.append((config()['news_sites'][iterator]['url'], f.read(), iterator))
+
+    for name, parse in [('strings', parse_with_strings), ('compiled', parse_article)]:
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for host, content, iterator in pages:
+                parse(host, host, content, iterator)
+        elapsed = time.perf_counter() - start
+        articles = args.rounds * len(pages)
+        print(f'{name:>9}: {articles} articles in {elapsed:.2f}s, {articles / elapsed:.0f} articles/sec')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import time
+import lxml.html as html
+from sites import extractor
+from text import clean_texts, legacy_replacer
+from test_sites import FIXTURES
+
+# Benchmark of the text cleaning over the text of the fixtures, mostly the paragraphs of the bodies: the replacer of the
+# first version, six str.replace per text, against clean_texts, that cleans the texts of a page at once as the replacer
+# of extract.py does. The text is timed as it is in the fixtures, and inside the new lines, tabs and non breaking
+# spaces of an indented page, as most of the sites serve it. Each replacer keeps its best of --repeat runs, the
+# machines they run on are shared.
+# Run it from the extract folder: python3 bench_replacer.py --rounds 2000
+
+
+def fixture_texts():
+    texts = []
+    for iterator, name in enumerate(FIXTURES):
+        with open(f'fixtures/{name}_article.html', 'rb') as f:
+            fields = extractor(iterator).extract(html.fromstring(f.read().decode('utf-8')))
+        for field in ['title', 'subtitle', 'content', 'category_long', 'tags', 'author', 'publication_date']:
+            texts.extend(fields[field])
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description='Texts cleaned per second, by the legacy replacer and by clean_text.')
+    parser.add_argument('--rounds', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = fixture_texts()
+    indented = ['\n\t\t\t' + text.replace('. ', '.\xa0') + '\n\t\t' for text in texts]
+    for kind, sample in [('fixtures', texts), ('indented', indented)]:
+        size = sum(len(text) for text in sample) * args.rounds
+        print(f'{kind}: {len(sample) * args.rounds} texts, {size / 2 ** 20:.1f} MiB')
+        for name, replacer in [('legacy', legacy_replacer), ('clean_texts', clean_texts)]:
+            elapsed = float('inf')
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                for _ in range(args.rounds):
+                    replacer(sample)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            print(f'{name:>12}: {elapsed:.2f}s, {len(sample) * args.rounds / elapsed:.0f} texts/sec, {size / 2 ** 20 / elapsed:.1f} MiB/sec')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+from seen import SeenUrls, SqliteSeenUrls
+
+# Benchmark of the lookup cost of the index of scraped urls, against the list scan of the first version.
+# Run it from the extract folder: python3 bench_seen.py --sizes 10000 1000000 10000000
+
+LOOKUPS = 10000
+
+
+def url(i):
+    return f'https://www.eluniversal.com.mx/mundo/articulo-numero-{i}'
+
+def write_urls(path, size):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(size):
+            f.write(url(i) + '\n')
+
+def time_lookups(index, size, lookups):
+    # Half of the lookups are urls already seen, the other half are new ones
+    candidates = [url(i * 7919 % size) if i % 2 else url(size + i) for i in range(lookups)]
+    start = time.perf_counter()
+    for candidate in candidates:
+        candidate in index
+    return (time.perf_counter() - start) / lookups * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Microseconds per lookup in the index of scraped urls.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000])
+    parser.add_argument('--list-limit', type=int, default=100000, help='largest size measured with the list scan')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'urls.txt')
+        for size in args.sizes:
+            write_urls(path, size)
+            if size <= args.list_limit:
+                urls = [url(i) for i in range(size)]
+                print(f'{size:>10} list:   {time_lookups(urls, size, min(LOOKUPS, 1000)):10.2f} us/lookup')
+            index = SeenUrls(path)
+            print(f'{size:>10} set:    {time_lookups(index, size, LOOKUPS):10.2f} us/lookup')
+            del index
+            database = os.path.join(folder, f'seen-{size}.db')
+            index = SqliteSeenUrls(database, path, bloom_capacity=size)
+            print(f'{size:>10} sqlite: {time_lookups(index, size, LOOKUPS):10.2f} us/lookup')
+            index.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import time
+from sites import extractor
+from streaming import parse_html, required_fields
+from sites import news_sites
+from test_sites import FIXTURES, read_page
+from test_streaming import padded, fields_in_chunks
+
+# Benchmark of the article parsing over the fixtures, followed by the related notes and scripts the sites serve after the
+# article: the whole page parsed in one tree, against the page fed chunk by chunk to the streaming parser, which stops
+# once the required fields of the site are found. It prints the bytes that did not have to be read and the latency of
+# each path, per article.
+# Run it from the extract folder: python3 bench_streaming.py --trailer 128 --chunk-size 16384
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bytes read and latency per article, of the whole page and of the streaming parse.')
+    parser.add_argument('--rounds', type=int, default=200)
+    parser.add_argument('--trailer', type=int, default=128, help='kilobytes of related notes and scripts after the article')
+    parser.add_argument('--chunk-size', type=int, default=16384)
+    args = parser.parse_args()
+
+    totals = {'bytes': 0, 'read': 0, 'full': 0.0, 'streaming': 0.0}
+    for iterator, name in enumerate(FIXTURES):
+        content = padded(read_page(name, 'article'), args.trailer)
+        site_extractor = extractor(iterator)
+        required = required_fields(news_sites()[iterator], site_extractor.queries)
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            full = site_extractor.extract(parse_html(content))
+        full_seconds = (time.perf_counter() - start) / args.rounds
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            streaming, fields = fields_in_chunks(iterator, content, args.chunk_size, required)
+        streaming_seconds = (time.perf_counter() - start) / args.rounds
+
+        same = 'same fields' if fields == full else 'DIFFERENT FIELDS'
+        print(f'{name:>13}: {len(content):7d} bytes, {streaming.bytes:7d} read ({1 - streaming.bytes / len(content):4.0%} saved), '
+              f'full {full_seconds * 1000:6.2f} ms, streaming {streaming_seconds * 1000:6.2f} ms, {same}')
+        totals['bytes'] += len(content)
+        totals['read'] += streaming.bytes
+        totals['full'] += full_seconds
+        totals['streaming'] += streaming_seconds
+    print(f'{"total":>13}: {totals["bytes"]:7d} bytes, {totals["read"]:7d} read ({1 - totals["read"] / totals["bytes"]:4.0%} saved), '
+          f'full {totals["full"] * 1000:6.2f} ms, streaming {totals["streaming"] * 1000:6.2f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import os.path
+import sqlite3
+import threading
+import time
+import zlib
+import requests
+from requests.structures import CaseInsensitiveDict
+from common import settings
+
+DEFAULT_SETTINGS = {
+    'enabled': False,
+    'folder': 'cache',
+    'ttl': 86400,
+    'max_size': 500 * 2 ** 20,
+}
+KEPT_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+
+def cache_settings():
+    ''' This function returns the cache section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('cache', DEFAULT_SETTINGS)
+
+
+class CachedResponse:
+    ''' Response served from the cache, it has the attributes of requests.Response the extraction uses. '''
+    from_cache = True
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{self.status_code} for url: {self.url}', response=self)
+
+
+class ResponseCache:
+    ''' Cache of the pages answered with 200, kept in a folder. The bodies are stored compressed and named by the hash of their content, so a page served under several urls is stored once; an index in SQLite maps each url to its body. The entries older than `ttl` seconds are downloaded again, and when the bodies take more than `max_size` bytes the least recently used entries are evicted. In replay mode every entry is served whatever its age, and an url that is not in the cache is answered with a 504, as an only-if-cached request. '''
+
+    def __init__(self, folder='cache', ttl=86400, max_size=500 * 2 ** 20, replay=False):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_size = max_size
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(folder, 'objects'), exist_ok=True)
+        # The fetch threads share the connection, the lock keeps one statement at a time
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(folder, 'index.db'), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, digest TEXT, status INTEGER, headers TEXT, fetched REAL, used REAL)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS responses_used ON responses (used)')
+
+    def _object_path(self, digest):
+        return os.path.join(self.folder, 'objects', digest[:2], digest[2:] + '.z')
+
+    def get(self, url):
+        ''' Returns the cached response of an url, or None when it is not cached or it is older than the ttl. '''
+        with self._lock:
+            row = self.connection.execute('SELECT digest, status, headers, fetched FROM responses WHERE url = ?', (url,)).fetchone()
+            if row is None or (not self.replay and time.time() - row[3] > self.ttl):
+                self.misses += 1
+                return None
+            digest, status, headers, fetched = row
+            try:
+                with open(self._object_path(digest), 'rb') as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self.misses += 1
+                return None
+            with self.connection:
+                self.connection.execute('UPDATE responses SET used = ? WHERE url = ?', (time.time(), url))
+            self.hits += 1
+        return CachedResponse(url, status, json.loads(headers), content)
+
+    def miss(self, url):
+        ''' The answer of a replay run to an url that is not cached. '''
+        return CachedResponse(url, 504, {}, b'')
+
+    def put(self, url, response):
+        ''' Stores the response of an url, only the pages answered with 200 are cached. '''
+        if response.status_code != 200:
+            return
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        path = self._object_path(digest)
+        with self._lock:
+            if not os.path.isfile(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f'{path}.{threading.get_ident()}.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(zlib.compress(content))
+                os.replace(tmp, path)
+            now = time.time()
+            with self.connection:
+                self.connection.execute('INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)', (digest, os.path.getsize(path)))
+                previous = self.connection.execute('SELECT digest FROM responses WHERE url = ?', (url,)).fetchone()
+                self.connection.execute('INSERT OR REPLACE INTO responses (url, digest, status, headers, fetched, used) VALUES (?, ?, ?, ?, ?, ?)', (url, digest, 200, json.dumps(headers), now, now))
+                if previous and previous[0] != digest:
+                    self._drop_object(previous[0])
+                self._evict()
+
+    def size(self):
+        ''' Returns the bytes taken by the bodies on disk. '''
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def _drop_object(self, digest):
+        ''' Removes a body no url points to anymore. '''
+        if self.connection.execute('SELECT 1 FROM responses WHERE digest = ?', (digest,)).fetchone() is None:
+            self.connection.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            if os.path.isfile(self._object_path(digest)):
+                os.remove(self._object_path(digest))
+
+    def _evict(self):
+        ''' Removes the least recently used entries until the bodies fit in max_size. '''
+        size = self.size()
+        while size > self.max_size:
+            row = self.connection.execute('SELECT url, digest FROM responses ORDER BY used LIMIT 1').fetchone()
+            if row is None:
+                break
+            self.connection.execute('DELETE FROM responses WHERE url = ?', (row[0],))
+            self._drop_object(row[1])
+            size = self.size()
+
+    def close(self):
+        self.connection.close()
+
+
+def open_cache(replay=False):
+    ''' This function opens the cache configured in the cache section of config.yaml, or returns None when it is disabled. A replay run always opens it. '''
+    settings = cache_settings()
+    if not settings['enabled'] and not replay:
+        return None
+    return ResponseCache(settings['folder'], settings['ttl'], settings['max_size'], replay)
@@ -1,5 +1,10 @@
+import os.path
+import sys
 import yaml
 
+# The modules of shared are imported from the parent folder, every module of extract imports common first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 __config = None
 
 def config():
@@ -8,4 +13,9 @@ def config():
         with open('config.yaml', mode='r') as f:
             __config = yaml.safe_load(f)
 
-    return __config
\ No newline at end of file
+    return __config
+
+
+def settings(section, defaults):
+    ''' This function returns the section `section` of config.yaml, filling the missing keys with `defaults`. '''
+    return dict(defaults, **(config().get(section) or {}))
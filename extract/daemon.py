@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import os.path
+import signal
+import time
+import fetch
+import seen
+from functools import partial
+from common import settings
+from extract import crawl_articles, crawl_category, parse_categories, shard
+from sites import sites_to_crawl
+from stages import ParsePool, fetch_and_parse
+from validators import open_validators
+from sink import ArticleSink, FIELDNAMES, sink_settings
+from dedup import open_dedup, dedup_settings, DedupSink
+from seen import seen_settings
+from throttle import open_throttle
+from discovery import open_discovery
+from schedule import open_scheduler, HOST, CATEGORY
+from shared import metrics
+
+logging.basicConfig(level=logging.INFO)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'folder': 'batches',
+    'batch_size': 200,
+    'batch_seconds': 300,
+    'idle_seconds': 60,
+}
+
+
+def daemon_settings():
+    ''' This function returns the daemon section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('daemon', DEFAULT_SETTINGS)
+
+
+class BatchSink:
+    ''' Sink of the daemon, it cuts the articles in micro-batches. Each batch is written by an ArticleSink in `folder`, with its checkpoint, and is closed after `batch_size` articles or `batch_seconds`; then it is renamed batch-<time>.jsonl, with its new categories in batch-<time>.categories.csv, ready to be transformed and loaded. A batch left open by a stop is resumed on the next start, and the ready ones are still in the folder. '''
+
+    def __init__(self, index, folder='batches', batch_size=200, batch_seconds=300, fieldnames=FIELDNAMES, clock=time.monotonic):
+        self.index = index
+        # The batches are handed to the other stages, which run in their own folders
+        self.folder = os.path.abspath(folder)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.fieldnames = fieldnames
+        self.clock = clock
+        self.path = os.path.join(self.folder, 'articles.jsonl')
+        self.checkpoint = os.path.join(self.folder, 'batch.checkpoint')
+        self.sink = None
+        self.opened = None
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.isfile(self.checkpoint):
+            self._open()
+
+    def _open(self):
+        settings = sink_settings()
+        self.sink = ArticleSink(self.path, self.checkpoint, settings['flush_every'], settings['flush_seconds'], urls_path=seen_settings()['path'], fieldnames=self.fieldnames)
+        self.sink.resume(self.index)
+        self.opened = self.clock()
+
+    def write(self, article, category):
+        if self.sink is None:
+            self._open()
+        self.sink.write(article, category)
+
+    def due(self):
+        ''' Returns True when the open batch is full or old enough to be closed. '''
+        return self.sink is not None and (self.sink.written >= self.batch_size or self.left() == 0)
+
+    def left(self):
+        ''' Returns the seconds until the open batch is closed, None when there is none. '''
+        if self.sink is None:
+            return None
+        return max(self.batch_seconds - (self.clock() - self.opened), 0)
+
+    def close_batch(self):
+        ''' Closes the open batch, and returns the path of its articles, None when there is none. '''
+        if self.sink is None:
+            return None
+        name = os.path.join(self.folder, f'batch-{time.time_ns()}')
+        self.sink.close(f'{name}.categories.csv')
+        self.sink = None
+        os.replace(self.path, f'{name}.jsonl')
+        return f'{name}.jsonl'
+
+    def ready(self):
+        ''' Returns the batches ready to be transformed and loaded, the oldest first, as (articles, categories), with their absolute paths. '''
+        return [(path, path[:-len('.jsonl')] + '.categories.csv') for path in sorted(glob.glob(os.path.join(self.folder, 'batch-*.jsonl')))]
+
+
+def hand_over(batches, on_batch):
+    ''' Hands the batches ready to `on_batch`, the oldest first. A batch that fails stays in the folder and is handed again after the next round. '''
+    for articles, categories in batches.ready():
+        try:
+            on_batch(articles, categories)
+        except Exception:
+            logger.exception(f'The batch {articles} could not be loaded, it is kept for the next round')
+            return
+        metrics.inc('batches_loaded', stage='daemon')
+
+
+async def visit(fetcher, pool, scheduler, site, entry, articles_recovered, validators, sink, discovery, scheduled):
+    ''' Coroutine that visits a page of the queue, and returns the new urls it yielded. The home of a host yields its new categories, which are added to the queue, and the new articles of its sitemaps and feeds; a category yields its new articles. '''
+    host = site['url']
+    if entry.kind == CATEGORY:
+        return await crawl_category(fetcher, pool, host, entry.key, entry.url, articles_recovered, validators, scheduled, sink)
+    new = 0
+    links = await discovery.discover(fetcher, pool, host, site) if discovery is not None else None
+    if links is not None:
+        failed = []
+        _, new = await crawl_articles(fetcher, pool, host, entry.key, links, articles_recovered, scheduled, sink, failed)
+        discovery.done(host, failed)
+    home = await fetch_and_parse(fetcher, pool, [entry.url], partial(parse_categories, host, iterator=entry.key))
+    for category in set(home[0][1]) if home else []:
+        if scheduler.add(category, entry.key, CATEGORY):
+            new += 1
+    return new
+
+
+async def run(sites, scheduler, articles_recovered, validators, sink, batches, on_batch=None, discovery=None, rounds=None, idle_seconds=60, stopping=None, max_connections=None, max_per_host=None, delay=None, workers=None):
+    ''' Coroutine of the daemon. Each round visits the pages due in the queue at the same time, records what they yielded and saves the queue; between the rounds, the batches are closed when due and handed to `on_batch(articles, categories)`, which deletes them once they are loaded, and the daemon sleeps until the next page is due. It stops after `rounds` rounds, or when `stopping` is set. '''
+    fetcher = fetch.Fetcher(max_connections, max_per_host, delay)
+    pool = ParsePool(workers)
+    stopping = stopping or asyncio.Event()
+    sites = dict(sites)
+    for key, site in sites.items():
+        scheduler.add(site['url'], key, HOST)
+    scheduler.retain(set(sites))
+    done = 0
+    try:
+        while not stopping.is_set() and (rounds is None or done < rounds):
+            entries = scheduler.due()
+            if entries:
+                logger.info(f'Round {done + 1}: visiting {len(entries)} of {len(scheduler)} pages')
+                scheduled = set()
+                found = await asyncio.gather(*(visit(fetcher, pool, scheduler, sites[entry.key], entry, articles_recovered, validators, sink, discovery, scheduled) for entry in entries), return_exceptions=True)
+                for entry, new in zip(entries, found):
+                    if isinstance(new, Exception):
+                        logger.warning(f'Error while visiting {entry.url}: {new}')
+                        new = 0
+                    scheduler.record(entry, new)
+                scheduler.save()
+                validators.save()
+                if discovery is not None:
+                    discovery.state.save()
+                done += 1
+            if batches.due():
+                batches.close_batch()
+            if on_batch is not None:
+                hand_over(batches, on_batch)
+            if rounds is not None and done >= rounds:
+                break
+            # Sleeps until the next page or the open batch is due, waking up at least every `idle_seconds`
+            wait = min(value for value in [scheduler.wait(), batches.left(), idle_seconds] if value is not None)
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        fetcher.close()
+        pool.close()
+        # The articles of the last round are not left in an open batch
+        batches.close_batch()
+        if on_batch is not None:
+            hand_over(batches, on_batch)
+        scheduler.save()
+    return done
+
+
+def main(argv=None, on_batch=None):
+    ''' Runs the crawl daemon, `argv` are the command line arguments. Each batch closed is handed to `on_batch(articles, categories)`; without it, the batches are left in the batches folder. '''
+    parser = argparse.ArgumentParser(description='Crawls the news sites continuously, each page revisited as often as it yields new articles.')
+    parser.add_argument('--rounds', type=int, default=None, help='stop after this many rounds, by default it runs until it is stopped')
+    parser.add_argument('--max-connections', type=int, help='global limit of simultaneous requests')
+    parser.add_argument('--max-per-host', type=int, help='limit of simultaneous requests to the same host')
+    parser.add_argument('--delay', type=float, help='seconds between two requests to the same host')
+    parser.add_argument('--workers', type=int, help='processes that parse the pages, 0 to parse them in the fetch loop')
+    parser.add_argument('--shard', type=shard, default=None, metavar='k/N', help='crawl only the sites of the shard k of N (counted from 0)')
+    args = parser.parse_args(argv)
+    settings = daemon_settings()
+    sites = sites_to_crawl(args.shard)
+
+    throttle = open_throttle()
+    fetch.use_throttle(throttle)
+    articles_recovered = seen.open_index()
+    validators = open_validators()
+    dedup = dedup_settings()
+    fieldnames = FIELDNAMES + ['duplicate_of'] if dedup['enabled'] and dedup['action'] == 'link' else FIELDNAMES
+    batches = BatchSink(articles_recovered, settings['folder'], settings['batch_size'], settings['batch_seconds'], fieldnames)
+    writer = open_dedup(batches)
+    discovery = open_discovery()
+    scheduler = open_scheduler()
+
+    async def daemon():
+        # SIGINT and SIGTERM end the current round, the last batch is closed and the queue saved
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        return await run(sites, scheduler, articles_recovered, validators, writer, batches, on_batch, discovery, args.rounds, settings['idle_seconds'], stopping,
+                         args.max_connections, args.max_per_host, args.delay, args.workers)
+
+    try:
+        rounds = asyncio.run(daemon())
+        logger.info(f'Daemon stopped after {rounds} rounds')
+        scheduler.report()
+    finally:
+        if throttle is not None:
+            throttle.report()
+            fetch.use_throttle(None)
+        fetch.close_sessions()
+        if isinstance(writer, DedupSink):
+            writer.index.close()
+        articles_recovered.close()
+        validators.save()
+
+
+if __name__ == '__main__':
+    main()
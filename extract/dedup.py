@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import re
+import sqlite3
+import unicodedata
+from collections import defaultdict
+from common import settings
+from fetch import host_of
+from shared import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'method': 'simhash',
+    'distance': 6,
+    'min_length': 200,
+    'action': 'drop',
+    'database': 'dedup.db',
+}
+BITS = 64
+SHINGLE = 3
+WORD = re.compile(r'\w+')
+
+
+def dedup_settings():
+    ''' This function returns the dedup section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('dedup', DEFAULT_SETTINGS)
+
+
+def normalize_text(paragraphs):
+    ''' This function returns the words of the body of an article in lower case and without accents, so the same story published by two hosts gives the same text. '''
+    text = unicodedata.normalize('NFKD', ' '.join(paragraphs).lower())
+    text = ''.join(character for character in text if not unicodedata.combining(character))
+    return WORD.findall(text)
+
+
+def hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def exact_fingerprint(words):
+    ''' This function returns the hash of the normalised text, only identical bodies share it. '''
+    return hash64(' '.join(words))
+
+
+def simhash(words):
+    ''' This function returns the SimHash of the normalised text over shingles of three words, near-identical bodies differ in a few bits. '''
+    shingles = [' '.join(words[i:i + SHINGLE]) for i in range(max(len(words) - SHINGLE + 1, 1))]
+    weights = [0] * BITS
+    for shingle in shingles:
+        value = hash64(shingle)
+        for bit in range(BITS):
+            weights[bit] += 1 if (value >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def distance(first, second):
+    return bin(first ^ second).count('1')
+
+
+class DedupIndex:
+    ''' Index of the fingerprints of the bodies of the scraped articles, kept in SQLite. With the exact method only identical bodies are duplicates; with SimHash the bodies whose fingerprints differ in up to `max_distance` bits are. The fingerprints are split in `max_distance + 1` bands: two fingerprints that close share at least one band, so only the articles of the same bands are compared. '''
+
+    def __init__(self, database='dedup.db', method='simhash', max_distance=6, min_length=200):
+        self.method = method
+        self.max_distance = max_distance if method == 'simhash' else 0
+        self.bands = self.max_distance + 1
+        self.band_bits = BITS // self.bands
+        self.min_length = min_length
+        self.stats = defaultdict(lambda: {'articles': 0, 'duplicates': 0})
+        self._bands = defaultdict(list)
+        self.connection = sqlite3.connect(database)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS fingerprints (url TEXT PRIMARY KEY, host TEXT, method TEXT, fingerprint TEXT)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS duplicates (url TEXT PRIMARY KEY, host TEXT, original TEXT)')
+        for url, fingerprint in self.connection.execute('SELECT url, fingerprint FROM fingerprints WHERE method = ?', (method,)):
+            self._add(int(fingerprint, 16), url)
+
+    def _keys(self, fingerprint):
+        if self.method == 'exact':
+            return [fingerprint]
+        return [(band, (fingerprint >> band * self.band_bits) & ((1 << self.band_bits) - 1)) for band in range(self.bands)]
+
+    def _add(self, fingerprint, url):
+        for key in self._keys(fingerprint):
+            self._bands[key].append((fingerprint, url))
+
+    def fingerprint(self, article):
+        ''' Returns the fingerprint of the body of an article, None when the body is too short to tell it apart. '''
+        words = normalize_text(article['body'])
+        if sum(len(word) for word in words) < self.min_length:
+            return None
+        return exact_fingerprint(words) if self.method == 'exact' else simhash(words)
+
+    def original_of(self, fingerprint, url):
+        ''' Returns the url of an article already scraped with the same body, or None. '''
+        for key in self._keys(fingerprint):
+            for other, other_url in self._bands.get(key, []):
+                if other_url != url and distance(fingerprint, other) <= self.max_distance:
+                    return other_url
+        return None
+
+    def check(self, article):
+        ''' Returns the url of the article this one duplicates, or None. The articles that are not duplicates are added to the index, the duplicates are kept apart with the url of their original. '''
+        host, url = article['host'], article['news_url']
+        self.stats[host]['articles'] += 1
+        fingerprint = self.fingerprint(article)
+        if fingerprint is None:
+            return None
+        original = self.original_of(fingerprint, url)
+        with self.connection:
+            if original is None:
+                self.connection.execute('INSERT OR REPLACE INTO fingerprints (url, host, method, fingerprint) VALUES (?, ?, ?, ?)', (url, host, self.method, format(fingerprint, '016x')))
+                self._add(fingerprint, url)
+            else:
+                self.connection.execute('INSERT OR REPLACE INTO duplicates (url, host, original) VALUES (?, ?, ?)', (url, host, original))
+                self.stats[host]['duplicates'] += 1
+                metrics.inc('duplicates', stage='extract', host=host_of(host))
+        return original
+
+    def duplicate_rates(self):
+        ''' Returns the share of the articles of each host found duplicated in this run. '''
+        return {host: stats['duplicates'] / stats['articles'] for host, stats in self.stats.items() if stats['articles']}
+
+    def close(self):
+        self.connection.close()
+
+
+class DedupSink:
+    ''' Sink that checks each article against the index before writing it. A duplicate is dropped, or with the link action written with the url of its original in `duplicate_of`. '''
+
+    def __init__(self, sink, index, action='drop'):
+        self.sink = sink
+        self.index = index
+        self.action = action
+
+    def write(self, article, category):
+        original = self.index.check(article)
+        if original is None:
+            self.sink.write(article, category)
+        elif self.action == 'link':
+            self.sink.write(dict(article, duplicate_of=original), category)
+        else:
+            logger.info(f'{article["news_url"]} is a duplicate of {original}')
+
+    def report(self):
+        for host, rate in sorted(self.index.duplicate_rates().items()):
+            stats = self.index.stats[host]
+            logger.info(f'Duplicates of {host}: {stats["duplicates"]} of {stats["articles"]} articles ({rate:.1%})')
+
+
+def open_dedup(sink):
+    ''' This function wraps the sink with the dedup index configured in the dedup section of config.yaml, or returns it as it is when dedup is disabled. '''
+    settings = dedup_settings()
+    if not settings['enabled']:
+        return sink
+    index = DedupIndex(settings['database'], settings['method'], settings['distance'], settings['min_length'])
+    return DedupSink(sink, index, settings['action'])
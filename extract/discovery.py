@@ -0,0 +1,312 @@
+import datetime
+import email.utils
+import json
+import logging
+import os.path
+import re
+import zlib
+import fetch
+from lxml import etree
+from requests.exceptions import RequestException
+from common import settings
+from fetch import host_of
+from stages import fetch_and_parse
+from shared import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'path': 'discovery.json',
+    'max_age': 2,
+    'max_sitemaps': 20,
+    'max_depth': 2,
+    'max_retries': 3,
+}
+SITEMAP_LINE = re.compile(rb'^\s*sitemap\s*:\s*(\S+)', re.IGNORECASE | re.MULTILINE)
+is_pdf = re.compile(r'^https?://.+\.pdf$')
+# Elements of the sitemaps and feeds, by their name without the namespace
+ENTRIES = {'sitemap', 'url', 'item', 'entry'}
+LINKS = {'loc', 'link'}
+DATES = {'lastmod', 'publication_date', 'pubDate', 'updated', 'published'}
+# Bytes handed to the parser at once when the whole file is already downloaded
+CHUNK_SIZE = 65536
+
+
+def discovery_settings():
+    ''' This function returns the discovery section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('discovery', DEFAULT_SETTINGS)
+
+
+def parse_date(text):
+    ''' This function reads the date of a sitemap (W3C datetime) or of a feed (RFC 822), and returns it with its time zone, UTC when it has none; None when it can not be read. '''
+    text = (text or '').strip()
+    if not text:
+        return None
+    try:
+        date = datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    return date if date.tzinfo else date.replace(tzinfo=datetime.timezone.utc)
+
+
+def robots_sitemaps(content):
+    ''' This function returns the sitemaps declared in a robots.txt. '''
+    return [url.decode('utf-8', errors='replace') for url in SITEMAP_LINE.findall(content)]
+
+
+class FeedParser:
+    ''' Incremental parse of a sitemap index, a sitemap, a RSS or an Atom feed. The chunks of the file are fed as they arrive, gunzipped on the way when it is gzipped, and each element is dropped once it is read, so neither the file decompressed nor its tree are kept in memory. '''
+
+    def __init__(self, url):
+        self.url = url
+        self.parser = etree.XMLPullParser(events=('end',), recover=True, resolve_entities=False, no_network=True)
+        self.decompressor = None
+        self.pending = b''
+        self.feed = {'sitemaps': [], 'articles': []}
+
+    def _read(self):
+        for _, element in self.parser.read_events():
+            if not isinstance(element.tag, str):
+                continue
+            name = etree.QName(element).localname
+            if name not in ENTRIES:
+                continue
+            link = None
+            date = None
+            for child in element.iter():
+                if not isinstance(child.tag, str) or child is element:
+                    continue
+                child_name = etree.QName(child).localname
+                if child_name in LINKS and link is None:
+                    link = (child.text or child.get('href') or '').strip() or None
+                elif child_name in DATES and date is None:
+                    date = parse_date(child.text)
+            if link:
+                self.feed['sitemaps' if name == 'sitemap' else 'articles'].append((link, date))
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def push(self, chunk):
+        ''' Parses a chunk of the file. '''
+        if self.pending is not None:
+            # The first two bytes tell a gzipped file
+            self.pending += chunk
+            if len(self.pending) < 2:
+                return
+            chunk, self.pending = self.pending, None
+            if chunk[:2] == b'\x1f\x8b':
+                self.decompressor = zlib.decompressobj(wbits=31)
+        if self.decompressor is not None:
+            chunk = self.decompressor.decompress(chunk)
+        self.parser.feed(chunk)
+        self._read()
+
+    def close(self):
+        ''' Parses the end of the file, and returns {'sitemaps': [(url, date)], 'articles': [(url, date)]}, the date is None when there is none. '''
+        try:
+            if self.pending:
+                self.parser.feed(self.pending)
+            self.parser.close()
+            self._read()
+        except etree.XMLSyntaxError as e:
+            logger.warning(f'{self.url} is not a sitemap or a feed: {e}')
+        return self.feed
+
+
+def parse_feed(url, content):
+    ''' This function reads a sitemap index, a sitemap, a RSS or an Atom feed already downloaded with a FeedParser, chunk by chunk. It returns {'sitemaps': [(url, date)], 'articles': [(url, date)]}, the date is None when there is none. '''
+    parser = FeedParser(url)
+    try:
+        for start in range(0, len(content), CHUNK_SIZE):
+            parser.push(content[start:start + CHUNK_SIZE])
+    except (etree.XMLSyntaxError, zlib.error) as e:
+        logger.warning(f'{url} is not a sitemap or a feed: {e}')
+        return parser.feed
+    return parser.close()
+
+
+class DiscoveryState:
+    ''' Time of the last discovery of each host, the sitemaps and feeds are read again only for what changed since then. The first run of a host looks `max_age` days back. The articles discovered that could not be downloaded are kept with the host, and tried again in the next runs up to `max_retries` times. '''
+
+    def __init__(self, path='discovery.json', max_age=2, max_retries=3):
+        self.path = path
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self.hosts = {}
+        # host -> link -> runs it failed
+        self.retries = {}
+        if path and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for host, value in json.load(f).items():
+                    # The first versions kept only the date of each host
+                    value = {'since': value} if isinstance(value, str) else value
+                    self.hosts[host] = value['since']
+                    self.retries[host] = value.get('retry') or {}
+
+    def since(self, host):
+        ''' Returns the date the new articles of a host are published after. '''
+        if host in self.hosts:
+            return datetime.datetime.fromisoformat(self.hosts[host])
+        return self.started - datetime.timedelta(days=self.max_age)
+
+    def pending(self, host):
+        ''' Returns the articles of a host that failed in the last runs. '''
+        return list(self.retries.get(host) or {})
+
+    def mark(self, host, started=None, failed=()):
+        ''' Records that the articles of a host were discovered and crawled up to the start of its discovery, by default the start of this run. The links in `failed` are kept to be tried again, the ones that failed `max_retries` times are dropped. '''
+        self.hosts[host] = (started or self.started).isoformat()
+        previous = self.retries.get(host) or {}
+        retries = {link: previous.get(link, 0) + 1 for link in failed}
+        dropped = [link for link, count in retries.items() if count > self.max_retries]
+        if dropped:
+            logger.warning(f'{len(dropped)} articles of {host} failed {self.max_retries} times and are no longer tried, as {dropped[0]}')
+            metrics.inc('articles_dropped', len(dropped), stage='extract', host=host_of(host), method='feeds')
+        self.retries[host] = {link: count for link, count in retries.items() if count <= self.max_retries}
+
+    def save(self):
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({host: {'since': since, 'retry': self.retries.get(host) or {}} for host, since in self.hosts.items()}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class NoDiscoveryState(DiscoveryState):
+    ''' State of a replay, every article of the sitemaps in the cache is taken and nothing is saved. '''
+
+    def __init__(self):
+        super().__init__(path=None)
+
+    def since(self, host):
+        return None
+
+    def save(self):
+        pass
+
+
+def get(url):
+    ''' Blocking request of the serial crawl, it returns None when the request failed. '''
+    try:
+        response = fetch.get(url)
+    except RequestException as e:
+        logger.warning(f'Error while fetching {url}: {e}')
+        return None
+    return response if response.status_code == 200 else None
+
+
+def get_feed(url):
+    ''' Blocking request of the serial crawl that parses a sitemap or a feed while it is downloaded, it returns None when the request failed. '''
+    parser = FeedParser(url)
+    try:
+        response = fetch.stream(url, lambda response, chunk: parser.push(chunk))
+    except RequestException as e:
+        logger.warning(f'Error while fetching {url}: {e}')
+        return None
+    except (etree.XMLSyntaxError, zlib.error) as e:
+        logger.warning(f'{url} is not a sitemap or a feed: {e}')
+        return parser.feed
+    return parser.close() if response.status_code == 200 else None
+
+
+class Discovery:
+    ''' Discovery of the articles of a site through its sitemaps and feeds. It reads the feeds, follows the sitemaps changed since the last run, newest first, up to `max_sitemaps` and `max_depth` levels, and keeps the articles of the site published since then. '''
+
+    def __init__(self, state, max_sitemaps=20, max_depth=2):
+        self.state = state
+        self.max_sitemaps = max_sitemaps
+        self.max_depth = max_depth
+        # host -> start of its discovery, until its articles are crawled
+        self.started = {}
+
+    def select(self, host, feeds, since):
+        ''' From the parsed feeds, returns the sitemaps to follow and the article links that are new. '''
+        sitemaps = []
+        links = []
+        for feed in feeds:
+            for url, date in feed['sitemaps']:
+                if since is None or date is None or date > since:
+                    sitemaps.append((url, date))
+            for url, date in feed['articles']:
+                if host_of(url) == host_of(host) and not is_pdf.match(url) and (since is None or date is None or date > since):
+                    links.append(url)
+        # The newest sitemaps first, the ones without a date at the end
+        sitemaps.sort(key=lambda sitemap: sitemap[1] or datetime.datetime.min.replace(tzinfo=datetime.timezone.utc), reverse=True)
+        return [url for url, _ in sitemaps[:self.max_sitemaps]], links
+
+    def finish(self, host, links, requests, started=None):
+        ''' Logs and counts the articles discovered, and adds the ones that failed in the last runs. It returns the unique links. The host is marked by `done`, once they are crawled. '''
+        links = list(dict.fromkeys(self.state.pending(host) + links))
+        self.started[host] = started
+        logger.info(f'{len(links)} articles of {host} discovered in its sitemaps and feeds with {requests} requests')
+        metrics.inc('articles_discovered', len(links), stage='extract', host=host_of(host), method='feeds')
+        metrics.inc('discovery_requests', requests, stage='extract', host=host_of(host), method='feeds')
+        return links
+
+    def done(self, host, failed=()):
+        ''' Marks a host once the articles discovered were crawled, the ones in `failed` could not be downloaded and are tried again in the next run. Until then, a crash or a host that fails finds them again since the same date. '''
+        self.state.mark(host, self.started.pop(host, None), failed)
+
+    async def discover(self, fetcher, pool, host, site):
+        ''' Coroutine that discovers the articles of a site, the feeds are downloaded and parsed in the stages of the crawl. The feeds are the `feeds` of the site in config.yaml, or the sitemaps of its robots.txt when it has none. It returns the list of article links, or None when the site has no sitemap or feed that could be read, then the site is crawled through its categories. The caller calls `done` once the links are crawled. '''
+        started = datetime.datetime.now(datetime.timezone.utc)
+        feeds = site.get('feeds') or []
+        requests = 0
+        if not feeds:
+            robots = await fetcher.get(f'{host}/robots.txt')
+            requests += 1
+            feeds = robots_sitemaps(robots.content) if robots is not None and robots.status_code == 200 else []
+        since = self.state.since(host)
+        links = []
+        read = False
+        for _ in range(self.max_depth + 1):
+            if not feeds:
+                break
+            parsed = [feed for _, feed in await fetch_and_parse(fetcher, pool, feeds, parse_feed)]
+            requests += len(feeds)
+            read = read or any(feed['sitemaps'] or feed['articles'] for feed in parsed)
+            feeds, new_links = self.select(host, parsed, since)
+            links.extend(new_links)
+        if not read:
+            logger.info(f'{host} has no sitemap or feed that could be read, it is crawled through its categories')
+            return None
+        return self.finish(host, links, requests, started)
+
+    def discover_serial(self, host, site):
+        ''' Same as discover, one request at a time. '''
+        started = datetime.datetime.now(datetime.timezone.utc)
+        feeds = site.get('feeds') or []
+        requests = 0
+        if not feeds:
+            robots = get(f'{host}/robots.txt')
+            requests += 1
+            feeds = robots_sitemaps(robots.content) if robots is not None else []
+        since = self.state.since(host)
+        links = []
+        read = False
+        for _ in range(self.max_depth + 1):
+            if not feeds:
+                break
+            parsed = [feed for feed in map(get_feed, feeds) if feed is not None]
+            requests += len(feeds)
+            read = read or any(feed['sitemaps'] or feed['articles'] for feed in parsed)
+            feeds, new_links = self.select(host, parsed, since)
+            links.extend(new_links)
+        if not read:
+            logger.info(f'{host} has no sitemap or feed that could be read, it is crawled through its categories')
+            return None
+        return self.finish(host, links, requests, started)
+
+
+def open_discovery(replay=False):
+    ''' This function builds the discovery configured in the discovery section of config.yaml, or returns None when it is disabled. '''
+    settings = discovery_settings()
+    if not settings['enabled']:
+        return None
+    state = NoDiscoveryState() if replay else DiscoveryState(settings['path'], settings['max_age'], settings['max_retries'])
+    return Discovery(state, settings['max_sitemaps'], settings['max_depth'])
@@ -1,11 +1,25 @@
 import os.path
-import requests
 import lxml.html as html
 import re
 import logging
-import csv
+import asyncio
+import argparse
+import fetch
+import seen
+from functools import partial
 from common import config
-from requests.exceptions import HTTPError
+from sites import extractor, news_sites, sites_to_crawl
+from stages import ParsePool, fetch_and_parse
+from validators import open_validators, NoValidators
+from sink import open_sink
+from dedup import open_dedup, DedupSink
+from cache import open_cache
+from text import text_settings, clean_texts, legacy_replacer
+from throttle import open_throttle
+from streaming import streaming_settings, parse_html, required_fields, StreamingParser
+from discovery import open_discovery
+from shared import metrics
+from requests.exceptions import RequestException
 from urllib3.exceptions import MaxRetryError
 
 logging.basicConfig(level=logging.INFO)
@@ -15,21 +29,13 @@ is_well_formed_link = re.compile(r'^https?://.+/.+$')
 is_root_path = re.compile(r'^/.+$')
 is_pdf = re.compile(r'^https?://.+\.pdf$')
 config = config
-data = {}
 
 # Test para escapar comillas dobles.
 def replacer(objs):
-    ''' This function replace any strange character in the data extracted '''
-    news_object = []
-    for obj in objs:
-        obj = obj.replace('\"', '')
-        obj = obj.replace('\xa0', '')
-        obj = obj.replace('\n', '')
-        obj = obj.replace('\t', '')
-        obj = obj.replace('\r', '')
-        obj = obj.replace('-', ' ')
-        news_object.append(obj)
-    return news_object
+    ''' This function replace any strange character in the data extracted, see text.clean_text. The replacer of the first version is kept behind the legacy_replacer key of the text section. '''
+    if text_settings()['legacy_replacer']:
+        return legacy_replacer(objs)
+    return clean_texts(objs)
 
 # Test para construir enlaces.
 def build_link(host, link):
@@ -52,29 +58,40 @@ def recover_text_file(file):
     file.close()
     return url
 
+def parse_categories(host, home_url, content, iterator):
+    ''' Function that parses the home page of a host, and returns the category urls. '''
+    parsed = parse_html(content)
+    # Extracting the links and the names for each category
+    return [build_link(host, link) for link in extractor(iterator).categories_links(parsed)]
+
+def parse_article_links(host, category_url, content, iterator):
+    ''' Function that parses a category page, and returns the article urls, leaving out the pdf files. '''
+    article_list = []
+    parsed = parse_html(content)
+    # Extracting the article links for each category
+    for article in extractor(iterator).articles(parsed):
+        link = build_link(host, article)
+        if not is_pdf.match(link):
+            article_list.append(link)
+    return article_list
+
 # Test para verificar que sea distinto a none
 def categories_urls_extraction(host, iterator):
     ''' Function that returns one list for the category urls. '''
     logger.info(f'Extracting category list for {host}')
     # Variables definition
-    categories_links = config()['news_sites'][iterator]['categories_links']
     links_categories = []
     
     try:
         # Requesting info from the host
-        news_page = requests.get(host)
+        news_page = fetch.get(host)
         if news_page.status_code == 200:
-            home = news_page.content.decode('utf-8')
-            parsed = html.fromstring(home)
-            # Extracting the links and the names for each category
-            categories_tmp = parsed.xpath(categories_links)
-            for link in categories_tmp:
-                links_categories.append(build_link(host, link))
+            links_categories = parse_categories(host, host, news_page.content, iterator)
         else:
             # In case if the server is down
             logger.warning(f'Server error: {news_page.status_code}')
             raise ValueError(f'Error {news_page.status_code}')
-    except ValueError as e:
+    except (ValueError, RequestException) as e:
         logger.info(f'Error: {e}')
     return list(set(links_categories))
 
@@ -82,183 +99,241 @@ def categories_urls_extraction(host, iterator):
 def articles_urls_extraction(host, category_list, iterator):
     ''' Function that extracts the articles urls for each category, and returns it in a list. '''
     # Variables definition
-    article_link = config()['news_sites'][iterator]['articles']
     article_list = []
 
     for category in category_list:
         try:
             logger.info(f'Extracting article links for {category}')
             # Requesting info from the categories list
-            category_page = requests.get(category)
+            category_page = fetch.get(category)
             if category_page.status_code == 200:
-                home = category_page.content.decode('utf-8')
-                parsed = html.fromstring(home)
-                # Extracting the article links for each category
-                article_list_tmp = parsed.xpath(article_link)
-                for article in article_list_tmp:
-                    if is_pdf.match(build_link(host, article)):
-                        continue
-                    else:
-                        article_list.append(build_link(host, article))
-                    
+                article_list.extend(parse_article_links(host, category, category_page.content, iterator))
             else:
                 # In case if the server is down
                 logger.warning(f'Server error: {category_page.status_code}')
                 raise ValueError(f'Error {category_page.status_code}')
-        except ValueError as e:
+        except (ValueError, RequestException) as e:
             logger.info(f'Error: {e}')
         
     return list(set(article_list))
 
+def article_data(host, article_url, fields):
+    ''' Function that cleans the fields extracted from an article, and returns them in a dictionary, also, it returns its category. '''
+    data = {
+        'title': replacer(fields['title']),
+        'subtitle': replacer(fields['subtitle']),
+        'body': replacer(fields['content']),
+        'images': fields['images'],
+        'category_long': replacer(fields['category_long']),
+        'tags': replacer(fields['tags']),
+        'author': replacer(fields['author']),
+        'publication_date': replacer(fields['publication_date']),
+        'news_url': article_url,
+        'host': host
+    }
+    category = "".join(replacer(fields['categories']))
+    return data, category.capitalize()
+
+def parse_article(host, article_url, content, iterator):
+    ''' Function that parses the page of an article, and returns it in a dictionary, also, it returns its category. '''
+    parsed = parse_html(content)
+    # Extracting the content for each article, all the fields in one pass
+    return article_data(host, article_url, extractor(iterator).extract(parsed))
+
+def stream_article(article_url, iterator):
+    ''' Function that downloads an article and parses it as it arrives, in the encoding it declares, the download stops once the required fields of the site are found. It returns the response and the fields, None when it is not answered with 200. '''
+    settings = streaming_settings()
+    site_extractor = extractor(iterator)
+    required = required_fields(news_sites()[iterator], site_extractor.queries)
+    parser = StreamingParser(site_extractor, required)
+    response = fetch.stream(article_url, lambda response, chunk: parser.feed(chunk, response.headers.get('Content-Type')), settings['chunk_size'])
+    if response.status_code != 200:
+        return response, None
+    with metrics.timer('parse_seconds', stage='extract', host=fetch.host_of(article_url)):
+        fields = parser.close()
+    if parser.done:
+        logger.debug(f'The required fields of {article_url} were found in its first {parser.bytes} bytes')
+        # The fields that are not required are only kept when they come before the required ones in the page
+        missing = [field for field, values in fields.items() if not values and field not in required]
+        if missing:
+            logger.info(f'{article_url} was cut before its {", ".join(missing)}')
+        for field in missing:
+            metrics.inc('fields_missing', stage='extract', host=fetch.host_of(article_url), field=field)
+    return response, fields
+
 # Test para verificar titulo, contenido, fecha, url y categoría
 def articles_and_categories_extraction(host, article_url, iterator):
-    ''' Function that extracts the articles for url, and returns it in a dictionary, also, it returns a list for each category. '''
-    # Variables definition
-    title_query = config()['news_sites'][iterator]['queries']['title']
-    subtitle_query = config()['news_sites'][iterator]['queries']['subtitle']
-    body_query = config()['news_sites'][iterator]['queries']['content']
-    images_query = config()['news_sites'][iterator]['queries']['images']
-    category_long_query = config()['news_sites'][iterator]['queries']['category_long']
-    tags_query = config()['news_sites'][iterator]['queries']['tags']
-    author_query = config()['news_sites'][iterator]['queries']['author']
-    publication_date_query = config()['news_sites'][iterator]['queries']['publication_date']
-    categories_query = config()['news_sites'][iterator]['queries']['categories']
+    ''' Function that extracts the articles for url, and returns it in a dictionary, also, it returns a list for each category. When the article can not be downloaded the dictionary is empty and the category is None. '''
     data = {}
+    category = None
     try:
         logger.info(f'Extracting article and category content from {article_url}')
         # Requesting info from the categories list
-        article_page = requests.get(article_url)
-        if article_page.status_code == 200:
-            home = article_page.content.decode('utf-8')
-            parsed = html.fromstring(home)
-            # Extracting the content for each article
-            try:
-                title = parsed.xpath(title_query)
-                title = replacer(title)
-            except ValueError as e:
-                logger.warning(f'there is no title')
-                title = None
-            try:
-                subtitle = parsed.xpath(subtitle_query)
-                subtitle = replacer(subtitle)
-            except ValueError as e:
-                logger.warning('There is no subtitle')
-                subtitle = None
-            try:
-                body = parsed.xpath(body_query)
-                body = replacer(body)
-            except ValueError as e:
-                logger.warning(f'there is no body')
-                body = None
-            try:
-                category_long = parsed.xpath(category_long_query)
-                category_long = replacer(category_long)
-            except ValueError as e:
-                logger.warning(f'there is no category')
-                category_long = None
-            try:
-                tags = parsed.xpath(tags_query)
-                tags = replacer(tags)
-            except ValueError as e:
-                logger.warning(f'there is no tags')
-                tags = None
-            try:
-                author = parsed.xpath(author_query)
-                author = replacer(author)
-            except ValueError as e:
-                logger.warning(f'there is no author')
-                author = None
-            try:
-                categories = parsed.xpath(categories_query)
-                categories = replacer(categories)
-            except ValueError as e:
-                logger.warning(f'there are no categories')
-                categories = None
-            try:
-                images = parsed.xpath(images_query)
-                images = replacer(images)
-            except ValueError as e:
-                logger.warning(f'there are no images')
-                images = None
-            try:
-                publication_date = parsed.xpath(publication_date_query)
-                publication_date = replacer(publication_date)
-            except ValueError as e:
-                logger.warning(f'there is no publication date')
-                publication_date = None
-            
-            data = {
-                'title': title,
-                'subtitle': subtitle,
-                'body': body,
-                'images': parsed.xpath(images_query),
-                'category_long': category_long,
-                'tags': tags,
-                'author': author,
-                'publication_date': publication_date,
-                'news_url': article_url,
-                'host': host
-            }
-            category = "".join(categories)
+        if streaming_settings()['enabled']:
+            article_page, fields = stream_article(article_url, iterator)
+            if fields is not None:
+                data, category = article_data(host, article_url, fields)
         else:
+            article_page = fetch.get(article_url)
+            if article_page.status_code == 200:
+                data, category = parse_article(host, article_url, article_page.content, iterator)
+        if article_page.status_code != 200:
             logger.warning(f'{article_url}: {article_page.status_code}')
-            raise ValueError(f'Error.')
-    except (HTTPError, MaxRetryError) as e:
-        logger.warning('Error while fetching article', exc_info=False)
+    except (RequestException, MaxRetryError) as e:
+        logger.warning(f'Error while fetching article {article_url}: {e}')
     
-    return data, category.capitalize()
+    return data, category
 
 
-if __name__ == '__main__':
-    data['categories'] = []
-    data['articles'] = []
-    articles = []
-    articles_recovered = []
-    categories_recovered = []
-    if os.path.isfile('urls.txt'):
-        articles_recovered = recover_text_file('urls.txt')
-    if os.path.isfile('categories.txt'):
-        categories_recovered = recover_text_file('categories.txt')
-    articles_to_scrape = []
-    categories = []
-    
+async def crawl_articles(fetcher, pool, host, iterator, links, articles_recovered, scheduled, sink, failed=None):
+    ''' Coroutine that downloads the articles of a list of links that were not scraped nor scheduled yet. Each article is written to the sink as soon as it is parsed, it returns the number of new links and of articles scraped. The links that could not be scraped are added to `failed`, when it is given. '''
+    articles_links = []
+    for article in links:
+        if article not in scheduled and article not in articles_recovered:
+            scheduled.add(article)
+            articles_links.append(article)
+    if not articles_links:
+        return 0, 0
+    scraped = await fetch_and_parse(fetcher, pool, articles_links, partial(parse_article, host, iterator=iterator), on_result=lambda url, result: sink.write(*result))
+    if failed is not None and len(scraped) < len(articles_links):
+        urls = set(scraped)
+        failed.extend(url for url in articles_links if url not in urls)
+    return len(articles_links), len(scraped)
 
-    for i in range(6):
-        host = config()['news_sites'][i]['url']
-        logger.info(f'Begining scraper for {host}')
-        categories_urls = categories_urls_extraction(host, i)
-        articles_links = articles_urls_extraction(host, categories_urls, i)
-        for article in articles_links:
-            if article not in articles_recovered:
-                articles_to_scrape.append(article)
-                articles, category = articles_and_categories_extraction(host, article, i)
-                data['articles'].append(articles)
-                categories.append(category)
-        
-    categories = list(set(categories))
-    for category in categories:
-            if category not in categories_recovered:
-                data['categories'].append({'categories':category})
-        
-    
-    with open('articles.csv', 'w+', encoding = "utf-8") as f:
-        fieldnames = ['title', 'subtitle', 'body', 'images', 'category_long', 'tags', 'author','publication_date', 'news_url', 'host']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data['articles'])
-        f.close()
+async def crawl_category(fetcher, pool, host, iterator, category, articles_recovered, validators, scheduled, sink):
+    ''' Coroutine that crawls one category. The category page is requested with a conditional GET, and its links are checked against the scraped urls as soon as it is parsed, so only the new articles are downloaded. Each article is written to the sink as soon as it is parsed, it returns the number of articles. '''
+    listing = await fetch_and_parse(fetcher, pool, [category], partial(parse_article_links, host, iterator=iterator), validators.headers, validators.store)
+    if not listing:
+        return 0
+    logger.info(f'Extracting the new articles from {category}')
+    new, scraped = await crawl_articles(fetcher, pool, host, iterator, listing[0][1], articles_recovered, scheduled, sink)
+    if not new:
+        logger.info(f'There are no new articles in {category}')
+    elif scraped < new:
+        # Some articles failed, the category must be downloaded again next run
+        validators.forget(category)
+    return scraped
+
+async def crawl_host(fetcher, pool, host, iterator, articles_recovered, validators, sink, discovery=None):
+    ''' Coroutine that crawls one host, it returns the number of articles scraped. '''
+    with metrics.timer('host_seconds', stage='extract', host=fetch.host_of(host)):
+        return await _crawl_host(fetcher, pool, host, iterator, articles_recovered, validators, sink, discovery)
 
-    with open('categories.csv', 'w+', encoding = "utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=['categories'])
-        writer.writeheader()
-        writer.writerows(data['categories'])
+async def _crawl_host(fetcher, pool, host, iterator, articles_recovered, validators, sink, discovery=None):
+    logger.info(f'Begining scraper for {host}')
+    scheduled = set()
+    # The sitemaps and feeds give the new articles in a few requests, the categories are crawled when the site has none
+    links = await discovery.discover(fetcher, pool, host, news_sites()[iterator]) if discovery is not None else None
+    if links is not None:
+        failed = []
+        _, scraped = await crawl_articles(fetcher, pool, host, iterator, links, articles_recovered, scheduled, sink, failed)
+        discovery.done(host, failed)
+        logger.info(f'{scraped} articles scraped from {host}')
+        return scraped
+    home = await fetch_and_parse(fetcher, pool, [host], partial(parse_categories, host, iterator=iterator))
+    if not home:
+        logger.warning(f'Server error for {host}')
+        return 0
+    categories_urls = list(set(home[0][1]))
 
-    with open('urls.txt', 'a+', encoding = "utf-8") as f:
-        for article in articles_to_scrape:
-            f.write(article + '\n')
-        f.close
+    logger.info(f'Extracting article links for {len(categories_urls)} categories of {host}')
+    scraped = await asyncio.gather(*(crawl_category(fetcher, pool, host, iterator, category, articles_recovered, validators, scheduled, sink) for category in categories_urls))
+    logger.info(f'{sum(scraped)} articles scraped from {host}')
+    return sum(scraped)
+
+async def crawl(sites, articles_recovered, validators, sink, max_connections=None, max_per_host=None, delay=None, workers=None, discovery=None):
+    ''' Coroutine that crawls a list of (key, site) at the same time, the pages are parsed in a pool of processes. '''
+    fetcher = fetch.Fetcher(max_connections, max_per_host, delay)
+    pool = ParsePool(workers)
+    try:
+        hosts = [crawl_host(fetcher, pool, site['url'], key, articles_recovered, validators, sink, discovery) for key, site in sites]
+        return await asyncio.gather(*hosts)
+    finally:
+        fetcher.close()
+        pool.close()
+
+
+def shard(value):
+    ''' Reads the --shard argument, k/N for the shard k of N, counted from 0. '''
+    try:
+        k, shards = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'{value} is not k/N')
+    if shards < 1 or not 0 <= k < shards:
+        raise argparse.ArgumentTypeError(f'{value}: k must be between 0 and N - 1')
+    return k, shards
+
+
+def main(argv=None):
+    ''' Runs the extraction, `argv` are the command line arguments, by default the ones of the process. '''
+    parser = argparse.ArgumentParser(description='Extracts the articles of the news sites in config.yaml.')
+    parser.add_argument('--serial', action='store_true', help='fetch one page at a time, as the first version of the scraper')
+    parser.add_argument('--max-connections', type=int, help='global limit of simultaneous requests')
+    parser.add_argument('--max-per-host', type=int, help='limit of simultaneous requests to the same host')
+    parser.add_argument('--delay', type=float, help='seconds between two requests to the same host')
+    parser.add_argument('--workers', type=int, help='processes that parse the pages, 0 to parse them in the fetch loop')
+    parser.add_argument('--replay', action='store_true', help='serve every page from the response cache, without going to the network')
+    parser.add_argument('--shard', type=shard, default=None, metavar='k/N', help='crawl only the sites of the shard k of N (counted from 0), to split the sites among several processes or machines')
+    args = parser.parse_args(argv)
+    sites = sites_to_crawl(args.shard)
+    logger.info(f'{len(sites)} sites to crawl' + (f', shard {args.shard[0]} of {args.shard[1]}' if args.shard else ''))
+
+    cache = open_cache(args.replay)
+    fetch.use_cache(cache)
+    # A replay does not go to the network, the hosts are not throttled
+    throttle = None if args.replay else open_throttle()
+    fetch.use_throttle(throttle)
+
+    # The sink is opened first, when a run is resumed it cuts urls.txt and categories.txt to the last checkpoint
+    sink = open_sink()
+    # A replay parses again every page in the cache, the urls already scraped are not skipped
+    articles_recovered = seen.NoSeenUrls() if args.replay else seen.open_index()
+    sink.resume(articles_recovered)
+    validators = NoValidators() if args.replay else open_validators()
+    # The duplicates of the articles already scraped are dropped, or linked to them, before they are written
+    writer = open_dedup(sink)
+    # The articles are taken from the sitemaps and feeds of the sites, the ones changed since the last run
+    discovery = open_discovery(args.replay)
     
-    with open('categories.txt', 'a+', encoding = "utf-8") as f:
-        for category in categories:
-            f.write(category + '\n')
-        f.close
\ No newline at end of file
+    if args.serial:
+        for key, site in sites:
+            host = site['url']
+            logger.info(f'Begining scraper for {host}')
+            articles_links = discovery.discover_serial(host, site) if discovery is not None else None
+            discovered = articles_links is not None
+            if not discovered:
+                categories_urls = categories_urls_extraction(host, key)
+                articles_links = articles_urls_extraction(host, categories_urls, key)
+            failed = []
+            for article in articles_links:
+                if article not in articles_recovered:
+                    articles, category = articles_and_categories_extraction(host, article, key)
+                    if articles:
+                        writer.write(articles, category)
+                    else:
+                        failed.append(article)
+            if discovered:
+                discovery.done(host, failed)
+    else:
+        asyncio.run(crawl(sites, articles_recovered, validators, writer, args.max_connections, args.max_per_host, args.delay, args.workers, discovery))
+    logger.info(f'Connection stats: {fetch.connection_stats()}')
+    if throttle is not None:
+        throttle.report()
+        fetch.use_throttle(None)
+    fetch.close_sessions()
+    if cache is not None:
+        fetch.use_cache(None)
+        cache.close()
+
+    sink.close()
+    if isinstance(writer, DedupSink):
+        writer.report()
+        writer.index.close()
+    articles_recovered.close()
+    validators.save()
+    if discovery is not None:
+        discovery.state.save()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from common import settings
+from throttle import CircuitOpen
+from shared import metrics
+
+# urllib3 decodes the responses compressed with brotli when the package is installed
+ACCEPT_ENCODING = 'gzip, deflate, br' if importlib.util.find_spec('brotli') is not None else 'gzip, deflate'
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'max_connections': 16,
+    'max_per_host': 4,
+    'delay': 0.5,
+    'timeout': 10,
+    'retries': 3,
+    'backoff_factor': 0.5,
+}
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_cache = None
+_throttle = None
+stats = {'requests': 0, 'retries': 0, 'cache_hits': 0}
+
+
+def fetch_settings():
+    ''' This function returns the fetch section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('fetch', DEFAULT_SETTINGS)
+
+
+def host_of(url):
+    ''' This function returns the host (netloc) of an url, it is the key used for the per host limits. '''
+    return urlsplit(url).netloc
+
+
+def new_session(retries, backoff_factor, pool_size):
+    ''' This function builds a keep-alive session, with a connection pool and bounded retries with exponential backoff. '''
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET', 'HEAD'],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({'Accept-Encoding': ACCEPT_ENCODING, 'Connection': 'keep-alive'})
+    return session
+
+
+def session_for(url):
+    ''' This function returns the session of the host of an url, creating it the first time the host is requested. '''
+    host = host_of(url)
+    with _sessions_lock:
+        if host not in _sessions:
+            settings = fetch_settings()
+            _sessions[host] = new_session(settings['retries'], settings['backoff_factor'], settings['max_per_host'])
+        return _sessions[host]
+
+
+def use_cache(cache):
+    ''' This function sets the response cache the requests read through, None to go always to the network. '''
+    global _cache
+    _cache = cache
+
+
+def use_throttle(throttle):
+    ''' This function sets the adaptive limits of the hosts, None to send every request as soon as it is asked. '''
+    global _throttle
+    _throttle = throttle
+
+
+def connection_stats():
+    ''' This function returns the counters of the sessions: requests, retries, new connections and reused connections. '''
+    new_connections = 0
+    pooled_requests = 0
+    with _sessions_lock:
+        sessions = list(_sessions.values())
+    for session in sessions:
+        pools = session.get_adapter('https://').poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            new_connections += pool.num_connections
+            pooled_requests += pool.num_requests
+    return {
+        'requests': stats['requests'],
+        'retries': stats['retries'],
+        'cache_hits': stats['cache_hits'],
+        'new_connections': new_connections,
+        'reused_connections': max(pooled_requests - new_connections, 0),
+    }
+
+
+def close_sessions():
+    ''' This function closes the sessions and resets the counters. '''
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        stats['requests'] = 0
+        stats['retries'] = 0
+        stats['cache_hits'] = 0
+
+
+def from_cache(url):
+    ''' Returns the response of an url from the cache, or None when it must be downloaded. '''
+    cache = _cache
+    if cache is None:
+        return None
+    cached = cache.get(url)
+    if cached is not None:
+        with _sessions_lock:
+            stats['cache_hits'] += 1
+        metrics.inc('cache_hits', stage='extract', host=host_of(url))
+        return cached
+    if cache.replay:
+        return cache.miss(url)
+    return None
+
+
+def _wait_for_host(url, host, throttle):
+    ''' Waits the delay of the host, or raises CircuitOpen if its circuit is open. '''
+    if not throttle.allow(host):
+        raise CircuitOpen(f'The circuit of {host} is open, {url} is skipped')
+    delay = throttle.delay(host)
+    if delay:
+        time.sleep(delay)
+
+
+def _record(host, throttle, response, seconds, downloaded):
+    ''' Records a response in the throttle, the metrics and the connection stats. '''
+    if throttle is not None:
+        throttle.record(host, response.status_code not in RETRY_STATUSES, seconds)
+    metrics.observe('fetch_seconds', seconds, stage='extract', host=host)
+    metrics.inc('pages_fetched', stage='extract', host=host, status=response.status_code)
+    metrics.inc('bytes_downloaded', downloaded, stage='extract', host=host)
+    retries = response.raw.retries
+    with _sessions_lock:
+        stats['requests'] += 1
+        stats['retries'] += len(retries.history) if retries else 0
+
+
+def get(url, session=None, headers=None, cached=True, wait=True):
+    ''' Blocking request used by all the extraction functions, it goes through the response cache, when there is one, and the pooled session of the host. With `cached` False the cache is not read, the caller already did. When the hosts are throttled, the request waits the delay of its host, or raises CircuitOpen if its circuit is open; with `wait` False the caller already did both. '''
+    response = from_cache(url) if cached else None
+    if response is not None:
+        return response
+    host = host_of(url)
+    throttle = _throttle
+    if throttle is not None and wait:
+        _wait_for_host(url, host, throttle)
+    session = session or session_for(url)
+    start = time.perf_counter()
+    try:
+        response = session.get(url, timeout=fetch_settings()['timeout'], headers=headers)
+    except requests.exceptions.RequestException:
+        if throttle is not None:
+            throttle.record(host, False, time.perf_counter() - start)
+        raise
+    _record(host, throttle, response, time.perf_counter() - start, len(response.content))
+    if _cache is not None:
+        _cache.put(url, response)
+    return response
+
+
+def stream(url, consume, chunk_size=16384, session=None, headers=None):
+    ''' Blocking request whose body is handed to `consume(response, chunk)` as it arrives, `consume` returns True when it has what it needs and the rest of the body is not downloaded, unless there is a cache to store the page in. A page of the cache is handed in one chunk. It returns the response, its content is only kept when there is a cache. '''
+    response = from_cache(url)
+    if response is not None:
+        if response.status_code == 200:
+            consume(response, response.content)
+        return response
+    host = host_of(url)
+    throttle = _throttle
+    if throttle is not None:
+        _wait_for_host(url, host, throttle)
+    session = session or session_for(url)
+    start = time.perf_counter()
+    stopped = False
+    cut = False
+    chunks = []
+    try:
+        with session.get(url, timeout=fetch_settings()['timeout'], headers=headers, stream=True) as response:
+            if response.status_code == 200:
+                for chunk in response.iter_content(chunk_size):
+                    if _cache is not None:
+                        chunks.append(chunk)
+                    if not stopped and consume(response, chunk):
+                        stopped = True
+                        # The cache stores whole pages, with one only the parse stops
+                        if _cache is None:
+                            cut = True
+                            break
+            # The bytes read from the connection, before they are decompressed
+            downloaded = response.raw.tell()
+    except requests.exceptions.RequestException:
+        if throttle is not None:
+            throttle.record(host, False, time.perf_counter() - start)
+        raise
+    _record(host, throttle, response, time.perf_counter() - start, downloaded)
+    length = response.headers.get('Content-Length')
+    if cut and length and length.isdigit():
+        metrics.inc('bytes_saved', max(int(length) - downloaded, 0), stage='extract', host=host)
+    if not cut and response.status_code == 200 and _cache is not None:
+        response._content = b''.join(chunks)
+        _cache.put(url, response)
+    return response
+
+
+class Fetcher:
+    ''' Asynchronous fetch engine. The requests are run in a thread pool and bounded by a global and a per host connection cap, two requests to the same host are separated at least by the politeness delay, plus the delay of the throttle when there is one. '''
+
+    def __init__(self, max_connections=None, max_per_host=None, delay=None):
+        settings = fetch_settings()
+        self.max_connections = max_connections or settings['max_connections']
+        self.max_per_host = max_per_host or settings['max_per_host']
+        self.delay = settings['delay'] if delay is None else delay
+        self._connections = asyncio.Semaphore(self.max_connections)
+        self._hosts = {}
+        self._executor = ThreadPoolExecutor(max_workers=self.max_connections)
+
+    def _host_state(self, host):
+        ''' Returns the semaphore, the lock and the next allowed request time for a host. '''
+        if host not in self._hosts:
+            self._hosts[host] = {
+                'slots': asyncio.Semaphore(self.max_per_host),
+                'lock': asyncio.Lock(),
+                'next_request': 0.0,
+            }
+        return self._hosts[host]
+
+    async def _wait_turn(self, state, host):
+        ''' Sleeps until the politeness delay for the host is over, and books the next turn. '''
+        delay = self.delay + (_throttle.delay(host) if _throttle is not None else 0)
+        async with state['lock']:
+            now = time.monotonic()
+            wait = state['next_request'] - now
+            state['next_request'] = max(now, state['next_request']) + delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def get(self, url, headers=None):
+        ''' Requests an url, it returns the response, or None if the request failed. The pages in the cache are served without waiting for the host. '''
+        cached = from_cache(url)
+        if cached is not None:
+            return cached
+        host = host_of(url)
+        state = self._host_state(host)
+        async with state['slots']:
+            # The circuit is looked at once the request has a slot, the requests waiting for a failing host are skipped at once
+            if _throttle is not None and not _throttle.allow(host):
+                logger.debug(f'The circuit of {host} is open, {url} is skipped')
+                return None
+            await self._wait_turn(state, host)
+            async with self._connections:
+                loop = asyncio.get_running_loop()
+                try:
+                    return await loop.run_in_executor(self._executor, partial(get, url, headers=headers, cached=False, wait=False))
+                except requests.exceptions.RequestException as e:
+                    logger.warning(f'Error while fetching {url}: {e}')
+                    return None
+
+    async def get_many(self, urls):
+        ''' Requests a list of urls concurrently, the responses are returned in the same order. '''
+        return await asyncio.gather(*(self.get(url) for url in urls))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
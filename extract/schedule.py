@@ -0,0 +1,147 @@
+import heapq
+import json
+import logging
+import os.path
+import time
+from common import settings
+from shared import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'path': 'schedule.json',
+    'first_interval': 900,
+    'min_interval': 300,
+    'max_interval': 86400,
+    'target': 1,
+    'smoothing': 0.3,
+    'backoff': 2,
+    'round_size': 50,
+}
+HOST = 'host'
+CATEGORY = 'category'
+
+
+def schedule_settings():
+    ''' This function returns the schedule section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('schedule', DEFAULT_SETTINGS)
+
+
+class Entry:
+    ''' A page the daemon revisits, the home of a host or a category, with the rate of new urls it yielded and its next visit. '''
+
+    def __init__(self, url, key, kind, interval, next_visit):
+        self.url = url
+        self.key = key
+        self.kind = kind
+        self.interval = interval
+        self.next_visit = next_visit
+        self.rate = 0.0
+        self.visits = 0
+        self.found = 0
+        self.last_visit = None
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        entry = cls(data['url'], data['key'], data['kind'], data['interval'], data['next_visit'])
+        entry.__dict__.update(data)
+        return entry
+
+
+class Scheduler:
+    ''' Priority queue of the pages the daemon revisits, the soonest due first. The interval of each page is learned from what it yielded: the new urls per second of each visit are smoothed with `smoothing`, and the page is visited again when `target` new urls are expected, between `min_interval` and `max_interval` seconds; a page that never yielded anything waits `backoff` times longer after each visit. A new page is visited at once, then after `first_interval`. The queue is kept in `path`, a restart goes on with the intervals learned. '''
+
+    def __init__(self, settings=None, path=None, clock=time.time):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.path = path
+        self.clock = clock
+        self.entries = {}
+        self._heap = []
+        if path and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    self._push(Entry.from_dict(data))
+            logger.info(f'{len(self.entries)} pages to revisit recovered from {path}')
+
+    def _push(self, entry):
+        self.entries[entry.url] = entry
+        # The pages due at the same time are visited by the rate of new urls they yield
+        heapq.heappush(self._heap, (entry.next_visit, -entry.rate, entry.url))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, url, key, kind):
+        ''' Adds a page to the queue, due at once. It returns False when the page was already in it. '''
+        if url in self.entries:
+            return False
+        self._push(Entry(url, key, kind, self.settings['first_interval'], self.clock()))
+        return True
+
+    def retain(self, keys):
+        ''' Drops the pages of the sites that are not crawled any more, or not by this shard. '''
+        for url in [url for url, entry in self.entries.items() if entry.key not in keys]:
+            del self.entries[url]
+
+    def due(self):
+        ''' Takes out of the queue the pages due, up to `round_size`, they are put back when their visit is recorded. '''
+        now = self.clock()
+        entries = []
+        while self._heap and self._heap[0][0] <= now and len(entries) < self.settings['round_size']:
+            next_visit, _, url = heapq.heappop(self._heap)
+            entry = self.entries.get(url)
+            if entry is not None and entry.next_visit == next_visit:
+                entries.append(entry)
+        return entries
+
+    def record(self, entry, new):
+        ''' Records the new urls a visit yielded, learns the interval of the page and puts it back in the queue. '''
+        settings = self.settings
+        now = self.clock()
+        elapsed = now - entry.last_visit if entry.last_visit is not None else entry.interval
+        sample = new / max(elapsed, 1)
+        entry.rate = sample if not entry.visits else settings['smoothing'] * sample + (1 - settings['smoothing']) * entry.rate
+        entry.visits += 1
+        entry.found += new
+        entry.last_visit = now
+        interval = settings['target'] / entry.rate if entry.rate else entry.interval * settings['backoff']
+        entry.interval = min(max(interval, settings['min_interval']), settings['max_interval'])
+        entry.next_visit = now + entry.interval
+        self._push(entry)
+        metrics.inc('visits', stage='extract', kind=entry.kind)
+        metrics.inc('new_urls', new, stage='extract', kind=entry.kind)
+
+    def wait(self):
+        ''' Returns the seconds until the next page is due. '''
+        while self._heap:
+            next_visit, _, url = self._heap[0]
+            entry = self.entries.get(url)
+            if entry is not None and entry.next_visit == next_visit:
+                return max(next_visit - self.clock(), 0)
+            heapq.heappop(self._heap)
+        return None
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([entry.to_dict() for entry in self.entries.values()], f, indent=2)
+        os.replace(tmp, self.path)
+
+    def report(self):
+        ''' Logs the pages that yield the most new urls, with their interval. '''
+        entries = sorted(self.entries.values(), key=lambda entry: entry.rate, reverse=True)
+        for entry in entries[:10]:
+            logger.info(f'{entry.url}: {entry.found} new urls in {entry.visits} visits, revisited every {entry.interval / 60:.0f} min')
+        metrics.set_gauge('pages_scheduled', len(entries), stage='extract')
+
+
+def open_scheduler():
+    ''' This function builds the scheduler configured in the schedule section of config.yaml, with the queue of the last run. '''
+    settings = schedule_settings()
+    return Scheduler(settings, settings['path'])
@@ -0,0 +1,144 @@
+import hashlib
+import math
+import os
+import os.path
+import sqlite3
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from common import settings
+
+DEFAULT_SETTINGS = {
+    'backend': 'memory',
+    'path': 'urls.txt',
+    'database': 'seen.db',
+    'bloom_capacity': 10000000,
+    'bloom_error_rate': 0.001,
+}
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid')
+
+
+def seen_settings():
+    ''' This function returns the seen section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('seen', DEFAULT_SETTINGS)
+
+
+def canonical_url(url):
+    ''' This function returns the canonical form of an url, so the same article is not scraped twice because of the case of the host, the default port, a trailing slash, the fragment or tracking parameters. '''
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ''
+    if parts.port and str(parts.port) != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{parts.port}'
+    path = parts.path.rstrip('/') or '/'
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not key.startswith(TRACKING_PARAMS)]
+    return urlunsplit((scheme, host, path, urlencode(sorted(query)), ''))
+
+
+class BloomFilter:
+    ''' Bloom filter of strings, it answers "not seen" without false negatives using a fixed amount of memory. '''
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class SeenUrls:
+    ''' Index of the scraped urls kept in a set of canonical urls, the membership test is O(1). The urls are persisted in a text file, one per line, and the new ones are appended to it. '''
+
+    def __init__(self, path='urls.txt'):
+        self.path = path
+        self._urls = set()
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._urls.update(canonical_url(line) for line in f if line.strip())
+
+    def __contains__(self, url):
+        return canonical_url(url) in self._urls
+
+    def __len__(self):
+        return len(self._urls)
+
+    def update(self, urls):
+        ''' Adds a list of urls to the index, and appends the new ones to the text file. '''
+        new_urls = []
+        for url in urls:
+            url = canonical_url(url)
+            if url not in self._urls:
+                self._urls.add(url)
+                new_urls.append(url)
+        with open(self.path, 'a+', encoding='utf-8') as f:
+            for url in new_urls:
+                f.write(url + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        pass
+
+
+class NoSeenUrls(SeenUrls):
+    ''' Index of a run that scrapes again the urls already scraped, as a replay from the cache. The urls are kept in memory only. '''
+
+    def __init__(self):
+        self.path = None
+        self._urls = set()
+
+    def update(self, urls):
+        self._urls.update(canonical_url(url) for url in urls)
+
+
+class SqliteSeenUrls:
+    ''' Index of the scraped urls kept on disk in SQLite, for crawls that do not fit in memory. A Bloom filter in front answers the unseen urls without touching the database. The first time it is opened, it imports the urls of the text file. '''
+
+    def __init__(self, database='seen.db', path='urls.txt', bloom_capacity=10000000, bloom_error_rate=0.001):
+        self.connection = sqlite3.connect(database)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS seen (url TEXT PRIMARY KEY) WITHOUT ROWID')
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        if len(self) == 0 and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.update(line for line in f if line.strip())
+        else:
+            for (url,) in self.connection.execute('SELECT url FROM seen'):
+                self.bloom.add(url)
+
+    def __contains__(self, url):
+        url = canonical_url(url)
+        if url not in self.bloom:
+            return False
+        return self.connection.execute('SELECT 1 FROM seen WHERE url = ?', (url,)).fetchone() is not None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    def update(self, urls):
+        ''' Adds a list of urls to the index in a single transaction. '''
+        urls = [canonical_url(url) for url in urls]
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO seen (url) VALUES (?)', ((url,) for url in urls))
+        for url in urls:
+            self.bloom.add(url)
+
+    def close(self):
+        self.connection.close()
+
+
+def open_index():
+    ''' This function opens the index of scraped urls configured in the seen section of config.yaml. '''
+    settings = seen_settings()
+    if settings['backend'] == 'sqlite':
+        return SqliteSeenUrls(settings['database'], settings['path'], settings['bloom_capacity'], settings['bloom_error_rate'])
+    return SeenUrls(settings['path'])
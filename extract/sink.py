@@ -0,0 +1,174 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import os.path
+import time
+from common import settings
+from seen import seen_settings
+from dedup import dedup_settings
+from fetch import host_of
+from shared import metrics
+from shared.vocabulary import fold
+
+logger = logging.getLogger(__name__)
+
+FIELDNAMES = ['title', 'subtitle', 'body', 'images', 'category_long', 'tags', 'author', 'publication_date', 'news_url', 'host']
+DEFAULT_SETTINGS = {
+    'path': 'articles.csv',
+    'checkpoint': 'extract.checkpoint',
+    'flush_every': 50,
+    'flush_seconds': 30,
+}
+
+
+def sink_settings():
+    ''' This function returns the sink section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('sink', DEFAULT_SETTINGS)
+
+
+def file_size(path):
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def truncate(path, size):
+    ''' Cuts a file to the size it had in the last checkpoint, dropping the lines written after it. '''
+    if os.path.isfile(path) and os.path.getsize(path) > size:
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+def fsync_append(path, lines):
+    ''' Appends lines to a text file and waits until they are on disk. '''
+    with open(path, 'a+', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class ArticleSink:
+    ''' Writes each article to articles.csv (or articles.jsonl, articles.jsonl.gz) as soon as it is parsed. Every `flush_every` articles or `flush_seconds` the rows are flushed to disk together with the new lines of categories.txt and urls.txt, and a checkpoint with the size of the three files is saved. A run that stops before closing the sink leaves the checkpoint behind, the next run cuts the files to it and continues from there. '''
+
+    def __init__(self, path='articles.csv', checkpoint='extract.checkpoint', flush_every=50, flush_seconds=30, categories_path='categories.txt', urls_path='urls.txt', fieldnames=FIELDNAMES):
+        self.path = path
+        self.checkpoint = checkpoint
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.categories_path = categories_path
+        self.urls_path = urls_path
+        self.format = 'jsonl' if path.endswith('.jsonl') or path.endswith('.jsonl.gz') else 'csv'
+        self.compressed = path.endswith('.gz')
+        self.resuming = os.path.isfile(checkpoint)
+        if self.resuming:
+            with open(checkpoint, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            truncate(path, self.state['articles'])
+            truncate(categories_path, self.state['categories'])
+            truncate(urls_path, self.state['urls'])
+            logger.info(f'Resuming the extraction from {checkpoint}')
+        else:
+            self.state = {'categories_start': file_size(categories_path)}
+        if self.format == 'jsonl':
+            # The json lines are kept until the commit, a compressed file gets one gzip member per commit
+            self._file = open(path, 'ab' if self.resuming else 'wb')
+            self._lines = []
+        else:
+            self._file = open(path, 'a' if self.resuming else 'w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+            if not self.resuming:
+                self._writer.writeheader()
+        # The categories are compared folded, `Economía` and `ECONOMIA` are written once
+        self._known_categories = set()
+        if os.path.isfile(categories_path):
+            with open(categories_path, 'r', encoding='utf-8') as f:
+                self._known_categories.update(fold(line.replace('\n', '')) for line in f)
+        self._pending_urls = []
+        self._pending_categories = []
+        self._last_commit = time.monotonic()
+        self.index = None
+        self.written = 0
+
+    def committed_urls(self):
+        ''' Returns the urls of the articles already in the file. '''
+        if self.format == 'jsonl':
+            with (gzip.open if self.compressed else open)(self.path, 'rt', encoding='utf-8') as f:
+                return [json.loads(line)['news_url'] for line in f if line.strip()]
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return [row['news_url'] for row in csv.DictReader(f)]
+
+    def resume(self, index):
+        ''' Attaches the index of scraped urls. When the run is resumed, the urls of the articles kept in the file are added again, as the index may have lost the last ones. '''
+        self.index = index
+        if self.resuming:
+            urls = self.committed_urls()
+            index.update(urls)
+            logger.info(f'{len(urls)} articles recovered from the previous run')
+
+    def write(self, article, category):
+        ''' Writes an article and its category, the write is committed with the next checkpoint. '''
+        if self.format == 'jsonl':
+            self._lines.append(json.dumps(article, ensure_ascii=False).encode('utf-8') + b'\n')
+        else:
+            self._writer.writerow(article)
+        self.written += 1
+        metrics.inc('articles_written', stage='extract', host=host_of(article['host']))
+        self._pending_urls.append(article['news_url'])
+        if fold(category) not in self._known_categories:
+            self._known_categories.add(fold(category))
+            self._pending_categories.append(category)
+        if len(self._pending_urls) >= self.flush_every or time.monotonic() - self._last_commit >= self.flush_seconds:
+            self.commit()
+
+    def commit(self):
+        ''' Flushes the articles and the new categories to disk, saves the checkpoint and adds the urls to the index. '''
+        if self.format == 'jsonl' and self._lines:
+            lines = b''.join(self._lines)
+            self._file.write(gzip.compress(lines) if self.compressed else lines)
+            self._lines = []
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        fsync_append(self.categories_path, self._pending_categories)
+        self.state.update({
+            'articles': file_size(self.path),
+            'categories': file_size(self.categories_path),
+            'urls': file_size(self.urls_path),
+        })
+        tmp = f'{self.checkpoint}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.checkpoint)
+        if self.index is not None:
+            self.index.update(self._pending_urls)
+        self._pending_urls = []
+        self._pending_categories = []
+        self._last_commit = time.monotonic()
+
+    def new_categories(self):
+        ''' Returns the categories found in this run that were not in categories.txt. '''
+        with open(self.categories_path, 'r', encoding='utf-8') as f:
+            f.seek(self.state['categories_start'])
+            return [line.replace('\n', '') for line in f]
+
+    def close(self, categories_csv='categories.csv'):
+        ''' Commits the last articles, writes the new categories in categories.csv and removes the checkpoint, the run is complete. '''
+        self.commit()
+        self._file.close()
+        with open(categories_csv, 'w+', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['categories'])
+            writer.writeheader()
+            writer.writerows({'categories': category} for category in self.new_categories())
+        os.remove(self.checkpoint)
+        logger.info(f'{self.written} articles written to {self.path}')
+
+
+def open_sink():
+    ''' This function opens the sink configured in the sink section of config.yaml. '''
+    settings = sink_settings()
+    dedup = dedup_settings()
+    # The duplicates linked to their original have one more column
+    fieldnames = FIELDNAMES + ['duplicate_of'] if dedup['enabled'] and dedup['action'] == 'link' else FIELDNAMES
+    return ArticleSink(settings['path'], settings['checkpoint'], settings['flush_every'], settings['flush_seconds'], urls_path=seen_settings()['path'], fieldnames=fieldnames)
@@ -0,0 +1,77 @@
+import os.path
+import zlib
+from glob import glob
+import yaml
+from lxml import etree
+from common import config
+from fetch import host_of
+from shared import metrics
+
+_extractors = {}
+_sites = None
+
+
+class SiteExtractor:
+    ''' Extractor of a news site. It compiles the XPath queries of the site once, when it is built from config.yaml, and evaluates them over the parsed pages. '''
+
+    def __init__(self, site):
+        self.url = site['url']
+        self.categories_links = etree.XPath(site['categories_links'])
+        self.articles = etree.XPath(site['articles'])
+        self.queries = {field: etree.XPath(query) for field, query in site['queries'].items()}
+
+    def extract(self, parsed):
+        ''' Evaluates every query of the site over a parsed article, in one pass, and returns a dictionary field -> list of strings. '''
+        if not metrics.enabled():
+            return {field: [str(value) for value in query(parsed)] for field, query in self.queries.items()}
+        fields = {}
+        for field, query in self.queries.items():
+            with metrics.timer('parse_field_seconds', stage='extract', host=host_of(self.url), field=field):
+                fields[field] = [str(value) for value in query(parsed)]
+        return fields
+
+
+def read_sites(data, folder='.'):
+    ''' This function returns the sites of a config, key -> site: its news_sites, plus the ones of the yaml files listed in its sites_files, relative to `folder`; a folder in that list stands for all the yaml files in it. '''
+    sites = dict(data.get('news_sites') or {})
+    paths = data.get('sites_files') or []
+    for path in [paths] if isinstance(paths, str) else paths:
+        path = os.path.join(folder, path)
+        files = sorted(glob(os.path.join(path, '*.yaml')) + glob(os.path.join(path, '*.yml'))) if os.path.isdir(path) else [path]
+        for file in files:
+            with open(file, mode='r', encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+            for key, site in (data.get('news_sites') or {}).items():
+                if key in sites:
+                    raise ValueError(f'The site {key} of {file} is already in the list of sites')
+                sites[key] = site
+    return sites
+
+
+def news_sites():
+    ''' This function returns the sites to crawl, key -> site, the ones of config.yaml and of its sites_files, see read_sites. '''
+    global _sites
+    if _sites is None:
+        _sites = read_sites(config())
+    return _sites
+
+
+def shard_of(site, shards):
+    ''' This function returns the shard of a site among `shards`, from the hash of its host, so adding or removing a site does not move the others. '''
+    return zlib.crc32(host_of(site['url']).encode('utf-8')) % shards
+
+
+def sites_to_crawl(shard=None):
+    ''' This function returns the list of (key, site) to crawl: all the sites, or only the ones of `shard`, a tuple (k, N) for the shard k of N. '''
+    sites = list(news_sites().items())
+    if shard is None:
+        return sites
+    k, shards = shard
+    return [(key, site) for key, site in sites if shard_of(site, shards) == k]
+
+
+def extractor(iterator):
+    ''' This function returns the extractor of the site with the key `iterator` in the list of sites, building it the first time it is requested. '''
+    if iterator not in _extractors:
+        _extractors[iterator] = SiteExtractor(news_sites()[iterator])
+    return _extractors[iterator]
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from common import settings
+from fetch import host_of
+from shared import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'workers': None,
+    'queue_size': 32,
+}
+
+
+def parse_settings():
+    ''' This function returns the parse section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('parse', DEFAULT_SETTINGS)
+
+
+def start_measured():
+    ''' Starts the metrics of a process of the pool, without the values it may have copied from the crawl when it was forked. '''
+    metrics.reset()
+    metrics.enable()
+
+
+def measured(function, *args):
+    ''' Runs a parse function in a process of the pool, and returns its result with the metrics it recorded. '''
+    return function(*args), metrics.drain()
+
+
+class ParsePool:
+    ''' Parse stage of the crawl. The pages are parsed in a pool of processes, so the parsing does not stall the downloads and uses all the cores. With 0 workers the pages are parsed in the event loop, one at a time. '''
+
+    def __init__(self, workers=None, queue_size=None):
+        settings = parse_settings()
+        self.workers = settings['workers'] if workers is None else workers
+        self.queue_size = queue_size or settings['queue_size']
+        # The processes record metrics when the crawl does, they are sent back with each result
+        self.measured = metrics.enabled()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=start_measured if self.measured else None) if self.workers != 0 else None
+        if self._executor is not None:
+            self.workers = self._executor._max_workers
+
+    async def parse(self, function, *args):
+        ''' Runs a parse function in the pool, and returns its result. '''
+        if self._executor is None:
+            return function(*args)
+        loop = asyncio.get_running_loop()
+        if self.measured:
+            result, values = await loop.run_in_executor(self._executor, measured, function, *args)
+            metrics.merge(values)
+            return result
+        return await loop.run_in_executor(self._executor, function, *args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+async def fetch_and_parse(fetcher, pool, urls, parse, headers=None, on_response=None, on_result=None):
+    ''' Coroutine that runs the fetch stage and the parse stage of a list of urls. The fetched pages wait in a bounded queue, when it is full the fetch workers stop downloading until the parse workers catch up. `headers(url)` gives the request headers of each url, and `on_response(url, response)` is called with every response. It returns a list of (url, parse(url, content)) for the pages answered with 200; when `on_result(url, result)` is given, each result is handed to it as soon as it is parsed instead of being kept, and the list only has the urls. A page that can not be parsed is logged and left out, an error of `on_result` stops the downloads and is raised. '''
+    queue = asyncio.Queue(maxsize=pool.queue_size)
+    pending = iter(urls)
+    results = []
+    # The first error of on_result, as a sink that can not write, stops the downloads and is raised
+    failures = []
+
+    async def fetch_worker():
+        for url in pending:
+            if failures:
+                return
+            page = await fetcher.get(url, headers(url) if headers else None)
+            if on_response:
+                on_response(url, page)
+            await queue.put((url, page))
+
+    async def parse_worker():
+        while True:
+            url, page = await queue.get()
+            try:
+                if page is not None and page.status_code == 200:
+                    try:
+                        with metrics.timer('parse_seconds', stage='extract', host=host_of(url)):
+                            result = await pool.parse(parse, url, page.content)
+                    except Exception as e:
+                        logger.warning(f'Error while parsing {url}: {e}')
+                        continue
+                    if not on_result:
+                        results.append((url, result))
+                    elif not failures:
+                        try:
+                            on_result(url, result)
+                        except Exception as e:
+                            failures.append(e)
+                            continue
+                        results.append(url)
+                elif page is not None and page.status_code == 304:
+                    logger.info(f'Not modified since the last run: {url}')
+                else:
+                    logger.warning(f'Error while fetching {url}')
+            finally:
+                queue.task_done()
+
+    parse_workers = [asyncio.create_task(parse_worker()) for _ in range(max(pool.workers, 1))]
+    try:
+        await asyncio.gather(*(fetch_worker() for _ in range(fetcher.max_per_host)))
+        await queue.join()
+    finally:
+        for worker in parse_workers:
+            worker.cancel()
+    if failures:
+        raise failures[0]
+    return results
@@ -0,0 +1,74 @@
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    ''' Local HTTP server that stands in for a news site in the tests and benchmarks. It serves the pages given as a dict path -> bytes after `latency` seconds, answers 503 to the first `fail_first` requests, 304 to the conditional requests of unchanged pages, and keeps track of the requests in flight. '''
+
+    def __init__(self, pages=None, latency=0.0, status=200, fail_first=0):
+        self.pages = pages or {}
+        self.latency = latency
+        self.status = status
+        self.fail_first = fail_first
+        self.requests = 0
+        self.headers = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.requests += 1
+                    stand_in.headers.append(dict(self.headers))
+                    failing = stand_in.requests <= stand_in.fail_first
+                    stand_in.in_flight += 1
+                    stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+                try:
+                    time.sleep(stand_in.latency)
+                    page = stand_in.pages.get(self.path)
+                    status = stand_in.status if page is not None else 404
+                    if failing:
+                        status = 503
+                    body = page if page is not None else b'Not found'
+                    etag = f'"{hashlib.md5(body).hexdigest()}"'
+                    if status == 200 and self.headers.get('If-None-Match') == etag:
+                        status = 304
+                        body = b''
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stand_in._lock:
+                        stand_in.in_flight -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
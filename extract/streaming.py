@@ -0,0 +1,143 @@
+import codecs
+import re
+import lxml.html as html
+from lxml import etree
+from common import settings
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'chunk_size': 16384,
+    'required': ['title', 'content', 'publication_date', 'tags', 'categories'],
+}
+CHARSET = re.compile(rb'''<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)''', re.IGNORECASE)
+HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+# The charset is declared at the top of the page, it is looked for in its first bytes
+SNIFF_BYTES = 1024
+# The block holding the matches of a field is looked for below these elements
+PAGE_TAGS = {'html', 'head', 'body'}
+LITERAL = re.compile(r'''["']([^"']+)["']''')
+
+_parsers = {}
+
+
+def streaming_settings():
+    ''' This function returns the streaming section of config.yaml, filling the missing keys with the defaults. It is read by the serial crawl only, the concurrent crawl downloads each article whole and parses it in the pool of processes. '''
+    return settings('streaming', DEFAULT_SETTINGS)
+
+
+def known_encoding(name):
+    ''' Returns the name of a codec Python knows, or None. '''
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+
+def declared_encoding(content_type=None, head=b''):
+    ''' This function returns the encoding of a page: the charset of its Content-Type header, or the one of its meta tags, UTF-8 when none is declared or known. '''
+    match = HEADER_CHARSET.search(content_type or '')
+    if match and known_encoding(match.group(1)):
+        return known_encoding(match.group(1))
+    match = CHARSET.search(head[:SNIFF_BYTES])
+    if match and known_encoding(match.group(1).decode('ascii')):
+        return known_encoding(match.group(1).decode('ascii'))
+    return 'utf-8'
+
+
+def parse_html(content, encoding=None):
+    ''' This function parses a whole page in the encoding it declares, see declared_encoding. '''
+    encoding = encoding or declared_encoding(head=content)
+    if encoding not in _parsers:
+        _parsers[encoding] = html.HTMLParser(encoding=encoding)
+    return html.fromstring(content, parser=_parsers[encoding])
+
+
+def required_fields(site, queries):
+    ''' This function returns the fields an article of a site needs before its download can stop: the `required` of the site, or of the streaming section, all the fields of the site when none is given. '''
+    required = site.get('required') or streaming_settings()['required'] or list(queries)
+    unknown = [field for field in required if field not in queries]
+    if unknown:
+        raise ValueError(f'The required fields {unknown} of {site["url"]} have no query')
+    return required
+
+
+class StreamingParser:
+    ''' Incremental parse of an article. The chunks of the page are fed to a pull parser as they are downloaded, and the required queries of the site are evaluated over the part of the tree already built; a field is found when its query matches and the list holding its last match is closed, so the paragraphs of a body or its tags are not cut. Once every required field is found the rest of the page is neither downloaded nor parsed. '''
+
+    def __init__(self, site_extractor, required, encoding=None):
+        self.extractor = site_extractor
+        self.required = [(site_extractor.queries[field], LITERAL.findall(site_extractor.queries[field].path)) for field in required]
+        self.encoding = encoding
+        self.parser = None
+        self.root = None
+        self.pending = b''
+        self.bytes = 0
+        self.done = False
+
+    def _closed(self, value, literals):
+        ''' Returns True when the block holding a match is closed: the outermost element above it whose class or id is named in the query, as the list of the tags or the block around the paragraphs of a body; the element below the body or the head when the query names none. '''
+        node = value.getparent() if isinstance(value, str) else value
+        holder = None
+        while True:
+            parent = node.getparent()
+            if parent is None or parent.tag in PAGE_TAGS:
+                break
+            node = parent
+            names = f'{node.get("class") or ""} {node.get("id") or ""}'
+            if any(literal in names for literal in literals):
+                holder = node
+        holder = node if holder is None else holder
+        # The elements still open are on the last branch of the tree, the ones with nothing after them
+        return any(element.getnext() is not None for element in holder.iterancestors()) or holder.getnext() is not None
+
+    def _found(self):
+        for position, (query, literals) in enumerate(self.required):
+            values = query(self.root)
+            if not values or not self._closed(values[-1], literals):
+                # The field missing is looked for first in the next chunk, until it is found the others are not evaluated
+                self.required.insert(0, self.required.pop(position))
+                return False
+        return True
+
+    def _start(self, encoding):
+        # Only the start of the root is reported, the queries are evaluated over the tree it holds
+        self.parser = etree.HTMLPullParser(events=('start',), tag='html', encoding=self.encoding or encoding)
+
+    def _parse(self, data):
+        self.parser.feed(data)
+        if self.root is None:
+            for _, element in self.parser.read_events():
+                self.root = element
+
+    def feed(self, chunk, content_type=None):
+        ''' Parses a chunk of the page, and returns True once every required field is found. The encoding is the one given, or the one declared by the Content-Type header or at the top of the page. '''
+        self.bytes += len(chunk)
+        data = self.pending + chunk
+        if self.parser is None:
+            # The top of the page is kept until the meta tags declaring its charset can be read
+            if len(data) < SNIFF_BYTES and not HEADER_CHARSET.search(content_type or '') and not self.encoding:
+                self.pending = data
+                return False
+            self._start(declared_encoding(content_type, data))
+        # The parser is fed up to the end of the last tag, a text cut between two chunks would be split in two nodes
+        cut = data.rfind(b'>') + 1
+        if not cut:
+            self.pending = data
+            return False
+        self.pending = data[cut:]
+        self._parse(data[:cut])
+        if self.root is not None:
+            self.done = self._found()
+        return self.done
+
+    def close(self):
+        ''' Ends the parse, and returns the fields of the article, dictionary field -> list of strings. '''
+        if self.parser is None:
+            if not self.pending:
+                return {field: [] for field in self.extractor.queries}
+            self._start(declared_encoding(head=self.pending))
+        if self.pending:
+            self._parse(self.pending)
+            self.pending = b''
+        root = self.parser.close()
+        return self.extractor.extract(root)
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import time
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import fetch
+from cache import ResponseCache, CachedResponse
+from extract import articles_urls_extraction, articles_and_categories_extraction
+from stand_in import StandInServer
+
+logger = logging.getLogger(__name__)
+
+CATEGORY = b'<html><body><article><div><a href="/nota-1">1</a></div></article><article><div><a href="/nota-2">2</a></div></article></body></html>'
+
+
+def response(content, status_code=200, headers=None):
+    return CachedResponse('https://www.vanguardia.com/nota', status_code, headers or {}, content)
+
+
+class Test_Cache(unittest.TestCase):
+    logger.info('Starting test for the response cache.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        with open('fixtures/vanguardia_article.html', 'rb') as f:
+            self.article = f.read()
+
+    def tearDown(self):
+        fetch.use_cache(None)
+        fetch.close_sessions()
+        self.folder.cleanup()
+
+    def test_put_and_get(self):
+        ''' Test that verifies a page is stored compressed and served with its validators, and the errors are not stored '''
+        cache = ResponseCache(self.folder.name)
+        cache.put('https://www.vanguardia.com/nota-1', response(self.article, headers={'ETag': '"abc"'}))
+        cache.put('https://www.vanguardia.com/nota-2', response(b'', status_code=503))
+        cached = cache.get('https://www.vanguardia.com/nota-1')
+        self.assertEqual(cached.content, self.article)
+        self.assertEqual(cached.headers['etag'], '"abc"')
+        self.assertIsNone(cache.get('https://www.vanguardia.com/nota-2'))
+        self.assertLess(cache.size(), len(self.article))
+        cache.close()
+
+    def test_content_addressed(self):
+        ''' Test that verifies the same page under two urls is stored once '''
+        cache = ResponseCache(self.folder.name)
+        cache.put('https://www.vanguardia.com/nota-1', response(self.article))
+        cache.put('https://www.vanguardia.com/nota-1?page=1', response(self.article))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.connection.execute('SELECT COUNT(*) FROM objects').fetchone()[0], 1)
+        cache.close()
+
+    def test_ttl(self):
+        ''' Test that verifies an old page is downloaded again, but served in a replay '''
+        cache = ResponseCache(self.folder.name, ttl=0.01)
+        cache.put('https://www.vanguardia.com/nota-1', response(self.article))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('https://www.vanguardia.com/nota-1'))
+        cache.replay = True
+        self.assertEqual(cache.get('https://www.vanguardia.com/nota-1').content, self.article)
+        cache.close()
+
+    def test_lru_eviction(self):
+        ''' Test that verifies the least recently used pages are evicted when the cache is full '''
+        pages = [os.urandom(1000) for _ in range(3)]
+        cache = ResponseCache(self.folder.name, max_size=2500)
+        cache.put('https://www.vanguardia.com/nota-0', response(pages[0]))
+        cache.put('https://www.vanguardia.com/nota-1', response(pages[1]))
+        cache.get('https://www.vanguardia.com/nota-0')
+        cache.put('https://www.vanguardia.com/nota-2', response(pages[2]))
+        self.assertIsNone(cache.get('https://www.vanguardia.com/nota-1'))
+        self.assertIsNotNone(cache.get('https://www.vanguardia.com/nota-0'))
+        self.assertLessEqual(cache.size(), 2500)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk(os.path.join(self.folder.name, 'objects'))), 2)
+        cache.close()
+
+    def test_replay_offline(self):
+        ''' Test that verifies an extraction recorded in the cache is replayed without the server '''
+        pages = {'/deportes': CATEGORY, '/nota-1': self.article, '/nota-2': self.article}
+        fetch.use_cache(ResponseCache(self.folder.name))
+        with StandInServer(pages) as server:
+            host = server.url
+            links = articles_urls_extraction(host, [f'{host}/deportes'], 0)
+            recorded = [articles_and_categories_extraction(host, link, 0) for link in links]
+        fetch.use_cache(ResponseCache(self.folder.name, replay=True))
+        self.assertEqual(articles_urls_extraction(host, [f'{host}/deportes'], 0), links)
+        self.assertEqual([articles_and_categories_extraction(host, link, 0) for link in links], recorded)
+        self.assertEqual(fetch.get(f'{host}/nota-3').status_code, 504)
+        self.assertEqual(server.requests, 3)
+
+if __name__ == "__main__":
+    unittest.main()
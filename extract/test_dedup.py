@@ -0,0 +1,94 @@
+import csv
+import os
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from dedup import normalize_text, simhash, distance, DedupIndex, DedupSink
+from sink import ArticleSink, FIELDNAMES
+
+logger = logging.getLogger(__name__)
+
+STORY = ('El tifón Goni tocó tierra en la isla de Catanduanes con vientos de hasta 225 kilómetros por hora y ráfagas '
+         'que arrancaron tejados y árboles, provocaron inundaciones y dejaron sin electricidad a miles de familias. '
+         'Las autoridades evacuaron a casi un millón de personas de las zonas costeras antes de la llegada del tifón, '
+         'el más fuerte registrado este año en el mundo según los servicios meteorológicos de la región. '
+         'En la provincia de Albay, al sur de la capital, los deslizamientos de lodo y rocas volcánicas sepultaron '
+         'decenas de viviendas en las faldas del volcán Mayon, y los equipos de rescate buscaban a los desaparecidos. '
+         'El presidente pidió a los gobiernos locales acelerar la entrega de alimentos, agua y medicinas a los '
+         'albergues, donde miles de familias pasaron la noche mientras el tifón avanzaba hacia el mar de China Meridional. '
+         'Los vuelos nacionales e internacionales fueron cancelados, los puertos cerraron y las clases a distancia se '
+         'suspendieron en varias regiones del archipiélago, que todavía se recupera de las tormentas de las últimas semanas.')
+
+
+def article(host, path, body):
+    return {'title': ['Tifón Goni'], 'subtitle': [], 'body': body, 'images': [], 'category_long': ['Mundo'], 'tags': [], 'author': [], 'publication_date': ['2020-11-01'], 'news_url': f'{host}/{path}', 'host': host}
+
+
+class ListSink:
+    def __init__(self):
+        self.articles = []
+
+    def write(self, article, category):
+        self.articles.append(article)
+
+
+class Test_Dedup(unittest.TestCase):
+    logger.info('Starting test for the deduplication of the articles.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.folder.name, 'dedup.db')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_normalize_text(self):
+        ''' Test that verifies the case, accents and punctuation do not change the text '''
+        self.assertEqual(normalize_text(['El Tifón, GONI.']), normalize_text(['el tifon goni']))
+
+    def test_simhash_near_duplicates(self):
+        ''' Test that verifies a story with a word changed is within the default distance, and another story is far '''
+        story = simhash(normalize_text([STORY]))
+        edited = simhash(normalize_text([STORY.replace('miles', 'cientos')]))
+        other = simhash(normalize_text(['La selección Colombia venció a Chile en el partido de las eliminatorias ' * 4]))
+        self.assertLessEqual(distance(story, edited), 6)
+        self.assertGreater(distance(story, other), 6)
+
+    def test_duplicates_across_hosts(self):
+        ''' Test that verifies the same story of another host is a duplicate, and the same url is not '''
+        index = DedupIndex(self.database)
+        self.assertIsNone(index.check(article('https://www.ntn24.com', 'tifon', [STORY])))
+        self.assertIsNone(index.check(article('https://www.ntn24.com', 'tifon', [STORY])))
+        self.assertEqual(index.check(article('https://noticias.canalrcn.com', 'tifon-goni', [STORY.upper()])), 'https://www.ntn24.com/tifon')
+        self.assertIsNone(index.check(article('https://noticias.canalrcn.com', 'corto', ['Texto corto'])))
+        self.assertEqual(index.duplicate_rates(), {'https://www.ntn24.com': 0, 'https://noticias.canalrcn.com': 0.5})
+        index.close()
+
+    def test_index_is_persistent(self):
+        ''' Test that verifies the fingerprints are kept between runs '''
+        index = DedupIndex(self.database, method='exact')
+        index.check(article('https://www.ntn24.com', 'tifon', [STORY]))
+        index.close()
+        index = DedupIndex(self.database, method='exact')
+        self.assertEqual(index.check(article('https://actualidad.rt.com', 'tifon', [STORY])), 'https://www.ntn24.com/tifon')
+        index.close()
+
+    def test_dedup_sink(self):
+        ''' Test that verifies the duplicates are dropped, or written with the url of the original '''
+        sink = ListSink()
+        writer = DedupSink(sink, DedupIndex(self.database))
+        writer.write(article('https://www.ntn24.com', 'tifon', [STORY]), 'Mundo')
+        writer.write(article('https://actualidad.rt.com', 'tifon', [STORY]), 'Mundo')
+        self.assertEqual(len(sink.articles), 1)
+        path = os.path.join(self.folder.name, 'articles.csv')
+        csv_sink = ArticleSink(path, os.path.join(self.folder.name, 'extract.checkpoint'), categories_path=os.path.join(self.folder.name, 'categories.txt'), urls_path=os.path.join(self.folder.name, 'urls.txt'), fieldnames=FIELDNAMES + ['duplicate_of'])
+        writer = DedupSink(csv_sink, writer.index, action='link')
+        writer.write(article('https://www.eluniversal.com.mx', 'tifon', [STORY]), 'Mundo')
+        csv_sink.close(os.path.join(self.folder.name, 'categories.csv'))
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(rows[0]['duplicate_of'], 'https://www.ntn24.com/tifon')
+        writer.index.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import gzip
+import os
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import fetch
+from extract import crawl
+from discovery import Discovery, DiscoveryState, FeedParser, get_feed, parse_feed, robots_sitemaps
+from seen import NoSeenUrls
+from validators import NoValidators
+from stand_in import StandInServer
+from test_sites import read_page
+
+logger = logging.getLogger(__name__)
+NOW = datetime.datetime.now(datetime.timezone.utc)
+OLD = NOW - datetime.timedelta(days=10)
+
+
+def sitemap_index(host, sitemaps):
+    entries = ''.join(f'<sitemap><loc>{host}{path}</loc><lastmod>{date.isoformat()}</lastmod></sitemap>' for path, date in sitemaps)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'.encode('utf-8')
+
+def urlset(host, articles):
+    entries = ''.join(f'<url><loc>{host}{path}</loc><lastmod>{date.isoformat()}</lastmod></url>' for path, date in articles)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'.encode('utf-8')
+
+
+class MemorySink:
+    def __init__(self):
+        self.articles = []
+
+    def write(self, data, category):
+        self.articles.append(data['news_url'])
+
+
+class Test_Discovery(unittest.TestCase):
+    logger.info('Starting test for the discovery of the articles through the sitemaps and feeds.')
+    def tearDown(self):
+        fetch.close_sessions()
+
+    def test_parse_feeds(self):
+        ''' Test that verifies the sitemap indexes, the gzipped sitemaps, the news sitemaps, the RSS and the Atom feeds are read with their dates '''
+        host = 'https://www.ntn24.com'
+        index = parse_feed(f'{host}/sitemap.xml', sitemap_index(host, [('/sitemap-1.xml.gz', NOW)]))
+        self.assertEqual(index, {'sitemaps': [(f'{host}/sitemap-1.xml.gz', NOW)], 'articles': []})
+        sitemap = parse_feed(f'{host}/sitemap-1.xml.gz', gzip.compress(urlset(host, [('/a1', NOW), ('/a2', OLD)])))
+        self.assertEqual(sitemap['articles'], [(f'{host}/a1', NOW), (f'{host}/a2', OLD)])
+        news = parse_feed(f'{host}/news.xml', b'''<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">
+            <url><loc>https://www.ntn24.com/a3</loc><news:news><news:publication_date>2021-06-01T10:00:00-05:00</news:publication_date></news:news></url></urlset>''')
+        self.assertEqual(news['articles'][0][1], datetime.datetime(2021, 6, 1, 15, tzinfo=datetime.timezone.utc))
+        rss = parse_feed(f'{host}/rss', b'''<rss version="2.0"><channel><title>NTN24</title><link>https://www.ntn24.com</link>
+            <item><title>Uno</title><link>https://www.ntn24.com/a4</link><pubDate>Tue, 01 Jun 2021 10:00:00 GMT</pubDate></item>
+            <item><title>Dos</title><link>https://www.ntn24.com/a5</link></item></channel></rss>''')
+        self.assertEqual(rss['articles'], [(f'{host}/a4', datetime.datetime(2021, 6, 1, 10, tzinfo=datetime.timezone.utc)), (f'{host}/a5', None)])
+        atom = parse_feed(f'{host}/atom', b'''<feed xmlns="http://www.w3.org/2005/Atom"><entry><link href="https://www.ntn24.com/a6"/><updated>2021-06-01T10:00:00Z</updated></entry></feed>''')
+        self.assertEqual(atom['articles'], [(f'{host}/a6', datetime.datetime(2021, 6, 1, 10, tzinfo=datetime.timezone.utc))])
+        self.assertEqual(parse_feed(f'{host}/', b'<html><body>Not a feed</body></html>'), {'sitemaps': [], 'articles': []})
+        self.assertEqual(parse_feed(f'{host}/sitemap-1.xml.gz', gzip.compress(b'<urlset><url><loc>')), {'sitemaps': [], 'articles': []})
+        self.assertEqual(robots_sitemaps(b'User-agent: *\nDisallow: /admin\nSitemap: https://www.ntn24.com/sitemap.xml\n'), ['https://www.ntn24.com/sitemap.xml'])
+
+    def test_parse_in_chunks(self):
+        ''' Test that verifies a gzipped sitemap is read as it arrives, whatever the size of its chunks, and the serial crawl parses it while it is downloaded '''
+        host = 'https://www.ntn24.com'
+        content = gzip.compress(urlset(host, [(f'/a{i}', NOW) for i in range(2000)]))
+        parser = FeedParser(f'{host}/sitemap.xml.gz')
+        parser.push(content[:1])
+        for start in range(1, len(content), 100):
+            parser.push(content[start:start + 100])
+            # The articles are read while the file arrives
+            if start > len(content) // 2:
+                self.assertGreater(len(parser.feed['articles']), 0)
+        feed = parser.close()
+        self.assertEqual(feed, parse_feed(f'{host}/sitemap.xml.gz', content))
+        self.assertEqual(feed['articles'][-1], (f'{host}/a1999', NOW))
+        with StandInServer({'/sitemap.xml.gz': content}) as site:
+            self.assertEqual(get_feed(f'{site.url}/sitemap.xml.gz'), feed)
+            self.assertIsNone(get_feed(f'{site.url}/missing.xml'))
+
+    def test_since_last_run(self):
+        ''' Test that verifies only the sitemaps and articles changed since the last run of the host are kept, and the run is recorded '''
+        host = 'https://www.ntn24.com'
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'discovery.json')
+            state = DiscoveryState(path, max_age=2)
+            discovery = Discovery(state)
+            feeds = [{'sitemaps': [(f'{host}/old.xml', OLD), (f'{host}/new.xml', NOW)], 'articles': [(f'{host}/a1', NOW), (f'{host}/a2', OLD), ('https://actualidad.rt.com/a3', NOW), (f'{host}/a4.pdf', NOW)]}]
+            self.assertEqual(discovery.select(host, feeds, state.since(host)), ([f'{host}/new.xml'], [f'{host}/a1']))
+            discovery.finish(host, [f'{host}/a1'], 2)
+            # The host is marked once its articles are crawled
+            self.assertNotIn(host, state.hosts)
+            discovery.done(host)
+            state.save()
+            self.assertEqual(DiscoveryState(path).since(host), state.started)
+            # The file of the first versions kept only the date of each host
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f'{{"{host}": "{OLD.isoformat()}"}}')
+            self.assertEqual(DiscoveryState(path).since(host), OLD)
+
+    def test_crawl_through_sitemaps(self):
+        ''' Test that verifies a site with a sitemap in its robots.txt is crawled through it, with fewer requests than through its categories '''
+        article = read_page('vanguardia', 'article')
+        home = b'<html><body>' + b''.join(b'<div class="nav-dropdown nav noSubNav"><ul><li><a href="/cat%d">c</a></li></ul></div>' % i for i in range(8)) + b'</body></html>'
+        category = b'<html><body>' + b''.join(b'<article><div><a href="/a%d">x</a></div></article>' % i for i in range(5)) + b'</body></html>'
+        pages = {'/': home, **{f'/cat{i}': category for i in range(8)}, **{f'/a{i}': article for i in range(5)}}
+        with StandInServer(dict(pages)) as categories_site, StandInServer(dict(pages)) as sitemaps_site:
+            sitemaps_site.pages['/robots.txt'] = f'User-agent: *\nSitemap: {sitemaps_site.url}/sitemap.xml\n'.encode('utf-8')
+            sitemaps_site.pages['/sitemap.xml'] = sitemap_index(sitemaps_site.url, [('/sitemap-new.xml', NOW), ('/sitemap-old.xml', OLD)])
+            sitemaps_site.pages['/sitemap-new.xml'] = urlset(sitemaps_site.url, [(f'/a{i}', NOW) for i in range(4)])
+            sitemaps_site.pages['/sitemap-old.xml'] = urlset(sitemaps_site.url, [('/a4', OLD)])
+            with tempfile.TemporaryDirectory() as folder:
+                discovery = Discovery(DiscoveryState(os.path.join(folder, 'discovery.json')))
+                sinks = []
+                for site in [categories_site, sitemaps_site]:
+                    sink = MemorySink()
+                    asyncio.run(crawl([(0, {'url': site.url})], NoSeenUrls(), NoValidators(), sink, delay=0, workers=0, discovery=discovery))
+                    sinks.append(sink)
+            # The site without sitemap falls back to its categories
+            self.assertEqual(len(sinks[0].articles), 5)
+            self.assertEqual(categories_site.requests, 1 + 1 + 8 + 5)
+            # The old sitemap is not read and its article is not downloaded
+            self.assertEqual(sorted(sinks[1].articles), [f'{sitemaps_site.url}/a{i}' for i in range(4)])
+            self.assertEqual(sitemaps_site.requests, 1 + 2 + 4)
+
+    def test_retry_failed_articles(self):
+        ''' Test that verifies the articles discovered that could not be downloaded are tried again in the next runs, even when their sitemap did not change, up to max_retries times '''
+        article = read_page('vanguardia', 'article')
+        with StandInServer({f'/a{i}': article for i in range(2)}) as site:
+            site.pages['/robots.txt'] = f'User-agent: *\nSitemap: {site.url}/sitemap.xml\n'.encode('utf-8')
+            site.pages['/sitemap.xml'] = urlset(site.url, [(f'/a{i}', NOW) for i in range(3)])
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'discovery.json')
+                runs = []
+                for run in range(4):
+                    if run == 2:
+                        site.pages['/sitemap.xml'] = urlset(site.url, [('/a3', datetime.datetime.now(datetime.timezone.utc))])
+                    if run == 3:
+                        site.pages['/a3'] = article
+                    state = DiscoveryState(path, max_retries=2)
+                    sink = MemorySink()
+                    asyncio.run(crawl([(0, {'url': site.url})], NoSeenUrls(), NoValidators(), sink, delay=0, workers=0, discovery=Discovery(state)))
+                    state.save()
+                    runs.append((sorted(sink.articles), state.pending(site.url)))
+        # a2 is missing, it is tried again in the next runs while the sitemap has nothing new, then dropped
+        self.assertEqual(runs[0], ([f'{site.url}/a0', f'{site.url}/a1'], [f'{site.url}/a2']))
+        self.assertEqual(runs[1], ([], [f'{site.url}/a2']))
+        self.assertEqual(runs[2], ([], [f'{site.url}/a3']))
+        # a3 is found once it is published
+        self.assertEqual(runs[3], ([f'{site.url}/a3'], []))
+        self.assertEqual(site.requests, 4 * 2 + 3 + 1 + 2 + 1)
+
+if __name__ == "__main__":
+    unittest.main()
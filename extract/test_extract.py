@@ -1,7 +1,12 @@
+import shutil
+import tempfile
 import unittest
 import logging
 logging.basicConfig(level=logging.INFO)
-from extract import build_link, recover_text_file, categories_urls_extraction, articles_urls_extraction, articles_and_categories_extraction
+import fetch
+from cache import CachedResponse, ResponseCache
+from extract import build_link, recover_text_file, categories_urls_extraction, articles_urls_extraction, articles_and_categories_extraction, parse_categories, parse_article_links
+from test_sites import FIXTURES, read_page
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +15,27 @@ HOST = ['https://www.vanguardia.com', 'https://noticias.canalrcn.com', 'https://
 class Test_Extract(unittest.TestCase):
     # Test Build links function
     logger.info('Starting test for the data extraction.')
+    @classmethod
+    def setUpClass(cls):
+        # The sites are served from a replay cache seeded with the fixtures, the tests do not go to the network
+        cls.folder = tempfile.mkdtemp()
+        cls.cache = ResponseCache(cls.folder, replay=True)
+        for iterator, name in enumerate(FIXTURES):
+            pages = {HOST[iterator]: read_page(name, 'home')}
+            for category in parse_categories(HOST[iterator], HOST[iterator], pages[HOST[iterator]], iterator):
+                pages[category] = read_page(name, 'category')
+                for article in parse_article_links(HOST[iterator], category, pages[category], iterator):
+                    pages[article] = read_page(name, 'article')
+            for url, content in pages.items():
+                cls.cache.put(url, CachedResponse(url, 200, {'Content-Type': 'text/html; charset=utf-8'}, content))
+        fetch.use_cache(cls.cache)
+
+    @classmethod
+    def tearDownClass(cls):
+        fetch.use_cache(None)
+        cls.cache.close()
+        shutil.rmtree(cls.folder)
+
     def test_build_link(self):
         ''' Test that verifies if a link is well formed '''
         logger.info('Starting build link test')
@@ -46,14 +72,14 @@ class Test_Extract(unittest.TestCase):
         ''' Test that verifies that the categories are recovered from the host '''
         logger.info('Starting test for categories url extraction')
         for iterator in range(len(HOST)):
-            self.assertIsNotNone(categories_urls_extraction(HOST[iterator], iterator))
+            self.assertTrue(categories_urls_extraction(HOST[iterator], iterator), HOST[iterator])
 
     def test_articles_url_extraction(self):
         ''' Test that verifies if the url articles are extracted from the categories url list '''
         logger.info('Starting test for articles url extraction')
         for iterator in range(len(HOST)):
             categories = categories_urls_extraction(HOST[iterator], iterator)
-            self.assertIsNotNone(articles_urls_extraction(HOST[iterator], categories, iterator))
+            self.assertTrue(articles_urls_extraction(HOST[iterator], categories, iterator), HOST[iterator])
         
 
     def test_articles_and_categories_extraction(self):
@@ -63,7 +89,10 @@ class Test_Extract(unittest.TestCase):
             categories = categories_urls_extraction(HOST[iterator], iterator)
             articles = articles_urls_extraction(HOST[iterator], categories, iterator)
             for article in articles:
-                self.assertIsNotNone(articles_and_categories_extraction(HOST[iterator], article, iterator))
+                data, category = articles_and_categories_extraction(HOST[iterator], article, iterator)
+                self.assertTrue(data['title'], article)
+        # Every page was served by the cache
+        self.assertEqual(self.cache.misses, 0)
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from fetch import Fetcher, host_of, get, connection_stats, close_sessions
+from stand_in import StandInServer
+
+logger = logging.getLogger(__name__)
+PAGES = {f'/page-{i}': f'<html><body><p>{i}</p></body></html>'.encode('utf-8') for i in range(12)}
+
+
+class Test_Fetch(unittest.TestCase):
+    logger.info('Starting test for the fetch engine.')
+    def test_host_of(self):
+        ''' Test that verifies the host key of an url '''
+        self.assertEqual(host_of('https://www.ntn24.com/internacional/espana'), 'www.ntn24.com')
+
+    def test_get_many_keeps_order(self):
+        ''' Test that verifies the responses are returned in the same order as the urls '''
+        with StandInServer(PAGES) as server:
+            urls = [f'{server.url}/page-{i}' for i in range(12)]
+            fetcher = Fetcher(max_connections=8, max_per_host=8, delay=0)
+            responses = asyncio.run(fetcher.get_many(urls))
+            fetcher.close()
+        self.assertEqual([r.content for r in responses], [PAGES[f'/page-{i}'] for i in range(12)])
+
+    def test_per_host_limit(self):
+        ''' Test that verifies a host never receives more requests at the same time than the per host cap '''
+        with StandInServer(PAGES, latency=0.05) as server:
+            urls = [f'{server.url}/page-{i}' for i in range(12)]
+            fetcher = Fetcher(max_connections=8, max_per_host=2, delay=0)
+            asyncio.run(fetcher.get_many(urls))
+            fetcher.close()
+        self.assertLessEqual(server.max_in_flight, 2)
+        self.assertEqual(server.requests, 12)
+
+    def test_politeness_delay(self):
+        ''' Test that verifies the requests to the same host are separated by the delay '''
+        with StandInServer(PAGES) as server:
+            urls = [f'{server.url}/page-{i}' for i in range(4)]
+            fetcher = Fetcher(max_connections=4, max_per_host=4, delay=0.1)
+            start = time.monotonic()
+            asyncio.run(fetcher.get_many(urls))
+            fetcher.close()
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+    def test_connections_are_reused(self):
+        ''' Test that verifies the requests to the same host reuse the pooled keep-alive connection '''
+        close_sessions()
+        with StandInServer(PAGES) as server:
+            for i in range(5):
+                self.assertEqual(get(f'{server.url}/page-{i}').status_code, 200)
+        stats = connection_stats()
+        close_sessions()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 4)
+        self.assertIn('gzip', server.headers[0]['Accept-Encoding'])
+
+    def test_transient_failures_are_retried(self):
+        ''' Test that verifies a 503 answer is retried and counted '''
+        close_sessions()
+        with StandInServer(PAGES, fail_first=1) as server:
+            response = get(f'{server.url}/page-0')
+        stats = connection_stats()
+        close_sessions()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.requests, 2)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_failed_request(self):
+        ''' Test that verifies a connection error returns None instead of raising '''
+        fetcher = Fetcher(max_connections=1, max_per_host=1, delay=0)
+        self.assertIsNone(asyncio.run(fetcher.get('http://127.0.0.1:9/unreachable')))
+        fetcher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
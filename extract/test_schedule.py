@@ -0,0 +1,154 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import fetch
+from common import config
+from daemon import BatchSink, hand_over, run
+from extract import parse_article
+from schedule import Scheduler, HOST, CATEGORY
+from seen import NoSeenUrls
+from validators import NoValidators
+from stand_in import StandInServer
+from test_sites import read_page
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+logger = logging.getLogger(__name__)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class Test_Schedule(unittest.TestCase):
+    logger.info('Starting test for the scheduler of the crawl daemon.')
+    def setUp(self):
+        config()
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        fetch.close_sessions()
+
+    def test_learned_intervals(self):
+        ''' Test that verifies the pages that yield new urls are revisited sooner, and the ones that yield nothing later and later '''
+        clock = Clock()
+        scheduler = Scheduler({'first_interval': 900, 'min_interval': 60, 'max_interval': 7200, 'target': 1, 'smoothing': 1}, clock=clock)
+        self.assertTrue(scheduler.add('https://a.com', 0, HOST))
+        self.assertFalse(scheduler.add('https://a.com', 0, HOST))
+        scheduler.add('https://a.com/deportes', 0, CATEGORY)
+        scheduler.add('https://a.com/opinion', 0, CATEGORY)
+        self.assertEqual(len(scheduler.due()), 3)
+        self.assertEqual(scheduler.due(), [])
+        busy, quiet = scheduler.entries['https://a.com/deportes'], scheduler.entries['https://a.com/opinion']
+        scheduler.record(busy, 3)
+        scheduler.record(quiet, 0)
+        scheduler.record(scheduler.entries['https://a.com'], 1)
+        # 3 new urls in the first 900 seconds, one is expected every 300
+        self.assertEqual(busy.interval, 300)
+        self.assertEqual(quiet.interval, 1800)
+        self.assertEqual(scheduler.wait(), 300)
+        clock.now += 300
+        self.assertEqual(scheduler.due(), [busy])
+        scheduler.record(busy, 30)
+        self.assertEqual(busy.interval, 60)
+        clock.now += 1800
+        scheduler.record(quiet, 0)
+        self.assertEqual(quiet.interval, 3600)
+        clock.now += 20000
+        scheduler.record(quiet, 0)
+        self.assertEqual(quiet.interval, 7200)
+
+    def test_restart(self):
+        ''' Test that verifies the queue is saved with its intervals and a restart goes on from it, without the sites no longer crawled '''
+        clock = Clock()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'schedule.json')
+            scheduler = Scheduler({'min_interval': 60}, path, clock)
+            scheduler.add('https://a.com', 0, HOST)
+            scheduler.add('https://b.com', 1, HOST)
+            for entry in scheduler.due():
+                scheduler.record(entry, 2 if entry.key == 0 else 0)
+            scheduler.save()
+            restarted = Scheduler({'min_interval': 60}, path, clock)
+            self.assertEqual([entry.to_dict() for entry in restarted.entries.values()], json.load(open(path)))
+            self.assertEqual(restarted.wait(), 450)
+            restarted.retain({1})
+            self.assertEqual(list(restarted.entries), ['https://b.com'])
+            self.assertEqual(restarted.wait(), 1800)
+
+    def test_daemon_rounds(self):
+        ''' Test that verifies the daemon queues the categories of a home, visits them in the next round and hands the articles over in a batch '''
+        article = read_page('vanguardia', 'article')
+        home = b'<html><body>' + b''.join(b'<div class="nav-dropdown nav noSubNav"><ul><li><a href="/cat%d">c</a></li></ul></div>' % i for i in range(2)) + b'</body></html>'
+        category = b'<html><body>' + b''.join(b'<article><div><a href="/a%d">x</a></div></article>' % i for i in range(3)) + b'</body></html>'
+        loaded = []
+
+        def on_batch(articles, categories):
+            with open(articles, 'r', encoding='utf-8') as f:
+                loaded.append([json.loads(line)['news_url'] for line in f])
+            self.assertTrue(os.path.isfile(categories))
+            os.remove(articles)
+            os.remove(categories)
+
+        with StandInServer({'/': home, '/cat0': category, '/cat1': category, **{f'/a{i}': article for i in range(3)}}) as server:
+            with tempfile.TemporaryDirectory() as folder:
+                os.chdir(folder)
+                scheduler = Scheduler({'min_interval': 0}, 'schedule.json')
+                batches = BatchSink(NoSeenUrls(), 'batches', batch_size=2)
+                rounds = asyncio.run(run([(0, {'url': server.url})], scheduler, NoSeenUrls(), NoValidators(), batches, batches, on_batch, rounds=2, delay=0, workers=0))
+                self.assertEqual(rounds, 2)
+                self.assertEqual(batches.ready(), [])
+                entries = json.load(open('schedule.json'))
+        self.assertEqual(sorted(entry['url'] for entry in entries), [server.url, f'{server.url}/cat0', f'{server.url}/cat1'])
+        self.assertEqual(sum(entry['found'] for entry in entries), 2 + 3)
+        self.assertEqual(len(loaded), 1)
+        self.assertEqual(sorted(loaded[0]), [f'{server.url}/a{i}' for i in range(3)])
+        self.assertEqual(server.requests, 1 + 2 + 3)
+
+    @unittest.skipIf(mongomock is None, 'mongomock is not installed')
+    def test_batches_loaded(self):
+        ''' Test that verifies the batches of the daemon are transformed and loaded by main.py from the folders of the other stages, and deleted once loaded '''
+        root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        sys.path.append(root)
+        import main
+        host = 'https://www.vanguardia.com'
+        articles = [parse_article(host, f'{host}/a{i}', read_page('vanguardia', 'article'), 0) for i in range(2)]
+        with tempfile.TemporaryDirectory() as folder:
+            for stage in ['extract', 'transform', 'load']:
+                os.makedirs(os.path.join(folder, stage))
+            database = mongomock.MongoClient()['news_db']
+            # The stages run in the folders of a copy of the tree, the load stage writes in a database in memory
+            with main.stage_folder('load'):
+                load = importlib.import_module('load')
+            with main.stage_folder('transform'):
+                importlib.import_module('transform')
+            previous_root, previous_db = main.ROOT, load.db
+            main.ROOT, load.db = folder, database
+            try:
+                os.chdir(os.path.join(folder, 'extract'))
+                batches = BatchSink(NoSeenUrls(), 'batches', batch_size=2)
+                for data, category in articles:
+                    batches.write(data, category)
+                batches.close_batch()
+                hand_over(batches, main._load_batch)
+                self.assertEqual(batches.ready(), [])
+                self.assertEqual(os.listdir(os.path.join(folder, 'load')), ['vocabulary.json'])
+            finally:
+                main.ROOT, load.db = previous_root, previous_db
+        self.assertEqual(sorted(document['news_url'] for document in database['news'].find()), [f'{host}/a{i}' for i in range(2)])
+
+if __name__ == "__main__":
+    unittest.main()
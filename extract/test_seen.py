@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from seen import canonical_url, BloomFilter, SeenUrls, SqliteSeenUrls
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Seen(unittest.TestCase):
+    logger.info('Starting test for the index of scraped urls.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'urls.txt')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('https://www.ntn24.com/internacional/espana/segunda-noche-de-disturbios\n')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_canonical_url(self):
+        ''' Test that verifies the variations of the same url have the same canonical form '''
+        canonical = canonical_url('https://www.ntn24.com/internacional/espana')
+        for url in ['HTTPS://WWW.NTN24.COM/internacional/espana', 'https://www.ntn24.com:443/internacional/espana/', 'https://www.ntn24.com/internacional/espana#comentarios', 'https://www.ntn24.com/internacional/espana?utm_source=twitter']:
+            self.assertEqual(canonical_url(url), canonical)
+        self.assertNotEqual(canonical_url('https://www.ntn24.com/internacional/espana?page=2'), canonical)
+
+    def test_bloom_filter(self):
+        ''' Test that verifies the Bloom filter has no false negatives '''
+        bloom = BloomFilter(1000, 0.01)
+        urls = [f'https://actualidad.rt.com/actualidad/{i}' for i in range(1000)]
+        for url in urls:
+            bloom.add(url)
+        for url in urls:
+            self.assertIn(url, bloom)
+
+    def test_seen_urls(self):
+        ''' Test that verifies the urls of the text file are recovered and the new ones are appended '''
+        index = SeenUrls(self.path)
+        self.assertIn('https://www.ntn24.com/internacional/espana/segunda-noche-de-disturbios/', index)
+        index.update(['https://www.ntn24.com/nueva', 'https://www.ntn24.com/internacional/espana/segunda-noche-de-disturbios'])
+        self.assertEqual(len(SeenUrls(self.path)), 2)
+        self.assertIn('https://www.ntn24.com/nueva', SeenUrls(self.path))
+
+    def test_sqlite_seen_urls(self):
+        ''' Test that verifies the SQLite index imports the text file and keeps the new urls '''
+        database = os.path.join(self.folder.name, 'seen.db')
+        index = SqliteSeenUrls(database, self.path, bloom_capacity=1000)
+        self.assertIn('https://www.ntn24.com/internacional/espana/segunda-noche-de-disturbios', index)
+        self.assertNotIn('https://www.ntn24.com/nueva', index)
+        index.update(['https://www.ntn24.com/nueva'])
+        index.close()
+        index = SqliteSeenUrls(database, self.path, bloom_capacity=1000)
+        self.assertIn('https://www.ntn24.com/nueva', index)
+        self.assertEqual(len(index), 2)
+        index.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from sink import ArticleSink
+from seen import SeenUrls
+
+logger = logging.getLogger(__name__)
+
+
+def article(i):
+    return {'title': [f'Título {i}'], 'subtitle': [], 'body': ['Párrafo uno', 'Párrafo dos'], 'images': [], 'category_long': ['Deportes'], 'tags': ['Fútbol'], 'author': ['Redacción'], 'publication_date': ['2020-11-01'], 'news_url': f'https://www.vanguardia.com/deportes/nota-{i}', 'host': 'https://www.vanguardia.com'}
+
+
+class Test_Sink(unittest.TestCase):
+    logger.info('Starting test for the streaming sink of articles.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.paths = {name: os.path.join(self.folder.name, name) for name in ['articles.csv', 'articles.jsonl', 'articles.jsonl.gz', 'extract.checkpoint', 'categories.txt', 'urls.txt', 'categories.csv']}
+        with open(self.paths['categories.txt'], 'w', encoding='utf-8') as f:
+            f.write('Deportes\n')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def open(self, path='articles.csv'):
+        sink = ArticleSink(self.paths[path], self.paths['extract.checkpoint'], flush_every=2, categories_path=self.paths['categories.txt'], urls_path=self.paths['urls.txt'])
+        index = SeenUrls(self.paths['urls.txt'])
+        sink.resume(index)
+        return sink, index
+
+    def test_complete_run(self):
+        ''' Test that verifies the articles, the new categories and the urls are written, and the checkpoint removed; a category written with other case or accents is not new '''
+        sink, index = self.open()
+        sink.write(article(1), 'DEPORTES')
+        sink.write(article(2), 'Economía')
+        sink.write(article(3), 'economia')
+        sink.close(self.paths['categories.csv'])
+        with open(self.paths['articles.csv'], encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['news_url'] for row in rows], [article(i)['news_url'] for i in range(1, 4)])
+        self.assertEqual(rows[0]['body'], str(article(1)['body']))
+        with open(self.paths['categories.csv'], encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), ['categories', 'Economía'])
+        self.assertEqual(len(SeenUrls(self.paths['urls.txt'])), 3)
+        self.assertFalse(os.path.isfile(self.paths['extract.checkpoint']))
+
+    def test_resume_after_crash(self):
+        ''' Test that verifies a run stopped after a checkpoint continues from it, dropping the rows written after it '''
+        sink, index = self.open()
+        sink.write(article(1), 'Deportes')
+        sink.write(article(2), 'Economía')
+        sink.write(article(3), 'Salud')
+        sink._file.flush()
+        # The run stops here, article 3 was not committed
+        sink, index = self.open()
+        self.assertTrue(sink.resuming)
+        self.assertIn(article(2)['news_url'], index)
+        self.assertNotIn(article(3)['news_url'], index)
+        sink.write(article(3), 'Salud')
+        sink.close(self.paths['categories.csv'])
+        with open(self.paths['articles.csv'], encoding='utf-8', newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 3)
+        with open(self.paths['categories.csv'], encoding='utf-8') as f:
+            self.assertEqual(f.read().split(), ['categories', 'Economía', 'Salud'])
+
+    def test_jsonl(self):
+        ''' Test that verifies the articles are written as json lines, keeping the lists '''
+        sink, index = self.open('articles.jsonl')
+        sink.write(article(1), 'Deportes')
+        sink.close(self.paths['categories.csv'])
+        with open(self.paths['articles.jsonl'], encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], [article(1)])
+
+    def test_compressed_jsonl_resume(self):
+        ''' Test that verifies a compressed file resumed after a crash is still a valid gzip file '''
+        sink, index = self.open('articles.jsonl.gz')
+        for i in range(1, 4):
+            sink.write(article(i), 'Deportes')
+        sink._file.write(b'partial gzip member')
+        sink._file.flush()
+        sink, index = self.open('articles.jsonl.gz')
+        self.assertEqual(sink.committed_urls(), [article(1)['news_url'], article(2)['news_url']])
+        sink.write(article(3), 'Deportes')
+        sink.close(self.paths['categories.csv'])
+        with gzip.open(self.paths['articles.jsonl.gz'], 'rt', encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], [article(i) for i in range(1, 4)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import argparse
+import os
+import tempfile
+import unittest
+import logging
+import yaml
+import lxml.html as html
+logging.basicConfig(level=logging.INFO)
+import sites
+from sites import SiteExtractor, extractor, news_sites, sites_to_crawl
+from extract import parse_categories, parse_article_links, shard
+from common import config
+
+logger = logging.getLogger(__name__)
+
+FIXTURES = ['vanguardia', 'canalrcn', 'ntn24', 'eluniversal', 'eleconomista', 'rt']
+
+
+def read_page(name, kind):
+    with open(f'fixtures/{name}_{kind}.html', 'rb') as f:
+        return f.read()
+
+
+def read_fixture(name):
+    with open(f'fixtures/{name}_article.html', 'rb') as f:
+        return html.fromstring(f.read().decode('utf-8'))
+
+
+class Test_Sites(unittest.TestCase):
+    logger.info('Starting test for the site extractors.')
+    def test_extractor_is_built_once(self):
+        ''' Test that verifies the extractor of a site is built only once '''
+        self.assertIs(extractor(0), extractor(0))
+        self.assertIsInstance(extractor(0), SiteExtractor)
+
+    def test_extract_same_as_xpath_strings(self):
+        ''' Test that verifies the compiled queries return the same as the query strings of config.yaml '''
+        for iterator, name in enumerate(FIXTURES):
+            parsed = read_fixture(name)
+            fields = extractor(iterator).extract(parsed)
+            for field, query in config()['news_sites'][iterator]['queries'].items():
+                self.assertEqual(fields[field], parsed.xpath(query))
+
+    def test_extract_fixtures(self):
+        ''' Test that verifies the title, body and publication date are found in the fixture of each site '''
+        for iterator, name in enumerate(FIXTURES):
+            fields = extractor(iterator).extract(read_fixture(name))
+            self.assertTrue(fields['title'], msg=name)
+            self.assertTrue(fields['content'], msg=name)
+            self.assertTrue(fields['publication_date'], msg=name)
+            for value in fields['content']:
+                self.assertIs(type(value), str)
+
+    def test_links_fixtures(self):
+        ''' Test that verifies the categories of the home page and the articles of a category page are found for each site '''
+        for iterator, name in enumerate(FIXTURES):
+            host = config()['news_sites'][iterator]['url']
+            categories = parse_categories(host, host, read_page(name, 'home'), iterator)
+            articles = parse_article_links(host, categories[0], read_page(name, 'category'), iterator)
+            self.assertEqual(len(categories), 8, msg=name)
+            self.assertEqual(len(articles), 24, msg=name)
+            self.assertTrue(all(link.startswith(host) for link in categories + articles), msg=name)
+
+    def test_sites_files(self):
+        ''' Test that verifies the sites of the files and folders in sites_files are added to the ones of config.yaml '''
+        site = dict(config()['news_sites'][0], url='https://www.elespectador.com')
+        with tempfile.TemporaryDirectory() as folder:
+            os.mkdir(os.path.join(folder, 'sites'))
+            with open(os.path.join(folder, 'sites', 'colombia.yaml'), 'w', encoding='utf-8') as f:
+                yaml.safe_dump({'news_sites': {'elespectador': site}}, f)
+            with open(os.path.join(folder, 'mexico.yml'), 'w', encoding='utf-8') as f:
+                yaml.safe_dump({'news_sites': {'milenio': dict(site, url='https://www.milenio.com')}}, f)
+            config()['sites_files'] = [os.path.join(folder, 'sites'), os.path.join(folder, 'mexico.yml')]
+            sites._sites = None
+            try:
+                self.assertEqual(list(news_sites())[6:], ['elespectador', 'milenio'])
+                self.assertEqual(extractor('milenio').url, 'https://www.milenio.com')
+                config()['sites_files'].append(os.path.join(folder, 'sites'))
+                sites._sites = None
+                with self.assertRaises(ValueError):
+                    news_sites()
+            finally:
+                config()['sites_files'] = []
+                sites._sites = None
+
+    def test_shards(self):
+        ''' Test that verifies every site is in one shard and only one '''
+        everything = sites_to_crawl()
+        self.assertEqual(len(everything), 6)
+        shards = [sites_to_crawl((k, 3)) for k in range(3)]
+        self.assertEqual(sorted(key for part in shards for key, site in part), sorted(key for key, site in everything))
+        self.assertEqual(shard('2/3'), (2, 3))
+        for value in ['3/3', 'a/3', '1']:
+            with self.assertRaises(argparse.ArgumentTypeError):
+                shard(value)
+
+if __name__ == "__main__":
+    unittest.main()
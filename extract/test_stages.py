@@ -0,0 +1,126 @@
+import asyncio
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from functools import partial
+from fetch import Fetcher
+from stages import ParsePool, fetch_and_parse, metrics
+from extract import parse_article, crawl_host
+from seen import NoSeenUrls
+from validators import NoValidators
+from stand_in import StandInServer
+from test_sites import FIXTURES, read_page
+
+logger = logging.getLogger(__name__)
+
+
+def page_size(url, content):
+    return len(content)
+
+
+def run(server, paths, workers, parse=page_size, queue_size=2, on_result=None):
+    async def crawl():
+        fetcher = Fetcher(max_connections=4, max_per_host=4, delay=0)
+        pool = ParsePool(workers, queue_size)
+        try:
+            return await fetch_and_parse(fetcher, pool, [f'{server.url}{path}' for path in paths], parse, on_result=on_result)
+        finally:
+            fetcher.close()
+            pool.close()
+    return asyncio.run(crawl())
+
+
+class Test_Stages(unittest.TestCase):
+    logger.info('Starting test for the fetch and parse stages.')
+    def test_fetch_and_parse_in_processes(self):
+        ''' Test that verifies the fixtures are parsed in the process pool as they are parsed in the main process '''
+        pages = {}
+        for name in FIXTURES:
+            with open(f'fixtures/{name}_article.html', 'rb') as f:
+                pages[f'/{name}'] = f.read()
+        with StandInServer(pages) as server:
+            parse = partial(parse_article, 'https://www.vanguardia.com', iterator=0)
+            results = dict(run(server, ['/vanguardia'], workers=2, parse=parse))
+            expected = parse_article('https://www.vanguardia.com', f'{server.url}/vanguardia', pages['/vanguardia'], 0)
+        self.assertEqual(results[f'{server.url}/vanguardia'], expected)
+
+    def test_metrics_of_the_processes(self):
+        ''' Test that verifies the metrics recorded in the parse processes are merged in the crawl '''
+        with open('fixtures/vanguardia_article.html', 'rb') as f:
+            pages = {'/vanguardia': f.read()}
+        metrics.reset()
+        metrics.enable()
+        try:
+            with StandInServer(pages) as server:
+                run(server, ['/vanguardia'], workers=2, parse=partial(parse_article, 'https://www.vanguardia.com', iterator=0))
+            data = metrics.summary()
+        finally:
+            metrics.disable()
+            metrics.reset()
+        fields = {value['labels']['field'] for value in data['histograms']['parse_field_seconds']}
+        self.assertIn('title', fields)
+        self.assertEqual(data['counters']['pages_fetched'][0]['value'], 1)
+        self.assertEqual(data['histograms']['parse_seconds'][0]['count'], 1)
+
+    def test_queue_smaller_than_urls(self):
+        ''' Test that verifies every page goes through a queue smaller than the list of urls '''
+        pages = {f'/page-{i}': b'x' * i for i in range(20)}
+        with StandInServer(pages) as server:
+            results = run(server, list(pages), workers=0)
+        self.assertEqual(sorted(size for url, size in results), list(range(20)))
+
+    def test_failed_pages_are_skipped(self):
+        ''' Test that verifies the pages not answered with 200 are left out '''
+        with StandInServer({'/found': b'found'}) as server:
+            results = run(server, ['/found', '/missing'], workers=0)
+        self.assertEqual(results, [(f'{server.url}/found', 5)])
+
+    def test_errors_of_the_sink(self):
+        ''' Test that verifies a page that can not be parsed is skipped, but an error of the sink stops the crawl and is raised '''
+        def parse(url, content):
+            if content == b'broken':
+                raise ValueError('no title')
+            return len(content)
+
+        written = []
+
+        def full_disk(url, result):
+            raise OSError('No space left on device')
+
+        pages = {'/broken': b'broken', **{f'/page-{i}': b'x' * i for i in range(10)}}
+        with StandInServer(pages) as server:
+            results = run(server, list(pages), workers=0, parse=parse, on_result=lambda url, result: written.append(result))
+            self.assertEqual(sorted(written), list(range(10)))
+            self.assertEqual(len(results), 10)
+            with self.assertRaises(OSError):
+                run(server, list(pages), workers=0, parse=parse, on_result=full_disk)
+
+    def test_crawl_host(self):
+        ''' Test that verifies a host is crawled from its home through its categories, the articles parsed in the process pool and written to the sink '''
+        home = b'<html><body><div class="nav-dropdown nav noSubNav"><ul><li><a href="/cat1">c</a></li></ul></div></body></html>'
+        category = b'<html><body><article><div><a href="/a1">x</a></div></article><article><div><a href="/a2">x</a></div></article></body></html>'
+        article = read_page('vanguardia', 'article')
+        written = []
+
+        class Sink:
+            def write(self, data, category):
+                written.append((data['news_url'], data['title']))
+
+        async def crawl(url):
+            fetcher = Fetcher(max_connections=4, max_per_host=2, delay=0)
+            pool = ParsePool(2)
+            try:
+                return await crawl_host(fetcher, pool, url, 0, NoSeenUrls(), NoValidators(), Sink())
+            finally:
+                fetcher.close()
+                pool.close()
+
+        with StandInServer({'/': home, '/cat1': category, '/a1': article, '/a2': article}) as server:
+            scraped = asyncio.run(crawl(server.url))
+            expected = parse_article(server.url, f'{server.url}/a1', article, 0)[0]['title']
+        self.assertEqual(scraped, 2)
+        self.assertEqual(sorted(written), [(f'{server.url}/a{i}', expected) for i in (1, 2)])
+        self.assertEqual(server.requests, 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import fetch
+from common import config
+from extract import articles_and_categories_extraction, parse_article, metrics
+from sites import extractor
+from streaming import StreamingParser, declared_encoding, parse_html
+from stand_in import StandInServer
+from test_sites import FIXTURES, read_page
+
+logger = logging.getLogger(__name__)
+RELATED = '<div class="related"><a href="/nota-{0}"><img src="/img/{0}.jpg"><h4>Nota relacionada {0}</h4></a><p>Resumen de la nota relacionada, con el texto que los sitios ponen debajo del artículo.</p></div>'
+
+
+def padded(content, kilobytes):
+    ''' Returns an article with the related notes, comments and scripts the sites serve after it, about `kilobytes` long. '''
+    trailer = []
+    size = 0
+    note = 0
+    while size < kilobytes * 1024:
+        block = RELATED.format(note) + f'<script>window.dataLayer.push({{"nota": {note}, "seccion": "relacionadas"}});</script>\n'
+        trailer.append(block)
+        size += len(block.encode('utf-8'))
+        note += 1
+    return content.replace(b'</body>', f'<footer>{"".join(trailer)}</footer></body>'.encode('utf-8'))
+
+def fields_in_chunks(iterator, content, chunk_size, required=None):
+    site_extractor = extractor(iterator)
+    parser = StreamingParser(site_extractor, required or list(site_extractor.queries))
+    for start in range(0, len(content), chunk_size):
+        if parser.feed(content[start:start + chunk_size]):
+            break
+    return parser, parser.close()
+
+
+class Test_Streaming(unittest.TestCase):
+    logger.info('Starting test for the streaming parse of the articles.')
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+        fetch.close_sessions()
+
+    def test_declared_encoding(self):
+        ''' Test that verifies the encoding is taken from the header, then from the meta tags, and is UTF-8 otherwise '''
+        self.assertEqual(declared_encoding('text/html; charset=ISO-8859-1', b'<meta charset="utf-8">'), 'iso8859-1')
+        self.assertEqual(declared_encoding('text/html', b'<html><head><meta charset="windows-1252">'), 'cp1252')
+        self.assertEqual(declared_encoding(None, b'<meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1">'), 'iso8859-1')
+        self.assertEqual(declared_encoding('text/html; charset=unknown', b'<html>'), 'utf-8')
+        page = '<html><head><meta charset="iso-8859-1"></head><body><p>Atlético, campeón</p></body></html>'.encode('iso-8859-1')
+        self.assertEqual(parse_html(page).xpath('//p/text()'), ['Atlético, campeón'])
+        parser, fields = fields_in_chunks(0, page, 16, ['title'])
+        self.assertEqual(parser.root.xpath('//p/text()'), ['Atlético, campeón'])
+
+    def test_same_fields_as_full_tree(self):
+        ''' Test that verifies the fields parsed chunk by chunk are the ones of the whole page, and the parse stops before the related notes '''
+        for iterator, name in enumerate(FIXTURES):
+            content = padded(read_page(name, 'article'), 64)
+            full = extractor(iterator).extract(parse_html(content))
+            for chunk_size in [512, 4096]:
+                parser, fields = fields_in_chunks(iterator, content, chunk_size, [field for field, values in full.items() if values])
+                self.assertEqual(fields, full, f'{name} in chunks of {chunk_size}')
+                self.assertTrue(parser.done)
+                self.assertLess(parser.bytes, len(content) // 4, name)
+
+    def test_stream_article(self):
+        ''' Test that verifies the download of an article stops once its fields are found, and the article is the one of the whole page '''
+        content = padded(read_page('vanguardia', 'article'), 256)
+        metrics.enable()
+        with StandInServer({'/nota-1': content}) as server:
+            data, category = articles_and_categories_extraction(server.url, f'{server.url}/nota-1', 0)
+        self.assertEqual((data, category), parse_article(server.url, f'{server.url}/nota-1', content, 0))
+        saved = metrics.summary()['counters']['bytes_saved'][0]['value']
+        self.assertGreater(saved, len(content) // 2)
+
+    def test_stream_disabled(self):
+        ''' Test that verifies the whole page is downloaded and parsed when the streaming is off '''
+        content = padded(read_page('ntn24', 'article'), 64)
+        settings = config().get('streaming')
+        config()['streaming'] = {'enabled': False}
+        try:
+            with StandInServer({'/nota-1': content}) as server:
+                data, category = articles_and_categories_extraction(server.url, f'{server.url}/nota-1', 2)
+        finally:
+            config()['streaming'] = settings
+        self.assertEqual((data, category), parse_article(server.url, f'{server.url}/nota-1', content, 2))
+
+    def test_fields_after_the_required(self):
+        ''' Test that verifies the fields that come after the required ones are left empty when the download stops, and are logged and counted '''
+        content = padded(read_page('vanguardia', 'article'), 64)
+        full = extractor(0).extract(parse_html(content))
+        settings = config().get('streaming')
+        config()['streaming'] = dict(settings or {}, chunk_size=512, required=['title'])
+        metrics.enable()
+        try:
+            with StandInServer({'/nota-1': content}) as server:
+                with self.assertLogs('extract', level='INFO') as logs:
+                    data, category = articles_and_categories_extraction(server.url, f'{server.url}/nota-1', 0)
+        finally:
+            config()['streaming'] = settings
+        self.assertTrue(data['title'])
+        self.assertEqual(data['title'], parse_article(server.url, f'{server.url}/nota-1', content, 0)[0]['title'])
+        missing = sorted(value['labels']['field'] for value in metrics.summary()['counters']['fields_missing'])
+        self.assertEqual(missing, ['content', 'images', 'tags'])
+        self.assertTrue(all(full[field] for field in missing))
+        self.assertTrue(any('was cut before its content, images, tags' in line for line in logs.output))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import logging
+import unicodedata
+logging.basicConfig(level=logging.INFO)
+from common import config
+from extract import replacer
+from text import clean_text, clean_texts, legacy_replacer, SEPARATOR
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Text(unittest.TestCase):
+    logger.info('Starting test for the cleaning of the text extracted.')
+    def test_white_space(self):
+        ''' Test that verifies the new lines, tabs and non breaking spaces become one space, and the quotes are dropped '''
+        self.assertEqual(clean_text('\n\t\tEl "presidente"\xa0dijo\r\n  que\u200b sí\n'), 'El presidente dijo que sí')
+
+    def test_hyphens(self):
+        ''' Test that verifies the hyphens inside the words and the negative numbers are kept, the separators are not '''
+        self.assertEqual(clean_text('COVID-19 - Colombia'), 'COVID-19 Colombia')
+        self.assertEqual(clean_text('Temperaturas de -5 grados -'), 'Temperaturas de -5 grados')
+        self.assertEqual(clean_text('2020-11-01'), '2020-11-01')
+        self.assertEqual(clean_text('"Petro-"'), 'Petro')
+
+    def test_page_at_once(self):
+        ''' Test that verifies the texts of a page cleaned at once are the ones of clean_text, also the empty ones, the ones with the separator and the hyphens at their ends '''
+        texts = ['\n\t\t', '-5 grados', 'Colombia -', f'1 {SEPARATOR} 2', '', ' "Tifón"\xa0', unicodedata.normalize('NFD', 'él')]
+        self.assertEqual(clean_texts(texts), [clean_text(text) for text in texts])
+        self.assertEqual(clean_texts(texts[:3] + texts[4:]), ['', '-5 grados', 'Colombia', '', 'Tifón', 'él'])
+
+    def test_nfc(self):
+        ''' Test that verifies a decomposed accent is composed, so the same word is always the same string '''
+        self.assertEqual(clean_text(unicodedata.normalize('NFD', 'Tifón')), 'Tifón')
+
+    def test_legacy_replacer(self):
+        ''' Test that verifies the legacy_replacer key gives the output of the first version '''
+        texts = ['COVID-19\xa0en\nColombia', '"Tifón"']
+        self.assertEqual(replacer(texts), ['COVID-19 en Colombia', 'Tifón'])
+        config().setdefault('text', {})['legacy_replacer'] = True
+        try:
+            self.assertEqual(replacer(texts), ['COVID 19enColombia', 'Tifón'])
+            self.assertEqual(replacer(texts), legacy_replacer(texts))
+        finally:
+            config()['text']['legacy_replacer'] = False
+
+if __name__ == "__main__":
+    unittest.main()
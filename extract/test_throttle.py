@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+import fetch
+from common import config
+from extract import articles_and_categories_extraction
+from stand_in import StandInServer
+from throttle import Throttle, CircuitOpen
+
+logger = logging.getLogger(__name__)
+PAGES = {f'/page-{i}': f'<html><body><p>{i}</p></body></html>'.encode('utf-8') for i in range(12)}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Test_Throttle(unittest.TestCase):
+    logger.info('Starting test for the throttle of the hosts.')
+    def tearDown(self):
+        fetch.use_throttle(None)
+        fetch.close_sessions()
+
+    def test_aimd(self):
+        ''' Test that verifies the delay of a host doubles on each error or slow response, and goes down step by step on the good ones '''
+        throttle = Throttle({'step': 0.25, 'min_requests': 100})
+        throttle.record('www.ntn24.com', False)
+        throttle.record('www.ntn24.com', False)
+        throttle.record('www.ntn24.com', True, 30)
+        self.assertEqual(throttle.delay('www.ntn24.com'), 1.0)
+        self.assertEqual(throttle.delay('actualidad.rt.com'), 0)
+        for _ in range(3):
+            throttle.record('www.ntn24.com', True, 0.1)
+        self.assertEqual(throttle.delay('www.ntn24.com'), 0.25)
+        throttle.record('www.ntn24.com', True, 0.1)
+        throttle.record('www.ntn24.com', True, 0.1)
+        self.assertEqual(throttle.delay('www.ntn24.com'), 0)
+
+    def test_circuit(self):
+        ''' Test that verifies the circuit opens after the errors, lets one request through after the cool-down, and closes when it succeeds '''
+        clock = Clock()
+        throttle = Throttle({'min_requests': 4, 'error_rate': 0.5, 'cooldown': 60}, clock=clock)
+        for ok in [True, True, False, False]:
+            self.assertTrue(throttle.allow('www.ntn24.com'))
+            throttle.record('www.ntn24.com', ok)
+        self.assertFalse(throttle.allow('www.ntn24.com'))
+        self.assertTrue(throttle.allow('actualidad.rt.com'))
+        clock.now = 60
+        self.assertTrue(throttle.allow('www.ntn24.com'))
+        self.assertFalse(throttle.allow('www.ntn24.com'))
+        throttle.record('www.ntn24.com', False)
+        clock.now = 150
+        self.assertFalse(throttle.allow('www.ntn24.com'))
+        clock.now = 180
+        self.assertTrue(throttle.allow('www.ntn24.com'))
+        throttle.record('www.ntn24.com', True)
+        self.assertTrue(throttle.allow('www.ntn24.com'))
+
+    def test_failing_host_is_skipped(self):
+        ''' Test that verifies the requests to a failing host are skipped once its circuit is open, and a healthy host is crawled in full '''
+        retries = config()['fetch']['retries']
+        config()['fetch']['retries'] = 0
+        fetch.use_throttle(Throttle({'step': 0.01, 'min_requests': 3, 'error_rate': 0.5}))
+        try:
+            with StandInServer(PAGES) as healthy, StandInServer(PAGES, status=503) as failing:
+                urls = [f'{server.url}{path}' for path in PAGES for server in [healthy, failing]]
+                fetcher = fetch.Fetcher(max_connections=4, max_per_host=1, delay=0)
+                responses = asyncio.run(fetcher.get_many(urls))
+                fetcher.close()
+                with self.assertRaises(CircuitOpen):
+                    fetch.get(f'{failing.url}/page-0')
+        finally:
+            config()['fetch']['retries'] = retries
+        self.assertEqual([response.status_code for response in responses[::2]], [200] * len(PAGES))
+        self.assertEqual(failing.requests, 3)
+        self.assertEqual(responses[1::2].count(None), len(PAGES) - 3)
+
+    def test_article_not_found(self):
+        ''' Test that verifies an article that can not be downloaded gives an empty article and no category '''
+        retries = config()['fetch']['retries']
+        config()['fetch']['retries'] = 0
+        try:
+            with StandInServer(PAGES) as server:
+                self.assertEqual(articles_and_categories_extraction(server.url, f'{server.url}/missing', 0), ({}, None))
+            self.assertEqual(articles_and_categories_extraction('http://127.0.0.1:9', 'http://127.0.0.1:9/unreachable', 0), ({}, None))
+        finally:
+            config()['fetch']['retries'] = retries
+
+if __name__ == "__main__":
+    unittest.main()
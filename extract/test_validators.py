@@ -0,0 +1,81 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+from extract import crawl_category
+from fetch import Fetcher
+from stages import ParsePool
+from stand_in import StandInServer
+from validators import PageValidators
+
+logger = logging.getLogger(__name__)
+
+CATEGORY = b'<html><body><article><div><a href="/nota-1">1</a></div></article><article><div><a href="/nota-2">2</a></div></article></body></html>'
+
+
+class ListSink:
+    def __init__(self):
+        self.articles = []
+
+    def write(self, article, category):
+        self.articles.append(article)
+
+
+def crawl(server, validators, articles_recovered):
+    sink = ListSink()
+
+    async def run():
+        fetcher = Fetcher(max_connections=2, max_per_host=2, delay=0)
+        pool = ParsePool(0)
+        try:
+            await crawl_category(fetcher, pool, server.url, 0, f'{server.url}/deportes', articles_recovered, validators, set(), sink)
+        finally:
+            fetcher.close()
+    asyncio.run(run())
+    return sink.articles
+
+
+class Test_Validators(unittest.TestCase):
+    logger.info('Starting test for the incremental crawl.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'validators.json')
+        with open('fixtures/vanguardia_article.html', 'rb') as f:
+            article = f.read()
+        self.pages = {'/deportes': CATEGORY, '/nota-1': article, '/nota-2': article}
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_headers(self):
+        ''' Test that verifies the conditional headers are built from the stored validators and persisted '''
+        validators = PageValidators(self.path)
+        self.assertEqual(validators.headers('https://www.vanguardia.com/deportes'), {})
+        validators.pages['https://www.vanguardia.com/deportes'] = {'etag': '"abc"', 'last_modified': 'Sat, 31 Oct 2020 10:00:00 GMT'}
+        validators.save()
+        headers = PageValidators(self.path).headers('https://www.vanguardia.com/deportes')
+        self.assertEqual(headers, {'If-None-Match': '"abc"', 'If-Modified-Since': 'Sat, 31 Oct 2020 10:00:00 GMT'})
+
+    def test_unchanged_category_is_not_downloaded(self):
+        ''' Test that verifies a category answered with 304 does not download its articles again '''
+        validators = PageValidators(self.path)
+        with StandInServer(self.pages) as server:
+            first = crawl(server, validators, set())
+            requests = server.requests
+            second = crawl(server, validators, set())
+        self.assertEqual(len(first), 2)
+        self.assertEqual(second, [])
+        self.assertEqual(server.requests, requests + 1)
+
+    def test_known_articles_are_not_downloaded(self):
+        ''' Test that verifies only the articles not scraped before are downloaded '''
+        validators = PageValidators(self.path)
+        with StandInServer(self.pages) as server:
+            results = crawl(server, validators, {f'{server.url}/nota-1'})
+        self.assertEqual([article['news_url'] for article in results], [f'{server.url}/nota-2'])
+        self.assertEqual(server.requests, 2)
+
+if __name__ == "__main__":
+    unittest.main()
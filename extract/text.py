@@ -0,0 +1,77 @@
+import re
+import unicodedata
+from common import settings
+
+DEFAULT_SETTINGS = {
+    'legacy_replacer': False,
+}
+# Invisible characters the sites leave in the paragraphs, they are dropped with the double quotes
+INVISIBLE = ['\u200b', '\u200c', '\u200d', '\ufeff', '\xad']
+# The characters str.split takes as white space, besides the space, the common ones first
+WHITE_SPACE = ['\n', '\t', '\r', '\xa0', '\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x1f', '\x85', '\u1680', '\u2000', '\u2001', '\u2002', '\u2003', '\u2004', '\u2005', '\u2006', '\u2007', '\u2008', '\u2009', '\u200a', '\u2028', '\u2029', '\u202f', '\u205f', '\u3000']
+# A hyphen that is not inside a word, as in 'Colombia - Chile', is a separator, but the sign of a number such as '-5' is kept.
+# The pattern starts with the hyphen, so the regex engine jumps from hyphen to hyphen instead of trying every position
+LOOSE_HYPHEN = re.compile(r'-(?:(?!\w)|(?<=(?<!\w)-)(?!\d))')
+# The texts of a page are cleaned joined by a character that is neither white space, a word character nor a hyphen,
+# so each step runs once over all of them; a text that has it is cleaned alone
+SEPARATOR = '\xa4'
+
+
+def text_settings():
+    ''' This function returns the text section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('text', DEFAULT_SETTINGS)
+
+
+def is_nfc(text):
+    ''' This function tells whether a text is normalised to NFC. A text that fits in latin-1 always is, and encoding it is a copy, the others are checked by unicodedata. '''
+    try:
+        text.encode('latin-1')
+        return True
+    except UnicodeEncodeError:
+        return unicodedata.is_normalized('NFC', text)
+
+
+def _clean(text):
+    ''' Cleans a text but its ends, that may keep one space. Each step first looks for what it changes, so a clean text is only scanned. '''
+    if not is_nfc(text):
+        text = unicodedata.normalize('NFC', text)
+    if '"' in text:
+        text = text.replace('"', '')
+    for character in INVISIBLE:
+        if character in text:
+            text = text.replace(character, '')
+    for character in WHITE_SPACE:
+        if character in text:
+            text = text.replace(character, ' ')
+    if '-' in text:
+        text = LOOSE_HYPHEN.sub(' ', text)
+    while '  ' in text:
+        text = text.replace('  ', ' ')
+    return text
+
+
+def clean_text(text):
+    ''' This function cleans a text extracted: it is normalised to NFC, the quotes and invisible characters are dropped, every run of white space (new lines, tabs, non breaking spaces) becomes one space, and the hyphens are kept inside the words but turned into spaces elsewhere. '''
+    return _clean(text).strip(' ')
+
+
+def clean_texts(texts):
+    ''' This function cleans the texts extracted of a page as clean_text does, all of them at once. '''
+    cleaned = [piece.strip(' ') for piece in _clean(SEPARATOR.join([text.strip() for text in texts])).split(SEPARATOR)]
+    if len(cleaned) != len(texts):
+        return [clean_text(text) for text in texts]
+    return cleaned
+
+
+def legacy_replacer(objs):
+    ''' The replacer of the first version: it drops the quotes, non breaking spaces, new lines and tabs, and turns every hyphen into a space. '''
+    news_object = []
+    for obj in objs:
+        obj = obj.replace('\"', '')
+        obj = obj.replace('\xa0', '')
+        obj = obj.replace('\n', '')
+        obj = obj.replace('\t', '')
+        obj = obj.replace('\r', '')
+        obj = obj.replace('-', ' ')
+        news_object.append(obj)
+    return news_object
@@ -0,0 +1,150 @@
+import logging
+import threading
+import time
+from collections import deque
+import requests
+from common import settings
+from shared import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'step': 0.25,
+    'factor': 2,
+    'max_delay': 30,
+    'slow_seconds': 5,
+    'window': 20,
+    'min_requests': 5,
+    'error_rate': 0.5,
+    'cooldown': 60,
+    'max_cooldown': 600,
+}
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def throttle_settings():
+    ''' This function returns the throttle section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('throttle', DEFAULT_SETTINGS)
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    ''' Raised for a request to a host whose circuit is open, the request is not sent. '''
+
+
+class HostThrottle:
+    ''' State of one host: the delay added to its requests, its latency, its last outcomes and its circuit. '''
+
+    def __init__(self, host, cooldown, window):
+        self.host = host
+        self.penalty = 0.0
+        self.latency = None
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.cooldown = cooldown
+        self.requests = 0
+        self.errors = 0
+        self.skipped = 0
+        self.opened = 0
+
+
+class Throttle:
+    ''' Adaptive limits of the hosts. Every response slows its host down or speeds it up, AIMD style: an error (429, 5xx or a failed connection) or a response slower than `slow_seconds` multiplies the delay added between its requests by `factor`, up to `max_delay`; every good response takes `step` seconds off, down to none, so a healthy host goes at full speed. When `error_rate` of the last `window` requests of a host failed, its circuit opens and its requests are skipped for `cooldown` seconds; then one request is let through, if it succeeds the circuit closes, otherwise it opens again for twice the time, up to `max_cooldown`. '''
+
+    def __init__(self, settings=None, clock=time.monotonic):
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update(settings or {})
+        self.clock = clock
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = HostThrottle(host, self.settings['cooldown'], self.settings['window'])
+        return self._hosts[host]
+
+    def allow(self, host):
+        ''' Returns True when a request to the host can be sent: its circuit is closed, or its cool-down is over and this request is the one that tries it again. '''
+        with self._lock:
+            state = self._host(host)
+            if state.state == CLOSED:
+                return True
+            if state.state == OPEN and self.clock() >= state.opened_until:
+                state.state = HALF_OPEN
+                logger.info(f'Trying {host} again after {state.cooldown:.0f}s')
+                return True
+            state.skipped += 1
+        metrics.inc('requests_skipped', stage='extract', host=host)
+        return False
+
+    def delay(self, host):
+        ''' Returns the seconds added to the politeness delay between two requests to the host. '''
+        with self._lock:
+            return self._host(host).penalty
+
+    def record(self, host, ok, seconds=None):
+        ''' Records the outcome of a request to the host, and adapts its delay and its circuit. '''
+        settings = self.settings
+        events = []
+        with self._lock:
+            state = self._host(host)
+            state.requests += 1
+            state.errors += 0 if ok else 1
+            if seconds is not None:
+                state.latency = seconds if state.latency is None else 0.8 * state.latency + 0.2 * seconds
+            if state.state == HALF_OPEN:
+                if ok:
+                    state.state = CLOSED
+                    state.outcomes.clear()
+                    state.cooldown = settings['cooldown']
+                    events.append(('close', f'Circuit of {host} closed, it answers again'))
+                else:
+                    state.cooldown = min(state.cooldown * 2, settings['max_cooldown'])
+                    state.state = OPEN
+                    state.opened_until = self.clock() + state.cooldown
+                    state.opened += 1
+                    events.append(('open', f'{host} still fails, its requests are skipped for {state.cooldown:.0f}s'))
+            elif state.state == CLOSED:
+                state.outcomes.append(ok)
+                if ok and (seconds is None or seconds <= settings['slow_seconds']):
+                    if state.penalty:
+                        state.penalty = max(state.penalty - settings['step'], 0.0)
+                        if not state.penalty:
+                            events.append(('full_speed', f'{host} is back to full speed'))
+                else:
+                    state.penalty = min(max(state.penalty * settings['factor'], settings['step']), settings['max_delay'])
+                    reason = f'a {seconds:.1f}s response' if ok else 'an error'
+                    events.append(('slow_down', f'Slowing down {host} after {reason}: {state.penalty:.2f}s more between requests'))
+                failures = state.outcomes.count(False)
+                if not ok and len(state.outcomes) >= settings['min_requests'] and failures / len(state.outcomes) >= settings['error_rate']:
+                    state.state = OPEN
+                    state.opened_until = self.clock() + state.cooldown
+                    state.opened += 1
+                    events.append(('open', f'Circuit of {host} open after {failures} errors in {len(state.outcomes)} requests, its requests are skipped for {state.cooldown:.0f}s'))
+            penalty = state.penalty
+        metrics.set_gauge('host_delay_seconds', penalty, stage='extract', host=host)
+        for event, message in events:
+            if event == 'slow_down':
+                logger.warning(message)
+            else:
+                logger.info(message)
+            metrics.inc('throttle_events', stage='extract', host=host, event=event)
+
+    def report(self):
+        ''' Logs the requests, errors, skipped requests and circuit openings of each host. '''
+        with self._lock:
+            hosts = list(self._hosts.values())
+        for state in hosts:
+            latency = f'{state.latency:.2f}s' if state.latency is not None else '-'
+            logger.info(f'Throttle of {state.host}: {state.requests} requests, {state.errors} errors, {state.skipped} skipped, circuit opened {state.opened} times, latency {latency}, delay {state.penalty:.2f}s, {state.state}')
+
+
+def open_throttle():
+    ''' This function builds the throttle configured in the throttle section of config.yaml, or returns None when it is disabled. '''
+    settings = throttle_settings()
+    if not settings['enabled']:
+        return None
+    return Throttle(settings)
@@ -0,0 +1,79 @@
+import json
+import os
+import os.path
+from common import settings
+
+DEFAULT_SETTINGS = {
+    'enabled': True,
+    'path': 'validators.json',
+}
+
+
+def incremental_settings():
+    ''' This function returns the incremental section of config.yaml, filling the missing keys with the defaults. '''
+    return settings('incremental', DEFAULT_SETTINGS)
+
+
+class PageValidators:
+    ''' ETag and Last-Modified of the category pages. The next run requests the pages with a conditional GET, and a category that did not change is answered with a 304 and no body. '''
+
+    def __init__(self, path='validators.json'):
+        self.path = path
+        self.pages = {}
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.pages = json.load(f)
+
+    def headers(self, url):
+        ''' Returns the conditional headers of a page, empty if the page has no validators. '''
+        validators = self.pages.get(url, {})
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        return headers
+
+    def store(self, url, response):
+        ''' Keeps the validators of a page answered with 200. '''
+        if response is None or response.status_code != 200:
+            return
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        if validators['etag'] or validators['last_modified']:
+            self.pages[url] = validators
+
+    def forget(self, url):
+        ''' Drops the validators of a page, so it is downloaded in full the next run. '''
+        self.pages.pop(url, None)
+
+    def save(self):
+        ''' Writes the validators to a temporary file and moves it over the previous one. '''
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.pages, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class NoValidators(PageValidators):
+    ''' Validators of a run that downloads every category in full. '''
+
+    def __init__(self):
+        self.path = None
+        self.pages = {}
+
+    def store(self, url, response):
+        pass
+
+    def save(self):
+        pass
+
+
+def open_validators():
+    ''' This function opens the validators configured in the incremental section of config.yaml. '''
+    settings = incremental_settings()
+    if not settings['enabled']:
+        return NoValidators()
+    return PageValidators(settings['path'])
@@ -0,0 +1,64 @@
+import argparse
+import copy
+import re
+import time
+import warnings
+import pandas as pd
+from load import clean_images_list, cleaning_vanguardia_images
+
+# Benchmark of the vectorised clean_images_list and cleaning_vanguardia_images against the row by row versions they replaced.
+# The row by row versions are timed on a sample and scaled to the size of the frame, they take minutes on a million rows.
+# Run it from the load folder: python3 bench_vectorized.py --rows 1000000
+
+
+def rowwise_clean_images_list(df):
+    df['images'] = df['images'].fillna('')
+
+    for img in range(len(df['images'])):
+        df['images'][img] = df['images'][img].split(',')
+        for item in range(len(df['images'][img])):
+            df['images'][img][item] = df['images'][img][item].replace('\'', "")
+
+    return df
+
+def rowwise_cleaning_vanguardia_images(df_articles):
+    for df in range(len(df_articles)):
+        if df_articles['host'][df] == 'https://www.vanguardia.com':
+            for url in range(len(df_articles['images'][df])):
+                df_articles['images'][df][url] = "".join(re.findall(r'[\w]{3}\.[\w\-\.\/]+\.[\w]{3}', df_articles['images'][df][url]))
+    return df_articles
+
+def synthetic_articles(rows):
+    df = pd.read_csv('clean_articles_test.csv', usecols=['host', 'images'])
+    return df.sample(rows, replace=True, random_state=0).reset_index(drop=True)
+
+def timed(function, df):
+    df = df.copy()
+    df['images'] = copy.deepcopy(df['images'].tolist())
+    start = time.perf_counter()
+    result = function(df)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the vectorised cleaning functions with the row by row ones.')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows of the synthetic frame')
+    parser.add_argument('--rowwise-rows', type=int, default=20000, help='rows the row by row versions are timed on')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print(f'{args.rows} rows')
+    df = synthetic_articles(args.rows)
+    sample = df.head(args.rowwise_rows)
+    for name, vectorised, rowwise in [
+        ('clean_images_list', clean_images_list, rowwise_clean_images_list),
+        ('cleaning_vanguardia_images', cleaning_vanguardia_images, rowwise_cleaning_vanguardia_images),
+    ]:
+        seconds, df = timed(vectorised, df)
+        rowwise_seconds, expected = timed(rowwise, sample)
+        _, sample = timed(vectorised, sample)
+        pd.testing.assert_frame_equal(sample, expected)
+        rowwise_seconds *= args.rows / len(sample)
+        print(f'{name:>30}: vectorised {seconds:8.2f}s, row by row {rowwise_seconds:8.2f}s (scaled), x{rowwise_seconds / seconds:.0f}')
+
+if __name__ == '__main__':
+    main()
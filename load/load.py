@@ -1,17 +1,25 @@
+import argparse
+import os.path
+import sys
 import pymongo
+from itertools import islice
+from pymongo import UpdateOne
 import logging
 import pandas as pd
 import re
 import numpy as np
 from client import client
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared import dates, formats, metrics, normalize, vocabulary
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = 1000
+VANGUARDIA_IMAGE = re.compile(r'[\w]{3}\.[\w\-\.\/]+\.[\w]{3}')
+
 db = client['news_db']
 logger.info(f'Conecting to DB {db.name}.')
-data_articles = []
-data_categories = []
 
 
 def clean_body(df):
@@ -41,22 +49,28 @@ def clean_tags(df):
 def clean_images_list(df):
     ''' This function ensure that the data type send to the DB is an array, as the df readed transform all the csv into string type. '''
     logger.info('Cleaning articles images.')
-    df['images'] = df['images'].fillna('')
-    
-    for img in range(len(df['images'])):
-        df['images'][img] = df['images'][img].split(',')
-        for item in range(len(df['images'][img])):
-            df['images'][img][item] = df['images'][img][item].replace('\'', "")
-            
+    df['images'] = df['images'].fillna('').str.replace('\'', '', regex=False).str.split(',')
+
+    return df
+
+
+def split_images_list(df):
+    ''' Same as clean_images_list, for the typed files where the images are already a list: the srcset of vanguardia has every size of an image in one string, separated by commas. '''
+    logger.info('Splitting articles images.')
+    df['images'] = df['images'].map(lambda images: [part for image in images for part in image.split(',')])
+
     return df
 
 
 def cleaning_vanguardia_images(df_articles):
     ''' This function ensure that the images from vanguardia newspaper has the correct form of an url, due to the scraper it returns the first two characters '//'. '''
-    for df in range(len(df_articles)):
-        if df_articles['host'][df] == 'https://www.vanguardia.com':
-            for url in range(len(df_articles['images'][df])):
-                df_articles['images'][df][url] = "".join(re.findall(r'[\w]{3}\.[\w\-\.\/]+\.[\w]{3}', df_articles['images'][df][url]))
+    vanguardia = df_articles['host'] == 'https://www.vanguardia.com'
+    images = df_articles.loc[vanguardia, 'images']
+    # One row per image, the urls are cut back into lists by the length of each one
+    urls = images.explode().dropna().str.findall(VANGUARDIA_IMAGE).str.join('').tolist()
+    lengths = images.str.len()
+    images = pd.Series([urls[end - length:end] for length, end in zip(lengths, lengths.cumsum())], index=images.index, dtype=object)
+    df_articles['images'] = images.reindex(df_articles.index).fillna(df_articles['images'])
     return df_articles
 
 
@@ -70,28 +84,15 @@ def clean_empty_spaces(df):
     return df
 
 def string_to_datetime(df):
-    ''' This function ensores that the data type of the publication_date is datetime type. '''
+    ''' This function ensores that the data type of the publication_date is datetime type, in UTC. The dates were parsed with the formats of their site by transform, which writes them in ISO 8601. '''
     logger.info('Cleaning datetime.')
-    df['publication_date'] = pd.to_datetime(df['publication_date'])
+    df['publication_date'] = pd.to_datetime(df['publication_date'], utc=True, format=dates.ISO_FORMAT, errors='coerce')
     return df
 
-def main():
-    df_articles = pd.read_csv('clean_articles.csv')
-    df_articles = clean_tags(df_articles)
-    df_articles = clean_images_list(df_articles)
-    df_articles = cleaning_vanguardia_images(df_articles)
-    df_articles = clean_empty_spaces(df_articles)
-    df_articles = clean_body(df_articles)
-    df_articles = string_to_datetime(df_articles)
-    df_categories = pd.read_csv('clean_categories.csv')
-
-    logger.info(f'Accessing to collections.')
-    collection_articles = db['news']
-    collection_categories = db['categories']
-
-    logger.info(f'Parsing article data.')
-    for article in range(len(df_articles)):
-        data_articles.append({
+def article_documents(df_articles):
+    ''' This function yields the document of each article, as it is saved in the news collection. '''
+    for article in df_articles.index:
+        yield {
             'title': df_articles['title'][article],
             'subtitle': df_articles['subtitle'][article],
             'images': df_articles['images'][article],
@@ -100,25 +101,146 @@ def main():
             'author': df_articles['author'][article],
             'host': df_articles['host'][article],
             'news_url': df_articles['news_url'][article],
-            'publication_date': df_articles['publication_date'][article],
+            'publication_date': None if pd.isna(df_articles['publication_date'][article]) else df_articles['publication_date'][article],
             'category': df_articles['category_long'][article]
-        })
-    logger.info(f'Parsing Category data.')
+        }
+
+def category_documents(df_categories, names=None):
+    ''' This function yields the document of each category, as it is saved in the categories collection, with its id in `names` when it is given. '''
     for category in range(len(df_categories)):
-        data_categories.append({'categories':df_categories['categories'][category]})
+        document = {'categories': df_categories['categories'][category]}
+        if names is not None:
+            document['category_id'] = names.assign('category', [document['categories']]).get(document['categories'])
+        yield document
+
+
+def remove_duplicates(collection, key):
+    ''' This function deletes the documents of a collection that repeat the `key` of another, the last one saved is kept. The first versions inserted the articles and categories of every run, the unique index cannot be created over their duplicates. It returns the number of documents deleted. '''
+    pipeline = [
+        {'$sort': {'_id': 1}},
+        {'$group': {'_id': f'${key}', 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+    ]
+    duplicates = [id for group in collection.aggregate(pipeline, allowDiskUse=True) for id in group['ids'][:-1]]
+    for batch in batches(duplicates, BATCH_SIZE):
+        collection.delete_many({'_id': {'$in': batch}})
+    if duplicates:
+        logger.warning(f'{len(duplicates)} documents of {collection.name} with a repeated {key} deleted before creating its unique index.')
+    return len(duplicates)
+
+def create_unique_index(collection, key):
+    ''' This function creates the unique index of `key`, the duplicates left by the first versions are removed the first time. '''
+    if any(index.get('unique') and index['key'] == [(key, 1)] for index in collection.index_information().values()):
+        return
+    remove_duplicates(collection, key)
+    collection.create_index(key, unique=True)
+
+def create_indexes(database):
+    ''' This function creates the unique indexes the upserts are keyed on, so a url or a category is never saved twice. '''
+    create_unique_index(database['news'], 'news_url')
+    create_unique_index(database['categories'], 'categories')
+    vocabulary.create_indexes(database)
+
+def batches(documents, batch_size):
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def upsert_documents(collection, documents, key, batch_size=BATCH_SIZE):
+    ''' This function saves the documents in batches of `batch_size` with bulk_write, each one as an upsert keyed on `key`: loading the same file twice leaves the collection as it was. It returns the count of documents inserted, updated, and skipped because they were already saved as they are. '''
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    for batch in batches(documents, batch_size):
+        with metrics.timer('mongo_bulk_write_seconds', stage='load', collection=collection.name):
+            result = collection.bulk_write([UpdateOne({key: document[key]}, {'$set': document}, upsert=True) for document in batch], ordered=False)
+        batch_counts = {'inserted': result.upserted_count, 'updated': result.modified_count, 'skipped': len(batch) - result.upserted_count - result.modified_count}
+        for name, count in batch_counts.items():
+            counts[name] += count
+            metrics.inc('documents', count, stage='load', collection=collection.name, result=name)
+    return counts
+
+
+def clean_articles_frame(df_articles, typed):
+    ''' Cleans a dataframe of articles, the whole file or a chunk of it, before it is saved. '''
+    with metrics.timer('clean_seconds', stage='load'):
+        if typed:
+            df_articles = split_images_list(df_articles)
+        else:
+            # The csv keeps the lists as strings, they are rebuilt here
+            df_articles = clean_tags(df_articles)
+            df_articles = clean_images_list(df_articles)
+        df_articles = cleaning_vanguardia_images(df_articles)
+        df_articles = clean_empty_spaces(df_articles)
+        if not typed:
+            df_articles = clean_body(df_articles)
+        df_articles = string_to_datetime(df_articles)
+    return df_articles
+
 
+def load_raw(database, articles, categories, chunk_size=None, batch_size=BATCH_SIZE, names=None):
+    ''' Loads the articles written by extract, each chunk is cleaned in a single pass by the normalisation engine, without the files of transform. With the vocabulary `names`, the documents keep the ids of their category, tags and host. '''
+    typed = formats.is_typed(articles)
+    chunks = formats.read_articles_chunks(articles, chunk_size) if chunk_size else [formats.read_articles(articles)]
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    for df_articles in chunks:
+        with metrics.timer('clean_seconds', stage='load'):
+            if not typed:
+                df_articles = formats.parse_lists(df_articles)
+            documents = normalize.normalize_frame(df_articles)
+        if names is not None:
+            documents = names.encode(documents)
+        for key, count in upsert_documents(database['news'], documents, 'news_url', batch_size).items():
+            counts[key] += count
+    logger.info(f'Articles: {counts["inserted"]} inserted, {counts["updated"]} updated, {counts["skipped"]} skipped.')
+    df_categories = pd.read_csv(categories).dropna()
+    documents = category_documents(pd.DataFrame({'categories': [normalize.normalize_category(category) for category in df_categories['categories']]}), names)
+    counts = upsert_documents(database['categories'], documents, 'categories', batch_size)
+    logger.info(f'Categories: {counts["inserted"]} inserted, {counts["updated"]} updated, {counts["skipped"]} skipped.')
+
+
+def load_clean(database, clean_articles, clean_categories, chunk_size=None, batch_size=BATCH_SIZE, names=None):
+    ''' Loads the articles and categories cleaned by transform. With the vocabulary `names`, the documents keep the ids of their category, tags and host. '''
+    typed = formats.is_typed(clean_articles)
+    if chunk_size:
+        # The tags and categories are filled with the next article, the chunks are cut after a row that has both
+        chunks = formats.bfill_chunks(formats.read_articles_chunks(clean_articles, chunk_size), ['category_long'] if typed else ['tags', 'category_long'])
+    else:
+        chunks = [formats.read_articles(clean_articles)]
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    for df_articles in chunks:
+        df_articles = clean_articles_frame(df_articles, typed)
+        documents = article_documents(df_articles) if names is None else names.encode(article_documents(df_articles))
+        for key, count in upsert_documents(database['news'], documents, 'news_url', batch_size).items():
+            counts[key] += count
+    logger.info(f'Articles: {counts["inserted"]} inserted, {counts["updated"]} updated, {counts["skipped"]} skipped.')
+    df_categories = pd.read_csv(clean_categories)
+    counts = upsert_documents(database['categories'], category_documents(df_categories, names), 'categories', batch_size)
+    logger.info(f'Categories: {counts["inserted"]} inserted, {counts["updated"]} updated, {counts["skipped"]} skipped.')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Loads the clean articles and categories into the database.')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='documents sent in each bulk write')
+    parser.add_argument('--chunk-size', type=int, default=None, help='read and clean the articles in chunks of this many rows, instead of the whole file at once')
+    parser.add_argument('--raw', action='store_true', help='load the articles and categories written by extract, without transform')
+    args = parser.parse_args(argv)
+
+    logger.info(f'Accessing to collections.')
+    create_indexes(db)
+    names = vocabulary.Vocabulary('vocabulary.json', db)
 
     logger.info(f'Attempting to save data into database.')
-    if data_articles:
-        collection_articles.insert_many(data_articles)
-        logger.info(f'{len(data_articles)} articles inserted into database.')
-    if data_categories:
-        collection_categories.insert_many(data_categories)
-        logger.info(f'{len(data_categories)} categories inserted into database.')
+    if args.raw:
+        load_raw(db, formats.find('articles') or 'articles.csv', 'categories.csv', args.chunk_size, args.batch_size, names)
+    else:
+        load_clean(db, formats.find('clean_articles') or 'clean_articles.csv', 'clean_categories.csv', args.chunk_size, args.batch_size, names)
+    names.save()
 
     logger.info(f'Closing database {db.name}.')
 
     client.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
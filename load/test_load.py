@@ -4,7 +4,13 @@ import logging
 import re
 import datetime
 logging.basicConfig(level=logging.INFO)
-from load import clean_body, clean_tags, clean_images_list, cleaning_vanguardia_images, clean_empty_spaces, string_to_datetime
+from load import clean_body, clean_tags, clean_images_list, cleaning_vanguardia_images, clean_empty_spaces, string_to_datetime, create_indexes, upsert_documents, clean_articles_frame, article_documents, formats, load_raw, load_clean, vocabulary, dates
+import bson
+import pymongo
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
 
 today = datetime.datetime.now()
 logger = logging.getLogger(__name__)
@@ -34,6 +40,22 @@ class Test_Load(unittest.TestCase):
         for image in df['images']:
             self.assertEqual(type(image), type(test_list))
 
+    def test_cleaning_vanguardia_images(self):
+        ''' Test that verifies that the srcset of vanguardia is cut to the urls, and the images of the other hosts are kept '''
+        df = pd.DataFrame({
+            'host': ['https://www.vanguardia.com', 'https://www.ntn24.com', 'https://www.vanguardia.com'],
+            'images': [['//www.vanguardia.com/binrepository/a.jpg 716w', '//www.vanguardia.com/binrepository/b.jpg 300w'], ['https://www.ntn24.com/c.jpg'], []],
+        })
+        df = cleaning_vanguardia_images(df)
+        self.assertEqual(list(df['images']), [['www.vanguardia.com/binrepository/a.jpg', 'www.vanguardia.com/binrepository/b.jpg'], ['https://www.ntn24.com/c.jpg'], []])
+
+    def test_clean_articles_chunks(self):
+        ''' Test that verifies the documents of the articles cleaned in chunks are the same that are saved when the file is cleaned at once '''
+        whole = list(article_documents(clean_articles_frame(pd.read_csv('clean_articles_test.csv'), False)))
+        chunks = formats.bfill_chunks(formats.read_articles_chunks('clean_articles_test.csv', 7), ['tags', 'category_long'])
+        chunked = [document for chunk in chunks for document in article_documents(clean_articles_frame(chunk, False))]
+        self.assertEqual([bson.encode(document) for document in chunked], [bson.encode(document) for document in whole])
+
     def test_clean_empty_spaces(self):
         ''' Test that verifies that the content for the series subtitle, category_long and author is not none '''
         df = pd.read_csv('clean_articles_test.csv')
@@ -48,7 +70,87 @@ class Test_Load(unittest.TestCase):
         df = pd.read_csv('clean_articles_test.csv')
         df = string_to_datetime(df)
         for date in df['publication_date']:
-            self.assertEqual(type(date), type(today))
+            self.assertIsInstance(date, type(today))
+        self.assertEqual(str(df['publication_date'].dt.tz), 'UTC')
+
+    def test_dates_of_transform(self):
+        ''' Test that verifies the dates written by transform are read as they are, whatever the formats of their site '''
+        host = 'https://www.eleconomista.com.mx'
+        settings = dates._settings
+        dates._settings = {host: {'formats': ['%d/%m/%Y %H:%M'], 'timezone': 'America/Mexico_City'}}
+        try:
+            df = string_to_datetime(pd.DataFrame({'host': [host, host], 'publication_date': ['2020-11-01 16:30:00+00:00', None]}))
+        finally:
+            dates._settings = settings
+        self.assertEqual(df['publication_date'][0], pd.Timestamp('2020-11-01 16:30', tz='UTC'))
+        self.assertTrue(pd.isna(df['publication_date'][1]))
+
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class Test_Upserts(unittest.TestCase):
+    def setUp(self):
+        self.db = mongomock.MongoClient()['news_db']
+        create_indexes(self.db)
+        self.articles = [{'news_url': f'https://www.vanguardia.com/{i}', 'title': f'Title {i}'} for i in range(5)]
+
+    def test_upsert_documents_inserts_in_batches(self):
+        ''' Test that the documents are inserted when the collection is empty, whatever the batch size '''
+        counts = upsert_documents(self.db['news'], self.articles, 'news_url', batch_size=2)
+        self.assertEqual(counts, {'inserted': 5, 'updated': 0, 'skipped': 0})
+        self.assertEqual(self.db['news'].count_documents({}), 5)
+
+    def test_upsert_documents_is_idempotent(self):
+        ''' Test that loading the same documents twice does not duplicate them, and that a changed article is updated '''
+        upsert_documents(self.db['news'], self.articles, 'news_url', batch_size=2)
+        self.articles[0] = dict(self.articles[0], title='New title')
+        counts = upsert_documents(self.db['news'], self.articles, 'news_url', batch_size=2)
+        self.assertEqual(counts, {'inserted': 0, 'updated': 1, 'skipped': 4})
+        self.assertEqual(self.db['news'].count_documents({}), 5)
+        self.assertEqual(self.db['news'].find_one({'news_url': self.articles[0]['news_url']})['title'], 'New title')
+
+    def test_upsert_documents_repeated_key(self):
+        ''' Test that a url repeated in the file is saved once '''
+        counts = upsert_documents(self.db['categories'], [{'categories': 'Colombia'}, {'categories': 'Colombia'}], 'categories')
+        self.assertEqual(counts, {'inserted': 1, 'updated': 0, 'skipped': 1})
+        self.assertEqual(self.db['categories'].count_documents({}), 1)
+
+    def test_indexes_over_duplicates(self):
+        ''' Test that verifies the duplicates saved by the first versions are removed, keeping the last one, before the unique indexes are created '''
+        database = mongomock.MongoClient()['old_db']
+        database['news'].insert_many([{'news_url': 'https://www.vanguardia.com/1', 'title': f'Title {i}'} for i in range(3)] + [{'news_url': 'https://www.vanguardia.com/2', 'title': 'Other'}])
+        database['categories'].insert_many([{'categories': 'Deportes'}, {'categories': 'Deportes'}])
+        create_indexes(database)
+        self.assertEqual(sorted(document['title'] for document in database['news'].find()), ['Other', 'Title 2'])
+        self.assertEqual(database['categories'].count_documents({}), 1)
+        with self.assertRaises(pymongo.errors.DuplicateKeyError):
+            database['news'].insert_one({'news_url': 'https://www.vanguardia.com/2'})
+        create_indexes(database)
+
+    def test_load_raw(self):
+        ''' Test that verifies the articles written by extract are cleaned and saved without transform, in chunks or at once '''
+        load_raw(self.db, '../transform/articles_test.csv', '../transform/categories_test.csv', chunk_size=100)
+        articles = self.db['news'].count_documents({})
+        document = self.db['news'].find_one({'host': 'https://www.vanguardia.com'})
+        self.assertEqual(type(document['body']), list)
+        self.assertFalse(document['images'][0].startswith('//'))
+        self.assertIsInstance(document['publication_date'], datetime.datetime)
+        load_raw(self.db, '../transform/articles_test.csv', '../transform/categories_test.csv')
+        self.assertEqual(self.db['news'].count_documents({}), articles)
+        self.assertIn('Salud', self.db['categories'].distinct('categories'))
+
+    def test_load_with_ids(self):
+        ''' Test that verifies the news documents keep the ids of their category, tags and host, the same ones when the articles are loaded again '''
+        names = vocabulary.Vocabulary(None, self.db)
+        load_clean(self.db, 'clean_articles_test.csv', 'clean_categories_test.csv', names=names)
+        document = self.db['news'].find_one({'host': 'https://www.vanguardia.com', 'tags.0': {'$exists': True}})
+        self.assertEqual(document['host_id'], names.ids['host']['https://www.vanguardia.com'])
+        self.assertEqual(document['tag_ids'], [names.ids['tag'][vocabulary.fold(tag)] for tag in document['tags']])
+        self.assertEqual(document['category_id'], names.ids['category'][vocabulary.fold(document['category'])])
+        self.assertEqual(self.db['news'].count_documents({'category_id': document['category_id']}), self.db['news'].count_documents({'category': {'$in': [name for name in self.db['news'].distinct('category') if vocabulary.fold(name) == vocabulary.fold(document['category'])]}}))
+        category = self.db['categories'].find_one({})
+        self.assertEqual(category['category_id'], names.ids['category'][vocabulary.fold(category['categories'])])
+        load_clean(self.db, 'clean_articles_test.csv', 'clean_categories_test.csv', names=vocabulary.Vocabulary(None, self.db))
+        self.assertEqual(self.db['news'].find_one({'_id': document['_id']}), document)
 
 
 if __name__ == "__main__":
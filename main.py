@@ -1,38 +1,173 @@
 import os.path
+import argparse
+import importlib
 import logging
 logging.basicConfig(level=logging.INFO)
+import shutil
 import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+from shared import formats, metrics
 
 logger = logging.getLogger(__name__)
+ROOT = os.path.dirname(os.path.abspath(__file__))
 
 
 def _extract():
     logger.info('Starting extract process')
-    subprocess.run(['python3', 'extract.py'], cwd='./extract')
+    subprocess.run(['python3', 'extract.py'], cwd='./extract', check=True)
 
-    subprocess.run(['find', '.', '-name', '{}'.format('articles.csv'), '-exec', 'mv', '{}', '../transform/{}'.format('articles.csv'), ';'], cwd='./extract')
+    subprocess.run(['find', '.', '-maxdepth', '1', '-name', 'articles.*', '-exec', 'mv', '{}', '../transform/', ';'], cwd='./extract')
     subprocess.run(['find', '.', '-name', '{}'.format('categories.csv'), '-exec', 'mv', '{}', '../transform/{}'.format('categories.csv'), ';'], cwd='./extract')
 
 def _transform():
     logger.info('Starting transformation process...')
-    subprocess.run(['python3', 'transform.py'], cwd='./transform')
+    subprocess.run(['python3', 'transform.py'], cwd='./transform', check=True)
 
-    subprocess.run(['find', '.', '-name', '{}'.format('clean_articles.csv'), '-exec', 'mv', '{}', '../load/{}'.format('clean_articles.csv'), ';'], cwd='./transform')
+    subprocess.run(['find', '.', '-maxdepth', '1', '-name', 'clean_articles.*', '-exec', 'mv', '{}', '../load/', ';'], cwd='./transform')
     subprocess.run(['find', '.', '-name', '{}'.format('clean_categories.csv'), '-exec', 'mv', '{}', '../load/{}'.format('clean_categories.csv'), ';'], cwd='./transform')
 
 def _load():
     logger.info('Starting load process...')
-    subprocess.run(['python3', 'load.py'], cwd='./load')
+    subprocess.run(['python3', 'load.py'], cwd='./load', check=True)
     if os.path.isfile('clean_categories.csv'):
         subprocess.run(['rm', 'clean_categories.csv'], cwd='./load')
-    if os.path.isfile('clean_articles.csv'):
-        subprocess.run(['rm', 'clean_articles.csv'], cwd='./load')
+    subprocess.run(['find', '.', '-maxdepth', '1', '-name', 'clean_articles.*', '-delete'], cwd='./load')
 
 
-def main():
-    _extract()
-    _transform()
-    _load()
+@contextmanager
+def stage_folder(stage):
+    ''' Runs a stage inside its folder, as the stages read their files relative to it, and puts the folder first in the import path. '''
+    folder = os.path.join(ROOT, stage)
+    cwd = os.getcwd()
+    sys.path.insert(0, folder)
+    os.chdir(folder)
+    try:
+        yield folder
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(folder)
+
+def move_outputs(source, destination, names):
+    ''' Moves the files produced by a stage to the folder of the next one. '''
+    for name in names:
+        if os.path.isfile(os.path.join(ROOT, source, name)):
+            shutil.move(os.path.join(ROOT, source, name), os.path.join(ROOT, destination, name))
+
+def articles_files(name):
+    return [f'{name}{extension}' for extension in formats.EXTENSIONS]
+
+def _extract_in_process(move=True):
+    with stage_folder('extract'):
+        extract = importlib.import_module('extract')
+        extract.main([])
+    if move:
+        move_outputs('extract', 'transform', articles_files('articles') + ['categories.csv'])
+
+def _transform_in_process(chunk_size=None):
+    with stage_folder('transform'):
+        transform = importlib.import_module('transform')
+        transform.main(transform.formats.find('articles') or 'articles.csv', 'categories.csv', chunk_size=chunk_size)
+    move_outputs('transform', 'load', articles_files('clean_articles') + ['clean_categories.csv'])
+
+def _load_in_process(chunk_size=None):
+    with stage_folder('load'):
+        load = importlib.import_module('load')
+        load.main(['--chunk-size', str(chunk_size)] if chunk_size else [])
+        for name in articles_files('clean_articles') + ['clean_categories.csv']:
+            if os.path.isfile(name):
+                os.remove(name)
+
+def _load_raw_in_process(chunk_size=None):
+    move_outputs('extract', 'load', articles_files('articles') + ['categories.csv'])
+    with stage_folder('load'):
+        load = importlib.import_module('load')
+        load.main(['--raw'] + (['--chunk-size', str(chunk_size)] if chunk_size else []))
+        for name in articles_files('articles') + ['categories.csv']:
+            if os.path.isfile(name):
+                os.remove(name)
+
+def _load_batch(articles, categories):
+    ''' Transforms and loads a batch of the crawl daemon, and deletes it once it is in the database. '''
+    with stage_folder('transform'):
+        transform = importlib.import_module('transform')
+        transform.main(articles, categories, clean_articles=os.path.join(ROOT, 'load', 'clean_articles.jsonl'))
+    move_outputs('transform', 'load', ['clean_categories.csv'])
+    with stage_folder('load'):
+        load = importlib.import_module('load')
+        load.create_indexes(load.db)
+        names = load.vocabulary.Vocabulary('vocabulary.json', load.db)
+        load.load_clean(load.db, 'clean_articles.jsonl', 'clean_categories.csv', names=names)
+        names.save()
+        for name in ['clean_articles.jsonl', 'clean_categories.csv']:
+            os.remove(name)
+    os.remove(articles)
+    os.remove(categories)
+
+def _daemon_in_process(argv):
+    with stage_folder('extract'):
+        daemon = importlib.import_module('daemon')
+        daemon.main(argv, on_batch=_load_batch)
+
+def run_pipeline(stages):
+    ''' Runs the stages one after the other in this process, and returns the seconds each one took. It stops at the first stage that fails. '''
+    timings = {}
+    for name, stage in stages:
+        logger.info(f'Starting {name} process...')
+        start = time.perf_counter()
+        try:
+            stage()
+        except Exception:
+            logger.exception(f'The {name} process failed, the pipeline is stopped.')
+            raise
+        finally:
+            timings[name] = time.perf_counter() - start
+            metrics.set_gauge('stage_seconds', timings[name], stage=name)
+            logger.info(f'{name} process took {timings[name]:.2f}s')
+    return timings
+
+def write_metrics(path=None, prometheus=None):
+    ''' Writes the metrics recorded by the stages, with the pages fetched per second of the extraction. '''
+    pages = sum(value['value'] for value in metrics.summary()['counters'].get('pages_fetched', []))
+    extract_seconds = [value['value'] for value in metrics.summary()['gauges'].get('stage_seconds', []) if value['labels'] == {'stage': 'extract'}]
+    if extract_seconds and extract_seconds[0]:
+        metrics.set_gauge('pages_per_second', pages / extract_seconds[0], stage='extract')
+    if path:
+        metrics.write_json(os.path.join(ROOT, path))
+        logger.info(f'Metrics written in {path}.')
+    if prometheus:
+        metrics.write_prometheus(os.path.join(ROOT, prometheus))
+        logger.info(f'Metrics written in {prometheus} for Prometheus.')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs the extract, transform and load processes.')
+    parser.add_argument('--subprocess', action='store_true', help='run each process in its own python, as the first version did')
+    parser.add_argument('--fused', action='store_true', help='clean the articles while they are loaded, without the transform process')
+    parser.add_argument('--chunk-size', type=int, default=None, help='transform and load the articles in chunks of this many rows')
+    parser.add_argument('--metrics', nargs='?', const='metrics.json', default=None, metavar='PATH', help='record the timings and counters of the stages, and write them in a json file (metrics.json by default); the --subprocess mode does not record them')
+    parser.add_argument('--daemon', nargs=argparse.REMAINDER, default=None, metavar='ARGS', help='crawl continuously and transform and load the articles in micro-batches, the arguments that follow are the ones of extract/daemon.py')
+    parser.add_argument('--prometheus', default=None, metavar='PATH', help='also write the metrics in the text format of Prometheus')
+    args = parser.parse_args(argv)
+    if args.metrics or args.prometheus:
+        metrics.enable()
+
+    if args.daemon is not None:
+        stages = [('daemon', partial(_daemon_in_process, args.daemon))]
+    elif args.subprocess:
+        stages = [('extract', _extract), ('transform', _transform), ('load', _load)]
+    elif args.fused:
+        stages = [('extract', partial(_extract_in_process, move=False)), ('load', partial(_load_raw_in_process, args.chunk_size))]
+    else:
+        stages = [('extract', _extract_in_process), ('transform', partial(_transform_in_process, args.chunk_size)), ('load', partial(_load_in_process, args.chunk_size))]
+    try:
+        timings = run_pipeline(stages)
+        logger.info('Timings: ' + ', '.join(f'{name} {seconds:.2f}s' for name, seconds in timings.items()))
+    finally:
+        if metrics.enabled():
+            write_metrics(args.metrics, args.prometheus)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
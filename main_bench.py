@@ -0,0 +1,177 @@
+import os.path
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+import pandas as pd
+from main import ROOT, stage_folder
+from shared import formats, normalize
+
+# Offline benchmark of the pipeline. Each step is timed on its own: the link and field extraction on the pages of
+# extract/fixtures, hand-written copies of the structure of each site of 0.8 to 6.5 KB, far smaller than the pages the
+# sites serve, the replacer on the text of the articles, and the cleaning of transform and the documents of
+# load on synthetic files made by repeating transform/articles_test.csv. The results are written in a json file, and
+# --compare tells the steps that got slower than a previous run.
+# Run it from the root folder: python3 main_bench.py --scale 100 --output bench.json --compare previous.json
+
+logger = logging.getLogger(__name__)
+
+FIXTURES = ['vanguardia', 'canalrcn', 'ntn24', 'eluniversal', 'eleconomista', 'rt']
+
+
+def read_fixtures(kind):
+    pages = []
+    for iterator, name in enumerate(FIXTURES):
+        with open(os.path.join(ROOT, 'extract', 'fixtures', f'{name}_{kind}.html'), 'rb') as f:
+            pages.append((iterator, f.read()))
+    return pages
+
+def synthetic_articles(path, scale):
+    ''' Writes articles_test.csv repeated `scale` times, each copy with its own urls, as extract writes it. '''
+    df = pd.read_csv(os.path.join(ROOT, 'transform', 'articles_test.csv'))
+    copies = []
+    for copy in range(scale):
+        df_copy = df.copy()
+        df_copy['news_url'] = df_copy['news_url'] + f'?copy={copy}'
+        copies.append(df_copy)
+    pd.concat(copies, ignore_index=True).to_csv(path, index=False)
+    return path
+
+def timed(function, make_input, repeat):
+    ''' Returns the best seconds of `repeat` runs of function(make_input()), the input is made out of the time. '''
+    best = None
+    for _ in range(repeat):
+        data = make_input()
+        start = time.perf_counter()
+        function(data)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+def extract_steps(scale):
+    ''' Returns the steps of extract: name, function, input maker and number of items. '''
+    extract = importlib.import_module('extract')
+    sites = [extract.config()['news_sites'][iterator]['url'] for iterator in range(len(FIXTURES))]
+    homes = read_fixtures('home') * scale
+    categories = read_fixtures('category') * scale
+    articles = read_fixtures('article') * scale
+    texts = [text for iterator, content in read_fixtures('article') for text in extract.extractor(iterator).extract(extract.html.fromstring(content.decode('utf-8')))['content']] * scale * 10
+
+    def links(pages, parse):
+        return lambda _: [parse(sites[iterator], sites[iterator], content, iterator) for iterator, content in pages]
+    return [
+        ('extract.parse_categories', links(homes, extract.parse_categories), lambda: None, len(homes)),
+        ('extract.parse_article_links', links(categories, extract.parse_article_links), lambda: None, len(categories)),
+        ('extract.parse_article', links(articles, extract.parse_article), lambda: None, len(articles)),
+        ('extract.replacer', extract.replacer, lambda: texts, len(texts)),
+    ]
+
+def transform_steps(articles, categories, scale):
+    transform = importlib.import_module('transform')
+    df_articles = formats.read_articles(articles)
+    df_categories = pd.concat([pd.read_csv(categories)] * scale, ignore_index=True)
+    df_clean = transform.clean_df_string(df_articles.copy())
+    return [
+        ('transform.read_articles', formats.read_articles, lambda: articles, len(df_articles)),
+        ('transform.clean_df_string', transform.clean_df_string, df_articles.copy, len(df_articles)),
+        ('transform.delete_empty_titles_and_bodies', transform.delete_empty_titles_and_bodies, df_clean.copy, len(df_articles)),
+        ('transform.clean_datetime', transform.clean_datetime, df_clean.copy, len(df_articles)),
+        ('transform.delete_first_space_categories', transform.delete_first_space_categories, df_categories.copy, len(df_categories)),
+        ('transform.clean_articles_frame', lambda df: transform.clean_articles_frame(df, False), df_articles.copy, len(df_articles)),
+    ]
+
+def load_steps(clean_articles, articles):
+    ''' Returns the steps of load, the documents are built without being sent to the database. '''
+    load = importlib.import_module('load')
+    df_clean = formats.read_articles(clean_articles)
+    df_articles = formats.parse_lists(formats.read_articles(articles))
+    df_documents = load.clean_articles_frame(df_clean.copy(), False)
+    return [
+        ('load.clean_articles_frame', lambda df: load.clean_articles_frame(df, False), df_clean.copy, len(df_clean)),
+        ('load.article_documents', lambda df: list(load.article_documents(df)), lambda: df_documents, len(df_documents)),
+        ('normalize.normalize_frame', normalize.normalize_frame, lambda: df_articles, len(df_articles)),
+    ]
+
+def run_steps(steps, repeat):
+    results = {}
+    for name, function, make_input, items in steps:
+        seconds = timed(function, make_input, repeat)
+        results[name] = {'seconds': seconds, 'items': items, 'per_second': items / seconds if seconds else None}
+        print(f'{name:>45}: {seconds:8.4f}s, {items:8d} items, {results[name]["per_second"] or 0:12.0f} items/s')
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, previous, tolerance):
+    ''' Prints the ratio of each step to a previous run, and returns the steps more than `tolerance` slower. '''
+    regressions = []
+    print(f'Compared with {previous.get("commit")} of {previous.get("date")}')
+    for name, result in results['steps'].items():
+        old = previous['steps'].get(name)
+        if not old or not old['seconds'] or old['items'] != result['items']:
+            continue
+        ratio = result['seconds'] / old['seconds']
+        slower = ratio > 1 + tolerance
+        if slower:
+            regressions.append(name)
+        print(f'{name:>45}: x{ratio:5.2f}{"  REGRESSION" if slower else ""}')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Times each step of the pipeline offline, on the fixtures and on synthetic files.')
+    parser.add_argument('--scale', type=int, default=20, help='times the fixtures and articles_test.csv are repeated')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each step, the best one is kept')
+    parser.add_argument('--output', default='bench.json', help='json file the results are written in')
+    parser.add_argument('--compare', default=None, metavar='PATH', help='json file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown allowed before a step is a regression, 0.1 is 10%%')
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+    warnings.simplefilter('ignore')
+
+    results = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'scale': args.scale,
+        'repeat': args.repeat,
+        'steps': {},
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        articles = synthetic_articles(os.path.join(folder, 'articles.csv'), args.scale)
+        categories = os.path.join(ROOT, 'transform', 'categories_test.csv')
+        with stage_folder('extract'):
+            results['steps'].update(run_steps(extract_steps(args.scale), args.repeat))
+        with stage_folder('transform'):
+            results['steps'].update(run_steps(transform_steps(articles, categories, args.scale), args.repeat))
+            # The clean file load reads is the one of transform
+            clean_articles = os.path.join(folder, 'clean_articles.csv')
+            formats.write_articles(sys.modules['transform'].clean_articles_frame(formats.read_articles(articles), False), clean_articles)
+        try:
+            with stage_folder('load'):
+                results['steps'].update(run_steps(load_steps(clean_articles, articles), args.repeat))
+        except ImportError as error:
+            print(f'load is left out, it can not be imported: {error}')
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written in {args.output}')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
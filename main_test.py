@@ -11,10 +11,15 @@ def _transform():
 def _load():
     subprocess.run(['python3', 'test_load.py'], cwd='./load')
 
+def _shared():
+    for test in ['test_dates.py', 'test_normalize.py', 'test_vocabulary.py', 'test_formats.py', 'test_metrics.py']:
+        subprocess.run(['python3', test], cwd='./shared')
+
 def main():
     _extract()
     _transform()
     _load()
+    _shared()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
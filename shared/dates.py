@@ -0,0 +1,172 @@
+import logging
+import os.path
+import re
+import sys
+import numpy as np
+import pandas as pd
+import yaml
+from shared import metrics
+
+# Publication dates of the articles. Each site writes them in its own shapes: ISO dates with or without offset in
+# the @datetime and @content attributes, day first dates, or the free text of a span. The `dates` of each site in
+# extract/config.yaml lists the parsers of its dates, tried in order, and the timezone of the dates without offset:
+#
+#   dates:
+#     formats: [iso, '%d/%m/%Y %H:%M']
+#     timezone: America/Mexico_City
+#
+# A format is the name of a parser of PARSERS or a strptime format. The dates are parsed host by host, each parser
+# over the whole group at once, and are returned in UTC. A date that no parser reads is left empty and counted.
+
+logger = logging.getLogger(__name__)
+
+EXTRACT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'extract')
+CONFIG = os.path.join(EXTRACT, 'config.yaml')
+DEFAULT_SETTINGS = {'formats': ['iso'], 'timezone': 'UTC'}
+DATE_CHARACTERS = re.compile(r"['\[\]]")
+ISO_DATE = r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?(?:Z|[+-]\d{2}:?\d{2})?$'
+OFFSET = r'(?:Z|[+-]\d{2}:?\d{2})$'
+# The first versions of the text cleaner wrote the hyphens of the dates as spaces: 2020 10 31T08:56:21Z
+SPACED_DATE = r'^(\d{4}) (\d{2}) (\d{2})'
+SPANISH_DATE = r'^(?P<day>\d{1,2})\s+de\s+(?P<month>[a-zA-Z]+)\s+(?:de|del)\s+(?P<year>\d{4})(?:[\s,-]+(?P<hour>\d{1,2}):(?P<minute>\d{2}))?'
+SPANISH_MONTHS = {name: number for number, name in enumerate(['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre'], 1)}
+SPANISH_MONTHS['setiembre'] = 9
+# pandas 2 infers the format of a column from its first value, ISO8601 keeps reading the dates with and without time
+ISO_FORMAT = 'ISO8601' if int(pd.__version__.split('.')[0]) >= 2 else None
+
+PARSERS = {}
+_settings = None
+
+
+def parser(name):
+    ''' Decorator that adds a parser to PARSERS. A parser takes a series of strings and the timezone of the dates without offset, and returns their dates in UTC, NaT for the ones it cannot read. '''
+    def register(function):
+        PARSERS[name] = function
+        return function
+    return register
+
+
+def to_utc(dates, timezone):
+    ''' Returns the dates in UTC, the naive ones are taken in `timezone`. The hours that do not exist or exist twice in it are left empty. '''
+    if dates.dt.tz is not None:
+        return dates.dt.tz_convert('UTC')
+    return dates.dt.tz_localize(timezone, ambiguous='NaT', nonexistent='NaT').dt.tz_convert('UTC')
+
+
+@parser('iso')
+def parse_iso(values, timezone):
+    ''' ISO 8601 dates, the ones without offset are in `timezone`. '''
+    values = values.str.replace(SPACED_DATE, r'\1-\2-\3', regex=True)
+    # The parser of pandas reads other shapes too, as 01/11/2020 month first, they are left to the next formats
+    values = values.where(values.str.match(ISO_DATE, na=False))
+    aware = values.str.contains(OFFSET, regex=True, na=False)
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    if aware.any():
+        dates[aware] = pd.to_datetime(values[aware], errors='coerce', utc=True, format=ISO_FORMAT)
+    if not aware.all() and values.notna().any():
+        dates[~aware] = to_utc(pd.to_datetime(values[~aware], errors='coerce', format=ISO_FORMAT), timezone)
+    return dates
+
+
+@parser('spanish')
+def parse_spanish(values, timezone):
+    ''' Dates written in words, as `04 de noviembre de 2020` or `1 de noviembre del 2020, 10:30`, in `timezone`. '''
+    parts = values.str.strip().str.extract(SPANISH_DATE)
+    parts['month'] = parts['month'].str.lower().map(SPANISH_MONTHS)
+    parts[['hour', 'minute']] = parts[['hour', 'minute']].fillna(0)
+    return to_utc(pd.to_datetime(parts[['year', 'month', 'day', 'hour', 'minute']].astype(float), errors='coerce'), timezone)
+
+
+def parse_format(values, date_format, timezone):
+    ''' Dates in a strptime format, the ones without offset are in `timezone`. '''
+    return to_utc(pd.to_datetime(values, format=date_format, errors='coerce', utc='%z' in date_format), timezone)
+
+
+def read_settings(path=CONFIG):
+    ''' This function returns the `dates` of each site, url -> settings: the news_sites of extract/config.yaml and of the files of its sites_files, read as the extractor reads them. '''
+    if not os.path.isfile(path):
+        return {}
+    with open(path, mode='r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    if EXTRACT not in sys.path:
+        sys.path.append(EXTRACT)
+    from sites import read_sites
+    sites = read_sites(data, os.path.dirname(path)).values()
+    return {site['url']: dict(DEFAULT_SETTINGS, **(site.get('dates') or {})) for site in sites if 'url' in site}
+
+
+def host_settings():
+    ''' This function returns the `dates` of each site, read once from extract/config.yaml. '''
+    global _settings
+    if _settings is None:
+        _settings = read_settings()
+    return _settings
+
+
+def parse_group(values, settings):
+    ''' Parses the dates of a host with its formats, each one over the values the previous ones could not read. It returns them in UTC. '''
+    dates = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns, UTC]')
+    for date_format in settings['formats']:
+        left = dates.isna() & values.notna()
+        if not left.any():
+            break
+        if date_format in PARSERS:
+            dates[left] = PARSERS[date_format](values[left], settings['timezone'])
+        elif '%' in date_format:
+            dates[left] = parse_format(values[left], date_format, settings['timezone'])
+        else:
+            raise ValueError(f'Unknown date format {date_format}, it is neither a parser of {sorted(PARSERS)} nor a strptime format')
+    return dates
+
+
+def clean_strings(values):
+    ''' Returns the dates as strings without brackets nor quotes, empty for the articles without date. '''
+    return values.str.replace(DATE_CHARACTERS, '', regex=True).str.strip().fillna('')
+
+
+def parse_dates(values, hosts=None, settings=None, stage='transform'):
+    ''' This function parses the publication dates of the articles of `hosts` with the `dates` of their sites, or the defaults for the hosts without them, and returns them in UTC. The dates that are missing or that no format reads are left empty, and are counted in the `dates` metric by host and result. '''
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return to_utc(values, DEFAULT_SETTINGS['timezone'])
+    settings = host_settings() if settings is None else settings
+    present = values.dropna()
+    if len(present) and isinstance(present.iloc[0], list):
+        # The typed files keep the dates as lists
+        values = values.str.join(' ')
+    hosts = pd.Series('', index=values.index) if hosts is None else hosts.fillna('')
+    # The articles of a day share their dates, each date of a host is cleaned and parsed once
+    codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([hosts, values.fillna('')]))
+    unique_hosts = pd.Series(uniques.get_level_values(0))
+    unique_values = clean_strings(pd.Series(uniques.get_level_values(1), dtype=object))
+    parsed = pd.Series(pd.NaT, index=unique_values.index, dtype='datetime64[ns, UTC]')
+    for host in unique_hosts.unique():
+        group = unique_hosts == host
+        parsed[group] = parse_group(unique_values[group].where(unique_values[group] != ''), settings.get(host, DEFAULT_SETTINGS))
+    missing = unique_values == ''
+    counts = pd.DataFrame({'rows': np.bincount(codes, minlength=len(uniques))})
+    counts['missing'] = counts['rows'].where(missing, 0)
+    counts['unparseable'] = counts['rows'].where(parsed.isna() & ~missing, 0)
+    for host, (rows, missing_rows, unparseable) in counts.groupby(unique_hosts.values).sum().iterrows():
+        if unparseable:
+            logger.warning(f'{unparseable} dates of {host or "unknown hosts"} could not be parsed, as {unique_values[(unique_hosts == host) & parsed.isna() & ~missing].iloc[0]!r}')
+        metrics.inc('dates', int(rows - missing_rows - unparseable), stage=stage, host=host, result='parsed')
+        metrics.inc('dates', int(missing_rows), stage=stage, host=host, result='missing')
+        metrics.inc('dates', int(unparseable), stage=stage, host=host, result='unparseable')
+    return pd.Series(parsed.array.take(codes), index=values.index)
+
+
+def parse_date(value, host=None, settings=None, stage='load'):
+    ''' Same as parse_dates, for the date of one article. It returns None when it is missing or cannot be parsed. '''
+    settings = host_settings() if settings is None else settings
+    value = ' '.join(value) if isinstance(value, list) else value
+    value = DATE_CHARACTERS.sub('', value).strip() if isinstance(value, str) else ''
+    if not value:
+        metrics.inc('dates', stage=stage, host=host or '', result='missing')
+        return None
+    date = parse_group(pd.Series([value], dtype=object), settings.get(host, DEFAULT_SETTINGS))[0]
+    if pd.isna(date):
+        logger.warning(f'The date of {host or "an unknown host"} could not be parsed, as {value!r}')
+        metrics.inc('dates', stage=stage, host=host or '', result='unparseable')
+        return None
+    metrics.inc('dates', stage=stage, host=host or '', result='parsed')
+    return date
@@ -0,0 +1,163 @@
+import ast
+import gzip
+import os.path
+import numpy as np
+import pandas as pd
+
+# Intermediate files between extract, transform and load. The csv keeps the lists as python strings, as the
+# first version of the scraper did, the json lines (optionally gzip compressed) and parquet files keep them as lists.
+
+LIST_COLUMNS = ['title', 'subtitle', 'body', 'images', 'category_long', 'tags', 'author', 'publication_date']
+EXTENSIONS = ['.csv', '.jsonl.gz', '.jsonl', '.parquet']
+
+
+def format_of(path):
+    ''' This function returns the format of a file from its extension: csv, jsonl or parquet. '''
+    if path.endswith('.parquet'):
+        return 'parquet'
+    if path.endswith('.jsonl') or path.endswith('.jsonl.gz'):
+        return 'jsonl'
+    return 'csv'
+
+
+def is_typed(path):
+    ''' This function returns True when the file keeps the list columns as lists. '''
+    return format_of(path) != 'csv'
+
+
+def extension_of(path):
+    ''' This function returns the extension of a file, keeping the compression: articles.jsonl.gz -> .jsonl.gz '''
+    for extension in EXTENSIONS:
+        if path.endswith(extension):
+            return extension
+    return os.path.splitext(path)[1]
+
+
+def find(name, folder='.'):
+    ''' This function returns the path of the file `name` in any of the supported formats, or None if there is none. '''
+    for extension in EXTENSIONS:
+        path = os.path.join(folder, f'{name}{extension}')
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def arrays_to_lists(df):
+    ''' Parquet returns the lists as numpy arrays, this function turns them back into lists. '''
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(lambda value: list(value) if hasattr(value, 'tolist') else value)
+    return df
+
+
+def parse_lists(df):
+    ''' This function rebuilds the list columns of the articles read from a csv file, where they are python strings. '''
+    for column in LIST_COLUMNS:
+        df[column] = df[column].map(lambda value: ast.literal_eval(value) if isinstance(value, str) else value)
+    return df
+
+
+def read_articles(path):
+    ''' This function reads a file of articles in any of the supported formats into a dataframe. '''
+    file_format = format_of(path)
+    if file_format == 'parquet':
+        return arrays_to_lists(pd.read_parquet(path))
+    if file_format == 'jsonl':
+        return pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+    return pd.read_csv(path)
+
+
+def read_articles_chunks(path, chunk_size):
+    ''' This function reads a file of articles in dataframes of `chunk_size` rows, so only one chunk is in memory at a time. The index of the chunks follows the rows of the file. The csv columns are read as strings, a chunk where a column is empty would be read as float otherwise. '''
+    file_format = format_of(path)
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        start = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            df = arrays_to_lists(batch.to_pandas())
+            df.index = range(start, start + len(df))
+            start += len(df)
+            yield df
+    elif file_format == 'jsonl':
+        with pd.read_json(path, lines=True, dtype=False, convert_dates=False, chunksize=chunk_size) as reader:
+            yield from reader
+    else:
+        with pd.read_csv(path, chunksize=chunk_size, dtype=str) as reader:
+            yield from reader
+
+
+def bfill_chunks(chunks, columns):
+    ''' This function joins the chunks so the last row of each one has a value in all the `columns`, the rows after it wait for the next chunk. A backward fill of those columns inside each chunk gives then the same values as on the whole file. '''
+    waiting = None
+    for chunk in chunks:
+        if waiting is not None:
+            chunk = pd.concat([waiting, chunk])
+        filled = np.flatnonzero(chunk[columns].notna().all(axis=1).to_numpy())
+        end = filled[-1] + 1 if len(filled) else 0
+        waiting = chunk.iloc[end:]
+        if end:
+            yield chunk.iloc[:end].copy()
+    if waiting is not None and len(waiting):
+        yield waiting
+
+
+def dates_to_strings(df):
+    ''' The csv writer picks the format of a date column from all its values (the time is left out when every date is at midnight), this function writes each date on its own so a file written in chunks is the same as one written at once. '''
+    columns = [column for column in df.columns if pd.api.types.is_datetime64_any_dtype(df[column])]
+    if columns:
+        df = df.copy()
+        for column in columns:
+            df[column] = df[column].map(lambda date: '' if pd.isna(date) else str(date))
+    return df
+
+
+def write_articles(df, path):
+    ''' This function writes a dataframe of articles in the format given by the extension of the path. '''
+    file_format = format_of(path)
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    elif file_format == 'jsonl':
+        df.to_json(path, orient='records', lines=True, force_ascii=False, date_format='iso')
+    else:
+        dates_to_strings(df).to_csv(path, index=False)
+
+
+class ArticleWriter:
+    ''' Writes a file of articles chunk by chunk, in the format given by the extension of the path. The file has the same rows write_articles gives with the whole dataframe. '''
+
+    def __init__(self, path):
+        self.path = path
+        self.format = format_of(path)
+        self.rows = 0
+        self._file = None
+        self._parquet = None
+
+    def write(self, df):
+        if self.format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # The schema of the first chunk is kept, the next chunks are converted to it
+            table = pa.Table.from_pandas(df, preserve_index=False, schema=self._parquet.schema if self._parquet else None)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        elif self.format == 'jsonl':
+            if self._file is None:
+                self._file = gzip.open(self.path, 'wt', encoding='utf-8') if self.path.endswith('.gz') else open(self.path, 'w', encoding='utf-8')
+            if len(df):
+                self._file.write(df.to_json(orient='records', lines=True, force_ascii=False, date_format='iso'))
+        else:
+            dates_to_strings(df).to_csv(self.path, mode='a' if self.rows else 'w', header=not self.rows, index=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
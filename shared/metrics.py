@@ -0,0 +1,185 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Metrics of the pipeline shared by extract, transform and load: counters, gauges and histograms with labels such as
+# the host and the stage. They are off until enable() is called, then every call returns at once, so the hot paths
+# can be instrumented without cost for the runs that do not ask for the metrics.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_enabled = False
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    ''' This function drops every value recorded. '''
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    ''' This function adds `value` to a counter. '''
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    ''' This function sets the value of a gauge. '''
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, **labels):
+    ''' This function records a value, usually seconds, in a histogram. '''
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(BUCKETS) + 1)}
+        histogram['count'] += 1
+        histogram['sum'] += value
+        histogram['buckets'][bisect_left(BUCKETS, value)] += 1
+
+
+class _Timer:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(name, **labels):
+    ''' This function returns a context manager that records the seconds of its block in a histogram. '''
+    if not _enabled:
+        return _NO_TIMER
+    return _Timer(name, labels)
+
+
+def drain():
+    ''' This function returns the values recorded and resets them, the parse processes send them back to the crawl this way. '''
+    with _lock:
+        values = (dict(_counters), dict(_gauges), {key: dict(histogram, buckets=list(histogram['buckets'])) for key, histogram in _histograms.items()})
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+    return values
+
+
+def merge(values):
+    ''' This function adds the values drained from another process to the ones of this process. '''
+    counters, gauges, histograms = values
+    with _lock:
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+        _gauges.update(gauges)
+        for key, other in histograms.items():
+            histogram = _histograms.get(key)
+            if histogram is None:
+                _histograms[key] = other
+                continue
+            histogram['count'] += other['count']
+            histogram['sum'] += other['sum']
+            histogram['buckets'] = [a + b for a, b in zip(histogram['buckets'], other['buckets'])]
+
+
+def summary():
+    ''' This function returns the metrics as a dictionary: name -> list of {labels, value}, the histograms have their count, sum and buckets. '''
+    with _lock:
+        result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for kind, values in [('counters', _counters), ('gauges', _gauges)]:
+            for (name, labels), value in sorted(values.items()):
+                result[kind].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), histogram in sorted(_histograms.items()):
+            buckets = {str(bound): count for bound, count in zip(BUCKETS + ('+Inf',), histogram['buckets'])}
+            result['histograms'].setdefault(name, []).append({'labels': dict(labels), 'count': histogram['count'], 'sum': histogram['sum'], 'buckets': buckets})
+    return result
+
+
+def write_json(path):
+    ''' This function writes the summary of the metrics in a json file. '''
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(summary(), f, indent=2, sort_keys=True)
+
+
+def _labels_text(labels, extra=None):
+    labels = dict(labels, **(extra or {}))
+    if not labels:
+        return ''
+    escaped = {name: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for name, value in labels.items()}
+    return '{' + ','.join(f'{name}="{value}"' for name, value in sorted(escaped.items())) + '}'
+
+
+def prometheus_text():
+    ''' This function returns the metrics in the text format of Prometheus. '''
+    lines = []
+    data = summary()
+    for kind, prometheus_type in [('counters', 'counter'), ('gauges', 'gauge')]:
+        for name, values in data[kind].items():
+            lines.append(f'# TYPE newsscrapper_{name} {prometheus_type}')
+            for value in values:
+                lines.append(f'newsscrapper_{name}{_labels_text(value["labels"])} {value["value"]}')
+    for name, values in data['histograms'].items():
+        lines.append(f'# TYPE newsscrapper_{name} histogram')
+        for value in values:
+            cumulative = 0
+            for bound, count in value['buckets'].items():
+                cumulative += count
+                lines.append(f'newsscrapper_{name}_bucket{_labels_text(value["labels"], {"le": bound})} {cumulative}')
+            lines.append(f'newsscrapper_{name}_sum{_labels_text(value["labels"])} {value["sum"]}')
+            lines.append(f'newsscrapper_{name}_count{_labels_text(value["labels"])} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path):
+    ''' This function writes the metrics in a text file that the node exporter of Prometheus can collect. '''
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
@@ -0,0 +1,79 @@
+import math
+import re
+import pandas as pd
+from shared import dates
+
+# Normalisation of the extracted articles in a single pass: a raw record, as the extractor writes it, is turned into
+# the document saved in the news collection. normalize_article works on one record and normalize_frame on a chunk
+# of them, both give the documents that transform followed by load give for the typed files.
+
+DOCUMENT_FIELDS = ['title', 'subtitle', 'images', 'body', 'tags', 'author', 'host', 'news_url', 'publication_date', 'category']
+VANGUARDIA = 'https://www.vanguardia.com'
+VANGUARDIA_IMAGE = re.compile(r'[\w]{3}\.[\w\-\.\/]+\.[\w]{3}')
+
+
+def missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def join_list(value):
+    return ' '.join(value) if isinstance(value, list) else value
+
+
+def split_images(images, host):
+    ''' This function splits the srcset of the images in urls, the ones of vanguardia come without the scheme and with the width. '''
+    images = [part for image in images for part in image.split(',')]
+    if host == VANGUARDIA:
+        images = [''.join(VANGUARDIA_IMAGE.findall(image)) for image in images]
+    return images
+
+
+def link_duplicate(document, duplicate_of):
+    ''' The duplicates of an article scraped from another host keep the url of the original. '''
+    if isinstance(duplicate_of, str) and duplicate_of:
+        document['duplicate_of'] = duplicate_of
+    return document
+
+
+def normalize_article(record):
+    ''' This function turns an article extracted into the document saved in the database. '''
+    subtitle = join_list(record['subtitle'])
+    author = join_list(record['author'])
+    return link_duplicate({
+        'title': join_list(record['title']),
+        'subtitle': '' if missing(subtitle) else subtitle,
+        'images': split_images(record['images'], record['host']),
+        'body': record['body'],
+        'tags': record['tags'],
+        'author': record['host'] if missing(author) else author,
+        'host': record['host'],
+        'news_url': record['news_url'],
+        'publication_date': dates.parse_date(record['publication_date'], record['host']),
+        'category': join_list(record['category_long']),
+    }, record.get('duplicate_of'))
+
+
+def normalize_frame(df):
+    ''' Same as normalize_article, for a dataframe of articles: the string columns are cleaned with one pass each. It returns the list of documents. '''
+    documents = pd.DataFrame(index=df.index)
+    documents['title'] = df['title'].map(join_list)
+    documents['subtitle'] = df['subtitle'].map(join_list).fillna('')
+    documents['images'] = [split_images(images, host) for images, host in zip(df['images'], df['host'])]
+    documents['body'] = df['body']
+    documents['tags'] = df['tags']
+    documents['author'] = df['author'].map(join_list).fillna(df['host'])
+    documents['host'] = df['host']
+    documents['news_url'] = df['news_url']
+    publication_dates = dates.parse_dates(df['publication_date'], df['host'], stage='load')
+    # The dates that are missing or could not be parsed are saved as null
+    documents['publication_date'] = publication_dates.astype(object).where(publication_dates.notna(), None)
+    documents['category'] = df['category_long'].map(join_list)
+    documents = documents[DOCUMENT_FIELDS].to_dict('records')
+    if 'duplicate_of' in df:
+        documents = [link_duplicate(document, duplicate_of) for document, duplicate_of in zip(documents, df['duplicate_of'])]
+    return documents
+
+
+def normalize_category(category):
+    ''' This function drops the first character of a category when it is a space, and capitalizes it. '''
+    return (category[0].replace(' ', '') + category[1:]).capitalize()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+import logging
+import pandas as pd
+logging.basicConfig(level=logging.INFO)
+# The modules of shared are imported as the stages import them, from the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dates import parse_dates, parse_date, read_settings, metrics
+
+logger = logging.getLogger(__name__)
+SETTINGS = {
+    'https://www.eleconomista.com.mx': {'formats': ['iso', '%d/%m/%Y %H:%M'], 'timezone': 'America/Mexico_City'},
+    'https://www.ntn24.com': {'formats': ['iso', 'spanish'], 'timezone': 'America/Bogota'},
+}
+
+
+class Test_Dates(unittest.TestCase):
+    logger.info('Starting test for the parsers of the publication dates.')
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_formats_per_host(self):
+        ''' Test that verifies the dates of each host are read with its formats in order, the ones without offset in its timezone, and returned in UTC '''
+        values = pd.Series(["['01/11/2020 13:38']", "['2020-11-01T20:30:00-06:00']", "['01 de noviembre de 2020']", "['2020 05 10T14:55:11Z']", '2020-10-30 19:27:20', '01/11/2020 13:38'])
+        hosts = pd.Series(['https://www.eleconomista.com.mx', 'https://www.eleconomista.com.mx', 'https://www.ntn24.com', 'https://www.ntn24.com', None, None])
+        dates = parse_dates(values, hosts, SETTINGS)
+        self.assertEqual(str(dates.dtype), 'datetime64[ns, UTC]')
+        self.assertEqual(list(dates[:5]), [pd.Timestamp(date, tz='UTC') for date in ['2020-11-01 19:38', '2020-11-02 02:30', '2020-11-01 05:00', '2020-05-10 14:55:11', '2020-10-30 19:27:20']])
+        # The hosts without formats only read the ISO dates, 01/11/2020 is not taken month first
+        self.assertTrue(pd.isna(dates[5]))
+        self.assertEqual(parse_date(values[0], hosts[0], SETTINGS), dates[0])
+        typed = parse_dates(pd.Series([['01/11/2020 13:38'], []]), hosts[:2], SETTINGS)
+        self.assertEqual(typed[0], dates[0])
+        self.assertTrue(pd.isna(typed[1]))
+        self.assertIsNone(parse_date('[]', hosts[0], SETTINGS))
+
+    def test_counts(self):
+        ''' Test that verifies the dates missing and the ones that cannot be parsed are left empty and counted by host, each date is parsed once '''
+        values = pd.Series(["['2020-11-01T20:30:00-06:00']"] * 3 + ['[]', None, "['ayer']", "['ayer']"])
+        hosts = pd.Series(['https://www.ntn24.com'] * 7)
+        metrics.enable()
+        dates = parse_dates(values, hosts, SETTINGS)
+        counts = {value['labels']['result']: value['value'] for value in metrics.summary()['counters']['dates']}
+        self.assertEqual(counts, {'parsed': 3, 'missing': 2, 'unparseable': 2})
+        self.assertEqual(int(dates.isna().sum()), 4)
+        with self.assertRaises(ValueError):
+            parse_dates(values, hosts, {'https://www.ntn24.com': {'formats': ['dayfirst'], 'timezone': 'UTC'}})
+
+    def test_read_settings(self):
+        ''' Test that verifies the formats are read from the sites of the config and of its sites_files, with the defaults for the keys missing '''
+        with tempfile.TemporaryDirectory() as folder:
+            os.makedirs(os.path.join(folder, 'sites'))
+            with open(os.path.join(folder, 'config.yaml'), 'w', encoding='utf-8') as f:
+                f.write("sites_files: sites\nnews_sites:\n  0:\n    url: https://www.ntn24.com\n    dates:\n      formats: [iso, spanish]\n")
+            with open(os.path.join(folder, 'sites', 'more.yaml'), 'w', encoding='utf-8') as f:
+                f.write("news_sites:\n  1:\n    url: https://www.eltiempo.com\n")
+            settings = read_settings(os.path.join(folder, 'config.yaml'))
+        self.assertEqual(settings, {'https://www.ntn24.com': {'formats': ['iso', 'spanish'], 'timezone': 'UTC'}, 'https://www.eltiempo.com': {'formats': ['iso'], 'timezone': 'UTC'}})
+        self.assertEqual(read_settings()['https://www.eleconomista.com.mx']['timezone'], 'America/Mexico_City')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import ast
+import os
+import sys
+import tempfile
+import unittest
+import logging
+import pandas as pd
+import pandas.testing as pd_test
+logging.basicConfig(level=logging.INFO)
+# The modules of shared are imported as the stages import them, from the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from formats import LIST_COLUMNS, format_of, extension_of, find, read_articles, write_articles, read_articles_chunks, bfill_chunks, ArticleWriter
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def typed_articles():
+    ''' Returns the articles of transform/articles_test.csv with the lists rebuilt '''
+    df = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'transform', 'articles_test.csv'))
+    for column in LIST_COLUMNS:
+        df[column] = df[column].map(ast.literal_eval)
+    return df
+
+
+class Test_Formats(unittest.TestCase):
+    logger.info('Starting test for the intermediate formats.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_format_of(self):
+        ''' Test that verifies the format and extension are taken from the name of the file '''
+        self.assertEqual(format_of('articles.csv'), 'csv')
+        self.assertEqual(format_of('articles.jsonl.gz'), 'jsonl')
+        self.assertEqual(format_of('articles.parquet'), 'parquet')
+        self.assertEqual(extension_of('clean_articles.jsonl.gz'), '.jsonl.gz')
+
+    def test_find(self):
+        ''' Test that verifies the file is found in any of the formats '''
+        self.assertIsNone(find('articles', self.folder.name))
+        path = os.path.join(self.folder.name, 'articles.jsonl.gz')
+        write_articles(typed_articles().head(), path)
+        self.assertEqual(find('articles', self.folder.name), path)
+
+    def test_jsonl_keeps_lists(self):
+        ''' Test that verifies the compressed json lines keep the list columns '''
+        df = typed_articles()
+        path = os.path.join(self.folder.name, 'articles.jsonl.gz')
+        write_articles(df, path)
+        pd_test.assert_frame_equal(read_articles(path), df)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_keeps_lists(self):
+        ''' Test that verifies the parquet files keep the list columns '''
+        df = typed_articles()
+        path = os.path.join(self.folder.name, 'articles.parquet')
+        write_articles(df, path)
+        pd_test.assert_frame_equal(read_articles(path), df)
+
+    def test_chunks_same_as_whole_file(self):
+        ''' Test that verifies a file read and written in chunks is the same as the file read and written at once '''
+        df = typed_articles()
+        df['publication_date'] = pd.to_datetime(df['publication_date'].map(' '.join).replace('', '2020-11-01'))
+        extensions = ['.csv', '.jsonl', '.jsonl.gz'] + (['.parquet'] if pyarrow else [])
+        for extension in extensions:
+            whole = os.path.join(self.folder.name, f'whole{extension}')
+            chunked = os.path.join(self.folder.name, f'chunked{extension}')
+            write_articles(df, whole)
+            with ArticleWriter(chunked) as writer:
+                for chunk in read_articles_chunks(whole, 7):
+                    self.assertLessEqual(len(chunk), 7)
+                    writer.write(chunk)
+            self.assertEqual(writer.rows, len(df))
+            pd_test.assert_frame_equal(read_articles(chunked), read_articles(whole))
+            if extension == '.csv':
+                with open(whole, 'rb') as a, open(chunked, 'rb') as b:
+                    self.assertEqual(a.read(), b.read())
+
+    def test_bfill_chunks(self):
+        ''' Test that verifies the backward fill of the chunks gives the same values as the backward fill of the whole dataframe '''
+        df = pd.DataFrame({'tags': ['a', None, None, 'b', None, 'c', None], 'category_long': [None, 'x', None, None, 'y', 'z', None]})
+        chunks = list(bfill_chunks((df.iloc[start:start + 2] for start in range(0, len(df), 2)), ['tags', 'category_long']))
+        filled = pd.concat([chunk.fillna(method='bfill') for chunk in chunks])
+        pd_test.assert_frame_equal(filled, df.fillna(method='bfill'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+# The modules of shared are imported as the stages import them, from the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Metrics(unittest.TestCase):
+    logger.info('Starting test for the metrics of the pipeline.')
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_disabled(self):
+        ''' Test that verifies nothing is recorded while the metrics are off '''
+        metrics.disable()
+        metrics.inc('pages_fetched', host='https://www.ntn24.com')
+        metrics.observe('fetch_seconds', 0.2, host='https://www.ntn24.com')
+        with metrics.timer('clean_seconds', stage='transform'):
+            pass
+        self.assertEqual(metrics.summary(), {'counters': {}, 'gauges': {}, 'histograms': {}})
+
+    def test_counters_and_histograms(self):
+        ''' Test that verifies the values are kept by name and labels, and the histograms count each value in its bucket '''
+        metrics.inc('pages_fetched', host='https://www.ntn24.com', status=200)
+        metrics.inc('pages_fetched', 2, status=200, host='https://www.ntn24.com')
+        metrics.inc('pages_fetched', host='https://actualidad.rt.com', status=200)
+        metrics.observe('fetch_seconds', 0.2, host='https://www.ntn24.com')
+        metrics.observe('fetch_seconds', 0.25, host='https://www.ntn24.com')
+        metrics.observe('fetch_seconds', 60, host='https://www.ntn24.com')
+        data = metrics.summary()
+        self.assertEqual(data['counters']['pages_fetched'], [
+            {'labels': {'host': 'https://actualidad.rt.com', 'status': 200}, 'value': 1},
+            {'labels': {'host': 'https://www.ntn24.com', 'status': 200}, 'value': 3},
+        ])
+        histogram = data['histograms']['fetch_seconds'][0]
+        self.assertEqual(histogram['count'], 3)
+        self.assertEqual(histogram['buckets']['0.25'], 2)
+        self.assertEqual(histogram['buckets']['+Inf'], 1)
+
+    def test_drain_and_merge(self):
+        ''' Test that verifies the values drained from a process are added to the ones of another '''
+        metrics.inc('articles_written', host='https://www.ntn24.com')
+        metrics.observe('parse_seconds', 0.01, host='https://www.ntn24.com')
+        values = metrics.drain()
+        self.assertEqual(metrics.summary()['counters'], {})
+        metrics.inc('articles_written', host='https://www.ntn24.com')
+        metrics.observe('parse_seconds', 0.01, host='https://www.ntn24.com')
+        metrics.merge(values)
+        data = metrics.summary()
+        self.assertEqual(data['counters']['articles_written'][0]['value'], 2)
+        self.assertEqual(data['histograms']['parse_seconds'][0]['count'], 2)
+
+    def test_exports(self):
+        ''' Test that verifies the json summary and the text format of Prometheus '''
+        metrics.inc('documents', 5, collection='news', result='inserted')
+        metrics.set_gauge('stage_seconds', 1.5, stage='load')
+        metrics.observe('mongo_bulk_write_seconds', 0.003, collection='news')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'metrics.json')
+            metrics.write_json(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)['gauges']['stage_seconds'][0]['value'], 1.5)
+        text = metrics.prometheus_text()
+        self.assertIn('# TYPE newsscrapper_documents counter', text)
+        self.assertIn('newsscrapper_documents{collection="news",result="inserted"} 5', text)
+        self.assertIn('newsscrapper_mongo_bulk_write_seconds_bucket{collection="news",le="0.005"} 1', text)
+        self.assertIn('newsscrapper_mongo_bulk_write_seconds_bucket{collection="news",le="+Inf"} 1', text)
+        self.assertIn('newsscrapper_mongo_bulk_write_seconds_count{collection="news"} 1', text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import unittest
+import logging
+import bson
+import pandas as pd
+logging.basicConfig(level=logging.INFO)
+# The modules of shared are imported as the stages import them, from the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from normalize import normalize_article, normalize_frame, normalize_category
+from test_formats import typed_articles
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Normalize(unittest.TestCase):
+    logger.info('Starting test for the normalisation of the articles.')
+    def setUp(self):
+        self.record = {
+            'title': ['Tifón Goni golpea Filipinas'],
+            'subtitle': [],
+            'body': ['Al menos diez personas murieron', 'tras el paso del tifón'],
+            'images': ['//www.vanguardia.com/binrepository/a.jpg 716w,//www.vanguardia.com/binrepository/b.jpg 300w'],
+            'category_long': ['Mundo'],
+            'tags': ['Filipinas', 'Tifón'],
+            'author': [],
+            'publication_date': [],
+            'news_url': 'https://www.vanguardia.com/mundo/tifon-goni',
+            'host': 'https://www.vanguardia.com',
+        }
+
+    def test_normalize_article(self):
+        ''' Test that verifies an extracted article is turned into the document of the database '''
+        document = normalize_article(self.record)
+        self.assertEqual(document['title'], 'Tifón Goni golpea Filipinas')
+        self.assertEqual(document['subtitle'], '')
+        self.assertEqual(document['images'], ['www.vanguardia.com/binrepository/a.jpg', 'www.vanguardia.com/binrepository/b.jpg'])
+        self.assertEqual(document['body'], self.record['body'])
+        self.assertEqual(document['author'], '')
+        self.assertIsNone(document['publication_date'])
+        document = normalize_article(dict(self.record, publication_date=['2020-11-01T21:39:00-06:00']))
+        self.assertEqual(document['publication_date'], pd.Timestamp('2020-11-02 03:39', tz='UTC'))
+        self.assertEqual(document['category'], 'Mundo')
+        self.assertNotIn('duplicate_of', document)
+        document = normalize_article(dict(self.record, duplicate_of='https://www.ntn24.com/mundo/tifon-goni'))
+        self.assertEqual(document['duplicate_of'], 'https://www.ntn24.com/mundo/tifon-goni')
+
+    def test_record_and_frame_agree(self):
+        ''' Test that verifies the articles normalized one by one give the same documents as the articles normalized in a dataframe '''
+        df = typed_articles()
+        records = [normalize_article(record) for record in df.to_dict('records')]
+        self.assertEqual([bson.encode(document) for document in normalize_frame(df)], [bson.encode(document) for document in records])
+
+    def test_normalize_category(self):
+        ''' Test that verifies only the first space of a category is removed, and the category is capitalized '''
+        self.assertEqual(normalize_category(' salud'), 'Salud')
+        self.assertEqual(normalize_category('ECONOMÍA'), 'Economía')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+import logging
+logging.basicConfig(level=logging.INFO)
+# The modules of shared are imported as the stages import them, from the parent folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from vocabulary import Vocabulary, create_indexes, fold
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Vocabulary(unittest.TestCase):
+    logger.info('Starting test for the vocabulary of the categories, tags and hosts.')
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'vocabulary.json')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_fold(self):
+        ''' Test that verifies the accents, the case and the extra spaces of a name are dropped '''
+        self.assertEqual(fold(' Economía '), 'economia')
+        self.assertEqual(fold('ECONOMÍA'), fold('economia'))
+        self.assertEqual(fold('Ciencia  y\ttecnología'), 'ciencia y tecnologia')
+        self.assertEqual(fold('Straße'), 'strasse')
+        self.assertEqual(fold('https://www.NTN24.com/'), 'https://www.ntn24.com')
+
+    def test_local_ids(self):
+        ''' Test that verifies the variants of a name share an id, and the ids are the same when the index is opened again '''
+        names = Vocabulary(self.path)
+        ids = names.assign('category', ['Economía', 'ECONOMIA', 'Salud', None, ' '])
+        self.assertEqual(ids, {'Economía': 1, 'ECONOMIA': 1, 'Salud': 2})
+        self.assertEqual(names.assign('tag', ['Salud']), {'Salud': 1})
+        names.save()
+        reopened = Vocabulary(self.path)
+        self.assertEqual(reopened.assign('category', ['Deportes', 'salud']), {'Deportes': 3, 'salud': 2})
+        documents = reopened.encode([{'category': 'Salud', 'tags': ['Salud', 'Covid'], 'host': 'https://www.ntn24.com'}, {'category': None, 'tags': None, 'host': 'https://www.ntn24.com'}])
+        self.assertEqual([(document['category_id'], document['tag_ids'], document['host_id']) for document in documents], [(2, [1, 2], 1), (None, [], 1)])
+
+    @unittest.skipIf(mongomock is None, 'mongomock is not installed')
+    def test_database_ids(self):
+        ''' Test that verifies two loads agree on the ids through the database, and a database rebuilt gets the ids of the local index '''
+        database = mongomock.MongoClient()['news_db']
+        create_indexes(database)
+        first, second = Vocabulary(None, database), Vocabulary(None, database)
+        self.assertEqual(first.assign('tag', ['Petróleo', 'OPEP']), {'Petróleo': 1, 'OPEP': 2})
+        self.assertEqual(second.assign('tag', ['opep', 'Brent']), {'opep': 2, 'Brent': 3})
+        self.assertEqual(database['vocabulary'].find_one({'kind': 'tag', 'key': 'petroleo'})['name'], 'Petróleo')
+        local = Vocabulary(self.path, database)
+        local.save()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['tag'], {'petroleo': 1, 'opep': 2, 'brent': 3})
+        rebuilt = mongomock.MongoClient()['news_db']
+        create_indexes(rebuilt)
+        names = Vocabulary(self.path, rebuilt)
+        self.assertEqual(names.assign('tag', ['Brent', 'Oro']), {'Brent': 3, 'Oro': 4})
+        self.assertEqual(rebuilt['vocabulary'].count_documents({'kind': 'tag'}), 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import json
+import logging
+import os.path
+import re
+import unicodedata
+from functools import lru_cache
+from pymongo import ReturnDocument, UpdateOne
+from shared import metrics
+
+# Vocabulary of the categories, tags and hosts. A name is folded (accents, case and spaces dropped) so the variants
+# the sites write, as `Economía` and `ECONOMIA`, are one entry, and each entry gets an integer id that never
+# changes. The ids are kept in the `vocabulary` collection, with the first name seen of each entry, and in a local
+# index that gives them back to a database rebuilt from scratch; the news documents keep the ids next to the names:
+#
+#   {'category': 'Economía', 'category_id': 4, 'tags': ['Petróleo', 'OPEP'], 'tag_ids': [17, 52], 'host_id': 1, ...}
+
+logger = logging.getLogger(__name__)
+
+KINDS = ['category', 'tag', 'host']
+SPACES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=100000)
+def fold(name):
+    ''' This function returns the key of a name in the vocabulary: without accents, case folded, with its spaces collapsed. A host is also kept without its trailing slash. '''
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(character for character in name if not unicodedata.combining(character))
+    return SPACES.sub(' ', name.casefold()).strip().rstrip('/')
+
+
+class Vocabulary:
+    ''' Integer ids of the folded names of each kind. The local index, in `path`, maps kind -> key -> id. With a database, its `vocabulary` collection is the reference: it is read when the vocabulary is opened, the names that are not in it are looked up again when they are first seen, and the new ones get their ids from a counter of the `counters` collection, so two loads running at the same time agree on them. A new database gets the ids of the local index, the ids stay the same when it is rebuilt. '''
+
+    def __init__(self, path='vocabulary.json', database=None):
+        self.path = path
+        self.database = database
+        self.ids = {kind: {} for kind in KINDS}
+        if path and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for kind, ids in json.load(f).items():
+                    self.ids[kind] = ids
+        if database is not None:
+            self._sync()
+
+    def _sync(self):
+        ''' Reads the ids of the database, or writes the ones of the local index when the database has none, with their keys as names. '''
+        collection = self.database['vocabulary']
+        stored = {kind: {} for kind in KINDS}
+        for entry in collection.find({}, {'kind': 1, 'key': 1, 'id': 1}):
+            stored.setdefault(entry['kind'], {})[entry['key']] = entry['id']
+        for kind, ids in self.ids.items():
+            if ids and not stored.get(kind):
+                collection.bulk_write([UpdateOne({'kind': kind, 'key': key}, {'$setOnInsert': {'id': id, 'name': key}}, upsert=True) for key, id in ids.items()], ordered=False)
+                self.database['counters'].update_one({'_id': f'vocabulary_{kind}'}, {'$max': {'next': max(ids.values())}}, upsert=True)
+                logger.info(f'{len(ids)} {kind} ids of the local index saved in the database')
+                stored[kind] = dict(ids)
+        self.ids = stored
+
+    def _new_ids(self, kind, names):
+        ''' Gives an id to each new key, dictionary key -> name, and returns them, dictionary key -> id. '''
+        if self.database is None:
+            first = max(self.ids[kind].values(), default=0) + 1
+            return {key: first + position for position, key in enumerate(names)}
+        collection = self.database['vocabulary']
+        ids = {entry['key']: entry['id'] for entry in collection.find({'kind': kind, 'key': {'$in': list(names)}}, {'key': 1, 'id': 1})}
+        new = [key for key in names if key not in ids]
+        if new:
+            counter = self.database['counters'].find_one_and_update({'_id': f'vocabulary_{kind}'}, {'$inc': {'next': len(new)}}, upsert=True, return_document=ReturnDocument.AFTER)
+            first = counter['next'] - len(new) + 1
+            # A key saved by another load in the meantime keeps the id it was given there
+            collection.bulk_write([UpdateOne({'kind': kind, 'key': key}, {'$setOnInsert': {'id': first + position, 'name': names[key]}}, upsert=True) for position, key in enumerate(new)], ordered=False)
+            ids.update({entry['key']: entry['id'] for entry in collection.find({'kind': kind, 'key': {'$in': new}}, {'key': 1, 'id': 1})})
+        return ids
+
+    def assign(self, kind, names):
+        ''' Returns the id of each name, dictionary name -> id, the new names get one. The names that are not strings, or are empty once folded, are left out. '''
+        ids = {}
+        new = {}
+        for name in names:
+            if not isinstance(name, str) or name in ids:
+                continue
+            key = fold(name)
+            if not key:
+                continue
+            if key in self.ids[kind]:
+                ids[name] = self.ids[kind][key]
+            else:
+                new.setdefault(key, name)
+                ids[name] = None
+        if new:
+            self.ids[kind].update(self._new_ids(kind, new))
+            metrics.inc('vocabulary_new', len(new), stage='load', kind=kind)
+            ids.update({name: self.ids[kind][fold(name)] for name, id in ids.items() if id is None})
+        return ids
+
+    def encode(self, documents):
+        ''' Adds the ids of the category, tags and host of each news document, and returns the list of documents. The ids of all of them are assigned at once. '''
+        documents = list(documents)
+        categories = self.assign('category', (document.get('category') for document in documents))
+        tags = self.assign('tag', (tag for document in documents if isinstance(document.get('tags'), list) for tag in document['tags']))
+        hosts = self.assign('host', (document.get('host') for document in documents))
+        for document in documents:
+            document['category_id'] = categories.get(document.get('category'))
+            document['tag_ids'] = [tags[tag] for tag in document['tags'] if tag in tags] if isinstance(document.get('tags'), list) else []
+            document['host_id'] = hosts.get(document.get('host'))
+        return documents
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.ids, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def create_indexes(database):
+    ''' This function creates the indexes of the vocabulary, a key and an id are unique in their kind, and the ones of the ids of the news. '''
+    database['vocabulary'].create_index([('kind', 1), ('key', 1)], unique=True)
+    database['vocabulary'].create_index([('kind', 1), ('id', 1)], unique=True)
+    database['news'].create_index('category_id')
+    database['news'].create_index('tag_ids')
+    database['news'].create_index('host_id')
@@ -0,0 +1,54 @@
+import argparse
+import ast
+import os
+import tempfile
+import time
+import pandas as pd
+from transform import clean_df_string, clean_df_lists, formats
+
+# Benchmark of the intermediate formats: the csv with the lists as strings, against the typed files.
+# It times the write, the read plus the cleaning of the transform stage, and the size of the file.
+# Run it from the transform folder: python3 bench_formats.py --scale 100
+
+
+def typed_articles(scale):
+    df = pd.read_csv('articles_test.csv')
+    for column in formats.LIST_COLUMNS:
+        df[column] = df[column].map(ast.literal_eval)
+    return pd.concat([df] * scale, ignore_index=True)
+
+def csv_frame(df):
+    df = df.copy()
+    for column in formats.LIST_COLUMNS:
+        df[column] = df[column].map(str)
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the csv and the typed intermediate formats.')
+    parser.add_argument('--scale', type=int, default=50, help='times articles_test.csv is repeated')
+    args = parser.parse_args()
+
+    typed = typed_articles(args.scale)
+    extensions = ['.csv', '.jsonl', '.jsonl.gz']
+    try:
+        import pyarrow
+        extensions.append('.parquet')
+    except ImportError:
+        print('pyarrow is not installed, parquet is left out')
+
+    print(f'{len(typed)} articles')
+    with tempfile.TemporaryDirectory() as folder:
+        for extension in extensions:
+            path = os.path.join(folder, f'articles{extension}')
+            df = csv_frame(typed) if extension == '.csv' else typed
+            start = time.perf_counter()
+            formats.write_articles(df, path)
+            write = time.perf_counter() - start
+            start = time.perf_counter()
+            df = formats.read_articles(path)
+            df = clean_df_lists(df) if formats.is_typed(path) else clean_df_string(df)
+            read = time.perf_counter() - start
+            print(f'{extension:>10}: write {write:6.2f}s, read and clean {read:6.2f}s, {os.path.getsize(path) / 2 ** 20:8.2f} MiB')
+
+if __name__ == '__main__':
+    main()
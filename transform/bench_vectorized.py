@@ -0,0 +1,71 @@
+import argparse
+import datetime
+import time
+import warnings
+import pandas as pd
+from transform import clean_datetime, delete_first_space_categories
+
+# Benchmark of the vectorised clean_datetime and delete_first_space_categories against the row by row versions they replaced.
+# The row by row versions are timed on a sample and scaled to the size of the frame, they take minutes on a million rows.
+# Run it from the transform folder: python3 bench_vectorized.py --rows 1000000
+
+today = datetime.datetime.now().strftime('%Y-%m-%d')
+
+
+def rowwise_clean_datetime(df):
+    df['publication_date'] = df['publication_date'].str.replace('\'','')
+    df['publication_date'] = df['publication_date'].str.replace('[','')
+    df['publication_date'] = df['publication_date'].str.replace(']','')
+    for date in range(len(df['publication_date'])):
+        if len(df['publication_date'][date]) == 0:
+            df['publication_date'][date] = today
+
+    df['publication_date'] = pd.to_datetime(df['publication_date'])
+    return df
+
+def rowwise_delete_first_space_categories(df_categories):
+    df_categories = df_categories.dropna()
+    df_categories = df_categories.reset_index()
+    df_categories.drop(['index'], axis = 1, inplace = True)
+
+    for category in range(len(df_categories)):
+        df_categories.loc[category] = df_categories.loc[category, 'categories'][0].replace(" ", "")+df_categories.loc[category, 'categories'][1:]
+        df_categories.loc[category] = df_categories.loc[category, 'categories'].capitalize()
+    return df_categories
+
+def synthetic_dates(rows):
+    dates = pd.Series(["['2020-10-30 19:27:20']", '[]', "['2020-09-17']", "['']"])
+    return pd.DataFrame({'publication_date': dates.sample(rows, replace=True, random_state=0).reset_index(drop=True)})
+
+def synthetic_categories(rows):
+    categories = pd.Series([' salud', 'Santander', ' colombia', 'economía', None])
+    return pd.DataFrame({'categories': categories.sample(rows, replace=True, random_state=0).reset_index(drop=True)})
+
+def timed(function, df):
+    start = time.perf_counter()
+    result = function(df.copy())
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the vectorised cleaning functions with the row by row ones.')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows of the synthetic frames')
+    parser.add_argument('--rowwise-rows', type=int, default=20000, help='rows the row by row versions are timed on')
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print(f'{args.rows} rows')
+    for name, frame, vectorised, rowwise in [
+        ('clean_datetime', synthetic_dates, clean_datetime, rowwise_clean_datetime),
+        ('delete_first_space_categories', synthetic_categories, delete_first_space_categories, rowwise_delete_first_space_categories),
+    ]:
+        df = frame(args.rows)
+        seconds, _ = timed(vectorised, df)
+        sample = df.head(args.rowwise_rows)
+        rowwise_seconds, expected = timed(rowwise, sample)
+        _, result = timed(vectorised, sample)
+        pd.testing.assert_frame_equal(result, expected)
+        rowwise_seconds *= args.rows / len(sample)
+        print(f'{name:>30}: vectorised {seconds:8.2f}s, row by row {rowwise_seconds:8.2f}s (scaled), x{rowwise_seconds / seconds:.0f}')
+
+if __name__ == '__main__':
+    main()
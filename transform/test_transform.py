@@ -4,7 +4,13 @@ import unittest
 import logging
 import datetime
 logging.basicConfig(level = logging.INFO)
-from transform import delete_empty_titles_and_bodies, clean_df_string, clean_datetime, delete_first_space_categories
+from transform import delete_empty_titles_and_bodies, clean_df_string, clean_df_lists, clean_datetime, delete_first_space_categories
+from transform import main, metrics
+import ast
+import contextlib
+import io
+import os
+import tempfile
 
 today = datetime.datetime.now()
 logger = logging.getLogger(__name__)
@@ -44,6 +50,18 @@ class Test_Transform(unittest.TestCase):
             self.assertNotIn('\']', data)
         pd_test.assert_frame_equal(df, clean_df_string(df))
     
+    def test_clean_df_lists(self):
+        ''' Test that verifies the typed articles give the same single value fields as the csv, and keep the lists '''
+        logger.info('Starting test for the cleaning of the typed data.')
+        df = pd.read_csv('articles_test.csv')
+        typed = df.copy()
+        for column in ['title', 'subtitle', 'body', 'images', 'category_long', 'tags', 'author', 'publication_date']:
+            typed[column] = typed[column].map(ast.literal_eval)
+        single = typed['title'].map(len) == 1
+        pd_test.assert_series_equal(clean_df_lists(typed)['title'][single], clean_df_string(df)['title'][single])
+        for data in typed['body']:
+            self.assertEqual(type(data), list)
+
     def test_clean_datetime(self):
         ''' Test that verifies that the publication date is a datetime type '''
         logger.info('Starting test for the datetime verification.')
@@ -52,7 +70,8 @@ class Test_Transform(unittest.TestCase):
         df = clean_datetime(df)
 
         for date in df['publication_date']:
-            self.assertEqual(type(date), type(today), msg='Not a datetime')
+            self.assertIsInstance(date, datetime.datetime, msg='Not a datetime')
+        self.assertEqual(str(df['publication_date'].dt.tz), 'UTC')
 
     def test_delete_first_space_categories(self):
         ''' Test that verifies the first character in categories, is not an empty space '''
@@ -63,5 +82,53 @@ class Test_Transform(unittest.TestCase):
         for category in df['categories']:
             self.assertIsNot(category[0], '')
 
+    def test_clean_datetime_empty_dates(self):
+        ''' Test that verifies that an article without a publication date, or with one that cannot be parsed, is left without date and counted '''
+        df = pd.DataFrame({'publication_date': ["['2020-10-30 19:27:20']", '[]', "['']", "['hace 2 horas']"]})
+        metrics.enable()
+        try:
+            df = clean_datetime(df)
+            counts = {value['labels']['result']: value['value'] for value in metrics.summary()['counters']['dates']}
+        finally:
+            metrics.disable()
+            metrics.reset()
+        self.assertEqual(list(df['publication_date']), [pd.Timestamp('2020-10-30 19:27:20', tz='UTC'), pd.NaT, pd.NaT, pd.NaT])
+        self.assertEqual(counts, {'parsed': 1, 'missing': 2, 'unparseable': 1})
+
+    def test_clean_datetime_per_host(self):
+        ''' Test that verifies the dates of each host are read with its formats and timezone, as the day first dates of eleconomista '''
+        df = pd.read_csv('articles_test.csv')
+        dates = clean_datetime(clean_df_string(df.copy()))['publication_date']
+        economista = (df['host'] == 'https://www.eleconomista.com.mx') & (df['publication_date'] == "['01/11/2020 13:38']")
+        self.assertTrue(economista.any())
+        self.assertTrue((dates[economista] == pd.Timestamp('2020-11-01 19:38', tz='UTC')).all())
+        vanguardia = df['publication_date'] == "['2020 10 02']"
+        self.assertTrue((dates[vanguardia] == pd.Timestamp('2020-10-02 05:00', tz='UTC')).all())
+        words = pd.DataFrame({'publication_date': ["['04 de noviembre de 2020']", "['2020-10-31T08:56:21Z']"], 'host': 'https://noticias.canalrcn.com'})
+        self.assertEqual(list(clean_datetime(words)['publication_date']), [pd.Timestamp('2020-11-04 05:00', tz='UTC'), pd.Timestamp('2020-10-31 08:56:21', tz='UTC')])
+        self.assertEqual(int(dates.isna().sum()), int(df['publication_date'].eq('[]').sum()))
+
+    def test_delete_first_space_categories_values(self):
+        ''' Test that verifies only the first space of a category is removed, and the category is capitalized '''
+        df = pd.DataFrame({'categories': [' salud', 'ECONOMÍA', None, '  dos espacios']})
+        df = delete_first_space_categories(df)
+        self.assertEqual(list(df['categories']), ['Salud', 'Economía', ' dos espacios'])
+        self.assertEqual(list(df.index), [0, 1, 2])
+
+    def test_main_chunks(self):
+        ''' Test that verifies the articles cleaned in chunks are the same as the articles cleaned at once '''
+        articles = os.path.abspath('articles_test.csv')
+        categories = os.path.abspath('categories_test.csv')
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as folder, contextlib.redirect_stdout(io.StringIO()):
+            os.chdir(folder)
+            try:
+                main(articles, categories, 'whole.csv')
+                main(articles, categories, 'chunked.csv', chunk_size=7)
+                with open('whole.csv', 'rb') as whole, open('chunked.csv', 'rb') as chunked:
+                    self.assertEqual(whole.read(), chunked.read())
+            finally:
+                os.chdir(cwd)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,15 +1,19 @@
-import datetime
+import argparse
 import os.path
+import sys
 import pandas as pd
 import logging
 import csv
-import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from shared import dates, formats, metrics
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
-today = datetime.datetime.now().strftime('%Y-%m-%d')
 
 def delete_empty_titles_and_bodies(df):
+    if metrics.enabled():
+        for column in ['title', 'body']:
+            metrics.inc('empty_values', int(df[column].isna().sum()), stage='transform', field=column)
     df[['title']] = df[['title']].dropna()
     df[['body']] = df[['body']].dropna()
     
@@ -26,35 +30,58 @@ def clean_df_string(df):
 
     return df
 
-def clean_datetime(df):
-    df['publication_date'] = df['publication_date'].str.replace('\'','')
-    df['publication_date'] = df['publication_date'].str.replace('[','')
-    df['publication_date'] = df['publication_date'].str.replace(']','')
-    for date in range(len(df['publication_date'])):
-        if len(df['publication_date'][date]) == 0:
-            df['publication_date'][date] = today
+def join_list(value):
+    return ' '.join(value) if isinstance(value, list) else value
+
+def clean_df_lists(df):
+    ''' Same as clean_df_string, for the typed files, where the fields are lists: the single value fields are joined into a string, the body, tags and images are kept as lists. '''
+    for column in ['title', 'subtitle', 'author', 'category_long', 'publication_date']:
+        df[column] = df[column].map(join_list)
+
+    return df
 
-    df['publication_date'] = pd.to_datetime(df['publication_date'])
-    return df   
+def clean_datetime(df):
+    ''' Parses the publication dates with the formats of the site of each article, see shared/dates.py. The dates are in UTC, empty when they are missing or cannot be parsed. '''
+    df['publication_date'] = dates.parse_dates(df['publication_date'], df['host'] if 'host' in df else None, stage='transform')
+    return df
 
 def delete_first_space_categories(df_categories):
     df_categories = df_categories.dropna()
-    df_categories = df_categories.reset_index()
-    df_categories.drop(['index'], axis = 1, inplace = True)
+    df_categories = df_categories.reset_index(drop = True)
 
-    for category in range(len(df_categories)):
-        df_categories.loc[category] = df_categories.loc[category, 'categories'][0].replace(" ", "")+df_categories.loc[category, 'categories'][1:]
-        df_categories.loc[category] = df_categories.loc[category, 'categories'].capitalize()
+    # Only the first character is dropped when it is a space, the rest of the name is kept as it is
+    categories = df_categories['categories']
+    categories = categories.str[0].str.replace(' ', '', regex=False) + categories.str[1:]
+    df_categories['categories'] = categories.str.capitalize()
     return df_categories
 
-def main(df_articles, df_categories):
-    df = pd.read_csv(df_articles)
+def clean_articles_frame(df, typed):
+    ''' Cleans a dataframe of articles, the whole file or a chunk of it. '''
+    with metrics.timer('clean_seconds', stage='transform'):
+        if typed:
+            df = clean_df_lists(df)
+        else:
+            df = clean_df_string(df)
+        df = delete_empty_titles_and_bodies(df)
+        df = clean_datetime(df)
+    metrics.inc('rows_cleaned', len(df), stage='transform')
+    return df
+
+def main(df_articles, df_categories, clean_articles=None, chunk_size=None):
     logger.info('Starting cleaning process for articles.')
-    df = clean_df_string(df)
-    df = delete_empty_titles_and_bodies(df)
-    df = clean_datetime(df)
-    print(df)
-    df.to_csv('clean_articles.csv', index = False)
+    typed = formats.is_typed(df_articles)
+    # The clean articles are written in the same format as the articles
+    clean_articles = clean_articles or f'clean_articles{formats.extension_of(df_articles)}'
+    if chunk_size:
+        # Streaming mode, only a chunk of the articles is in memory at a time
+        with formats.ArticleWriter(clean_articles) as writer:
+            for df in formats.read_articles_chunks(df_articles, chunk_size):
+                writer.write(clean_articles_frame(df, typed))
+        logger.info(f'{writer.rows} articles cleaned in chunks of {chunk_size}.')
+    else:
+        df = clean_articles_frame(formats.read_articles(df_articles), typed)
+        print(df)
+        formats.write_articles(df, clean_articles)
     logger.info('Cleaning process for articles completed.')
     df_cat = pd.read_csv(df_categories)
     logger.info('Starting cleaning process for categories.')
@@ -63,5 +90,7 @@ def main(df_articles, df_categories):
     logger.info('Cleaning process for categories completed.')
 
 if __name__ == "__main__":
-    main('articles.csv', 'categories.csv')
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Cleans the articles and categories extracted.')
+    parser.add_argument('--chunk-size', type=int, default=None, help='clean the articles in chunks of this many rows, instead of the whole file at once')
+    args = parser.parse_args()
+    main(formats.find('articles') or 'articles.csv', 'categories.csv', chunk_size=args.chunk_size)